@@ -0,0 +1,431 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+from concurrent.futures import Future
+from typing import Awaitable, Callable
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+from app.config.redis import get_loop_redis, get_sync_redis
+
+logger = logging.getLogger("app")
+
+# Время жизни результата анализа в Redis в секундах (0 — кэш отключён)
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+# Количество результатов в локальном LRU каждого процесса воркера (0 — без локального уровня)
+ANALYSIS_CACHE_LOCAL_SIZE = int(os.getenv("ANALYSIS_CACHE_LOCAL_SIZE", "10000"))
+# Сколько секунд другие воркеры ждут результата, пока текст анализирует владелец блокировки
+ANALYSIS_CACHE_LOCK_TTL = float(os.getenv("ANALYSIS_CACHE_LOCK_TTL", "10"))
+# Приводить регистр при нормализации: "FAILED" и "failed" дают один ключ.
+# Включать, только если классификатор не различает регистр (как keyword)
+ANALYSIS_CACHE_FOLD_CASE = os.getenv("ANALYSIS_CACHE_FOLD_CASE", "0") == "1"
+# Заменять числа при нормализации: "order 123" и "order 456" дают один ключ.
+# Включать, только если числа не влияют на категорию и уверенность классификатора
+ANALYSIS_CACHE_MASK_DIGITS = os.getenv("ANALYSIS_CACHE_MASK_DIGITS", "0") == "1"
+
+RESULT_KEY = "analysis:result:{digest}"
+LOCK_KEY = "analysis:lock:{digest}"
+# Интервал опроса Redis в ожидании результата чужого анализа
+LOCK_POLL_INTERVAL = 0.05
+
+# Снять блокировку, только если она всё ещё принадлежит нам
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+CACHE_REQUESTS = Counter(
+    "analysis_cache_requests_total",
+    "Обращения к кэшу результатов анализа",
+    ["tier", "result"],
+)
+CACHE_SHARED = Counter(
+    "analysis_cache_shared_total",
+    "Анализы, результат которых получен от уже выполняющегося запроса",
+    ["scope"],
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_text(text: str) -> str:
+    """Нормализованный текст для ключа кэша: пробелы и (опционально) регистр и числа"""
+    text = _WHITESPACE.sub(" ", text).strip()
+    if ANALYSIS_CACHE_FOLD_CASE:
+        text = text.casefold()
+    if ANALYSIS_CACHE_MASK_DIGITS:
+        text = _DIGITS.sub("0", text)
+    return text
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode()).hexdigest()
+
+
+class AnalysisCache:
+    """Кэш результатов анализа: локальный LRU процесса и общий уровень в Redis с TTL.
+
+    Одинаковые тексты, анализируемые одновременно, ждут один вызов AI API:
+    внутри процесса — через общий future, между воркерами — через блокировку в Redis.
+    Асинхронный путь обращается к Redis через redis.asyncio и не блокирует цикл событий.
+    """
+
+    def __init__(
+        self,
+        ttl: int = ANALYSIS_CACHE_TTL,
+        local_size: int = ANALYSIS_CACHE_LOCAL_SIZE,
+        lock_ttl: float = ANALYSIS_CACHE_LOCK_TTL,
+        redis_retry_after: float = 5.0,
+    ):
+        self.ttl = ttl
+        self.local_size = local_size
+        self.lock_ttl = lock_ttl
+        # После ошибки Redis кэш работает только локально указанное число секунд
+        self.redis_retry_after = redis_retry_after
+        self._redis_disabled_until = 0.0
+        self._release_script = None
+        self._release_scripts_async: WeakKeyDictionary = WeakKeyDictionary()
+        self._local: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+        self._inflight_async: dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    def _redis(self):
+        if time.monotonic() < self._redis_disabled_until:
+            return None
+        return get_sync_redis()
+
+    def _redis_async(self):
+        if time.monotonic() < self._redis_disabled_until:
+            return None
+        return get_loop_redis()
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Redis недоступен для кэша анализа, используется локальный уровень: {e!r}")
+        self._redis_disabled_until = time.monotonic() + self.redis_retry_after
+
+    def _get_local(self, digest: str) -> dict | None:
+        if not self.local_size:
+            return None
+        with self._lock:
+            entry = self._local.get(digest)
+            if entry is not None and entry[0] > time.monotonic():
+                self._local.move_to_end(digest)
+                CACHE_REQUESTS.labels("local", "hit").inc()
+                return entry[1]
+        CACHE_REQUESTS.labels("local", "miss").inc()
+        return None
+
+    def _from_redis(self, digest: str, raw: bytes | None) -> dict | None:
+        if raw is None:
+            CACHE_REQUESTS.labels("redis", "miss").inc()
+            return None
+        CACHE_REQUESTS.labels("redis", "hit").inc()
+        result = json.loads(raw)
+        self._set_local(digest, result)
+        return result
+
+    def get(self, digest: str) -> dict | None:
+        """Результат из локального уровня, затем из Redis (с переносом в локальный)"""
+        result = self._get_local(digest)
+        if result is not None:
+            return result
+        redis = self._redis()
+        if redis is None:
+            return None
+        try:
+            raw = redis.get(RESULT_KEY.format(digest=digest))
+        except RedisError as e:
+            self._redis_failed(e)
+            return None
+        return self._from_redis(digest, raw)
+
+    def get_many(self, digests: list[str]) -> dict[str, dict]:
+        """Найденные результаты для набора ключей: промахи локального уровня читаются одним MGET"""
+        found = {}
+        for digest in digests:
+            result = self._get_local(digest)
+            if result is not None:
+                found[digest] = result
+        remote = [digest for digest in digests if digest not in found]
+        redis = self._redis() if remote else None
+        if redis is None:
+            return found
+        try:
+            raws = redis.mget([RESULT_KEY.format(digest=digest) for digest in remote])
+        except RedisError as e:
+            self._redis_failed(e)
+            return found
+        for digest, raw in zip(remote, raws):
+            result = self._from_redis(digest, raw)
+            if result is not None:
+                found[digest] = result
+        return found
+
+    async def get_async(self, digest: str) -> dict | None:
+        result = self._get_local(digest)
+        if result is not None:
+            return result
+        redis = self._redis_async()
+        if redis is None:
+            return None
+        try:
+            raw = await redis.get(RESULT_KEY.format(digest=digest))
+        except RedisError as e:
+            self._redis_failed(e)
+            return None
+        return self._from_redis(digest, raw)
+
+    def set(self, digest: str, result: dict) -> None:
+        self._set_local(digest, result)
+        redis = self._redis()
+        if redis is None:
+            return
+        try:
+            redis.set(RESULT_KEY.format(digest=digest), json.dumps(result), ex=self.ttl)
+        except RedisError as e:
+            self._redis_failed(e)
+
+    def set_many(self, results: dict[str, dict]) -> None:
+        """Сохранить результаты набора ключей одним конвейером Redis"""
+        for digest, result in results.items():
+            self._set_local(digest, result)
+        redis = self._redis() if results else None
+        if redis is None:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for digest, result in results.items():
+                pipe.set(RESULT_KEY.format(digest=digest), json.dumps(result), ex=self.ttl)
+            pipe.execute()
+        except RedisError as e:
+            self._redis_failed(e)
+
+    async def set_async(self, digest: str, result: dict) -> None:
+        self._set_local(digest, result)
+        redis = self._redis_async()
+        if redis is None:
+            return
+        try:
+            await redis.set(RESULT_KEY.format(digest=digest), json.dumps(result), ex=self.ttl)
+        except RedisError as e:
+            self._redis_failed(e)
+
+    def _set_local(self, digest: str, result: dict) -> None:
+        if not self.local_size:
+            return
+        with self._lock:
+            self._local[digest] = (time.monotonic() + self.ttl, result)
+            self._local.move_to_end(digest)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _acquire(self, digest: str) -> str | None:
+        """Взять блокировку анализа текста; токен владельца или None, если её держит другой воркер"""
+        token = uuid.uuid4().hex
+        redis = self._redis()
+        if redis is None:
+            return token
+        try:
+            if redis.set(LOCK_KEY.format(digest=digest), token, nx=True, px=int(self.lock_ttl * 1000)):
+                return token
+            return None
+        except RedisError as e:
+            self._redis_failed(e)
+            return token
+
+    def _release(self, digest: str, token: str) -> None:
+        redis = self._redis()
+        if redis is None:
+            return
+        try:
+            if self._release_script is None:
+                self._release_script = redis.register_script(RELEASE_LOCK_SCRIPT)
+            self._release_script(keys=[LOCK_KEY.format(digest=digest)], args=[token])
+        except RedisError as e:
+            self._redis_failed(e)
+
+    def _lock_released(self, digest: str) -> bool:
+        redis = self._redis()
+        if redis is None:
+            return True
+        try:
+            return not redis.exists(LOCK_KEY.format(digest=digest))
+        except RedisError as e:
+            self._redis_failed(e)
+            return True
+
+    async def _acquire_async(self, digest: str) -> str | None:
+        token = uuid.uuid4().hex
+        redis = self._redis_async()
+        if redis is None:
+            return token
+        try:
+            if await redis.set(LOCK_KEY.format(digest=digest), token, nx=True, px=int(self.lock_ttl * 1000)):
+                return token
+            return None
+        except RedisError as e:
+            self._redis_failed(e)
+            return token
+
+    async def _release_async(self, digest: str, token: str) -> None:
+        redis = self._redis_async()
+        if redis is None:
+            return
+        try:
+            # Скрипт redis.asyncio привязан к клиенту, а клиент — к циклу событий
+            script = self._release_scripts_async.get(redis)
+            if script is None:
+                script = self._release_scripts_async[redis] = redis.register_script(RELEASE_LOCK_SCRIPT)
+            await script(keys=[LOCK_KEY.format(digest=digest)], args=[token])
+        except RedisError as e:
+            self._redis_failed(e)
+
+    async def _lock_released_async(self, digest: str) -> bool:
+        redis = self._redis_async()
+        if redis is None:
+            return True
+        try:
+            return not await redis.exists(LOCK_KEY.format(digest=digest))
+        except RedisError as e:
+            self._redis_failed(e)
+            return True
+
+    def _compute_once(self, digest: str, text: str, compute: Callable[[str], dict | None]) -> dict | None:
+        token = self._acquire(digest)
+        if token is None:
+            # Текст уже анализирует другой воркер: ждём его результата не дольше срока блокировки
+            deadline = time.monotonic() + self.lock_ttl
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                result = self.get(digest)
+                if result is not None:
+                    CACHE_SHARED.labels("cluster").inc()
+                    return result
+                if self._lock_released(digest):
+                    break
+        try:
+            result = compute(text)
+            if result is not None:
+                self.set(digest, result)
+            return result
+        finally:
+            if token is not None:
+                self._release(digest, token)
+
+    def get_or_compute(self, text: str, compute: Callable[[str], dict | None]) -> dict | None:
+        """Результат анализа из кэша или от compute; None от compute не кэшируется"""
+        if not self.enabled:
+            return compute(text)
+        digest = content_digest(text)
+        result = self.get(digest)
+        if result is not None:
+            return result
+
+        with self._lock:
+            future = self._inflight.get(digest)
+            leader = future is None
+            if leader:
+                future = self._inflight[digest] = Future()
+        if not leader:
+            CACHE_SHARED.labels("process").inc()
+            return future.result()
+
+        try:
+            result = self._compute_once(digest, text, compute)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[digest]
+
+    def get_or_compute_many(
+        self, texts: list[str], compute_batch: Callable[[list[str]], list[dict]]
+    ) -> list[dict]:
+        """Пакетный вариант: промахи кэша вычисляются одним вызовом compute_batch.
+
+        Одинаковые тексты пакета вычисляются один раз; блокировка между воркерами
+        не используется, пакет не ждёт чужих результатов.
+        """
+        if not self.enabled:
+            return compute_batch(texts)
+        digests = [content_digest(text) for text in texts]
+        unique = dict(zip(digests, texts))
+        found = self.get_many(list(unique))
+        missing = {digest: text for digest, text in unique.items() if digest not in found}
+        if missing:
+            computed = dict(zip(missing, compute_batch(list(missing.values()))))
+            self.set_many(computed)
+            found.update(computed)
+        return [found[digest] for digest in digests]
+
+    async def get_or_compute_async(self, text: str, compute: Callable[[str], Awaitable[dict]]) -> dict:
+        """Асинхронный вариант get_or_compute для воркера в режиме asyncio"""
+        if not self.enabled:
+            return await compute(text)
+        digest = content_digest(text)
+        result = await self.get_async(digest)
+        if result is not None:
+            return result
+
+        future = self._inflight_async.get(digest)
+        if future is not None:
+            CACHE_SHARED.labels("process").inc()
+            return await asyncio.shield(future)
+        future = self._inflight_async[digest] = asyncio.get_running_loop().create_future()
+
+        token = None
+        try:
+            token = await self._acquire_async(digest)
+            if token is None:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + self.lock_ttl
+                while loop.time() < deadline:
+                    await asyncio.sleep(LOCK_POLL_INTERVAL)
+                    result = await self.get_async(digest)
+                    if result is not None:
+                        CACHE_SHARED.labels("cluster").inc()
+                        future.set_result(result)
+                        return result
+                    if await self._lock_released_async(digest):
+                        break
+            result = await compute(text)
+            await self.set_async(digest, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Ошибку получат ожидающие; без них future не должен жаловаться при сборке мусора
+            future.exception()
+            raise
+        finally:
+            del self._inflight_async[digest]
+            if token is not None:
+                await self._release_async(digest, token)
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,129 @@
+import logging
+import os
+import random
+import re
+from abc import ABC, abstractmethod
+from typing import Callable, Sequence
+from app.analysis.cache import analysis_cache
+
+logger = logging.getLogger("app")
+
+# Движок анализа: "api" — внешний AI API (по одному тексту на запрос),
+# любое другое значение — локальный движок из реестра, получающий тексты пакетами
+ANALYSIS_ENGINE = os.getenv("ANALYSIS_ENGINE", "api")
+
+
+class Classifier(ABC):
+    """Интерфейс движка классификации текстов уведомлений"""
+
+    name = ""
+    # Кэшировать результаты стоит, только если классификация дороже обращения к Redis
+    cacheable = True
+
+    @abstractmethod
+    def classify_batch(self, texts: Sequence[str]) -> list[dict]:
+        """Классифицировать тексты; результат i соответствует тексту i"""
+
+    def classify(self, text: str) -> dict:
+        return self.classify_batch([text])[0]
+
+
+def _trie_pattern(words: Sequence[str]) -> str:
+    """Регулярное выражение из слов, сгруппированных по общим префиксам.
+
+    Движок re перебирает альтернативы в каждой позиции текста; общий префикс
+    проверяется один раз вместо проверки каждого слова.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alternatives = [re.escape(char) + build(child) for char, child in node.items() if char]
+        optional = "" in node
+        if not alternatives:
+            return ""
+        if len(alternatives) == 1 and not optional:
+            return alternatives[0]
+        return f"(?:{'|'.join(alternatives)}){'?' if optional else ''}"
+
+    return build(trie)
+
+
+class KeywordClassifier(Classifier):
+    """Классификация по ключевым словам одним проходом скомпилированного регулярного выражения.
+
+    Правила упорядочены по приоритету: если в тексте есть слова нескольких
+    категорий, выбирается первая из правил. В keywords попадают найденные
+    ключевые слова.
+    """
+
+    name = "keyword"
+    cacheable = False
+
+    RULES = (
+        ("critical", ("error", "exception", "failed"), (0.7, 0.95)),
+        ("warning", ("warning", "attention", "careful"), (0.6, 0.9)),
+    )
+    DEFAULT = ("info", (0.8, 0.99))
+
+    def __init__(self, rules=RULES, default=DEFAULT):
+        self.rules = rules
+        self.default = default
+        # Ключевое слово -> номер правила; при повторе слова побеждает правило с большим приоритетом
+        self._priority: dict[str, int] = {}
+        for index, (_, keywords, _) in enumerate(rules):
+            for keyword in keywords:
+                self._priority.setdefault(keyword.lower(), index)
+        self._pattern = re.compile(_trie_pattern(list(self._priority)))
+
+    def classify_batch(self, texts: Sequence[str]) -> list[dict]:
+        priority = self._priority
+        results = []
+        for text in texts:
+            found = self._pattern.findall(text.lower())
+            if found:
+                category, _, confidence = self.rules[min(priority[word] for word in found)]
+            else:
+                category, confidence = self.default
+            results.append({
+                "category": category,
+                "confidence": random.uniform(*confidence),
+                "keywords": list(dict.fromkeys(found))[:3],
+            })
+        return results
+
+
+_ENGINES: dict[str, Callable[[], Classifier]] = {KeywordClassifier.name: KeywordClassifier}
+_instances: dict[str, Classifier] = {}
+
+
+def register_engine(name: str, factory: Callable[[], Classifier]) -> None:
+    """Зарегистрировать движок (например, модель, принимающую тексты пакетами)"""
+    _ENGINES[name] = factory
+    _instances.pop(name, None)
+
+
+def get_classifier(name: str = KeywordClassifier.name) -> Classifier:
+    """Экземпляр движка по имени; создаётся один раз на процесс"""
+    classifier = _instances.get(name)
+    if classifier is None:
+        if name not in _ENGINES:
+            raise ValueError(f"Неизвестный движок анализа: {name}")
+        classifier = _instances[name] = _ENGINES[name]()
+    return classifier
+
+
+def classify_many(texts: list[str], engine: str | None = None) -> list[dict | None]:
+    """Пакетная классификация локальным движком; при ошибке движка — None для всех текстов"""
+    classifier = get_classifier(engine or ANALYSIS_ENGINE)
+    try:
+        if classifier.cacheable:
+            return analysis_cache.get_or_compute_many(texts, classifier.classify_batch)
+        return classifier.classify_batch(texts)
+    except Exception:
+        logger.exception(f"Ошибка движка анализа {classifier.name}")
+        return [None] * len(texts)
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import random
+from app.analysis.cache import AnalysisCache
+from app.analysis.classifier import KeywordClassifier, get_classifier
+
+# Задержка мок-AI API в секундах (минимум и максимум)
+MOCK_LATENCY = (
+    float(os.getenv("ANALYZER_MOCK_LATENCY_MIN", "1")),
+    float(os.getenv("ANALYZER_MOCK_LATENCY_MAX", "3")),
+)
+# Максимальное количество одновременных запросов к AI API в одном процессе
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "200"))
+
+
+def classify_text(text: str) -> dict:
+    """Классификация текста по ключевым словам (логика мок-AI API)."""
+    return get_classifier(KeywordClassifier.name).classify(text)
+
+
+class AsyncAnalyzerClient:
+    """Асинхронный клиент AI API с ограничением числа одновременных запросов"""
+
+    def __init__(
+        self,
+        concurrency: int = ANALYSIS_CONCURRENCY,
+        latency: tuple[float, float] = MOCK_LATENCY,
+        cache: AnalysisCache | None = None,
+    ):
+        self.concurrency = concurrency
+        self.latency = latency
+        self.cache = cache
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def analyze(self, text: str) -> dict:
+        """Проанализировать один текст (через кэш результатов, если он задан)"""
+        if self.cache is not None:
+            return await self.cache.get_or_compute_async(text, self._request)
+        return await self._request(text)
+
+    async def _request(self, text: str) -> dict:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            await asyncio.sleep(random.uniform(*self.latency))
+            return classify_text(text)
+
+    async def analyze_many(self, texts: list[str]) -> list[dict | BaseException]:
+        """Проанализировать тексты конкурентно; ошибки возвращаются на месте результатов"""
+        return await asyncio.gather(*(self.analyze(text) for text in texts), return_exceptions=True)
@@ -0,0 +1,22 @@
+from typing import Sequence
+from app.analysis.classifier import KeywordClassifier, get_classifier
+
+PRIORITY = "priority"
+DEFAULT = "default"
+BULK = "bulk"
+# Порядок, в котором релей outbox обслуживает полосы
+LANES = (PRIORITY, DEFAULT, BULK)
+
+
+def choose_lanes(texts: Sequence[str], bulk: bool = False) -> list[str]:
+    """Полоса анализа для каждого текста.
+
+    Предварительная оценка встроенным классификатором по ключевым словам:
+    тексты, похожие на критичные, идут в priority, остальные — в bulk для
+    пакетов и в default для одиночных уведомлений.
+    """
+    fallback = BULK if bulk else DEFAULT
+    return [
+        PRIORITY if result["category"] == "critical" else fallback
+        for result in get_classifier(KeywordClassifier.name).classify_batch(texts)
+    ]
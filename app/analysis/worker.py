@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from uuid import UUID
+from sqlalchemy import update
+from sqlalchemy.future import select
+from app.analysis.cache import analysis_cache
+from app.analysis.client import AsyncAnalyzerClient
+from app.analysis import classifier
+from app.config.database import async_session
+from app.models.notification import Notification
+from app.repositories.notification_repository import filter_by_ids
+from app.utils.cache import bump_user_cache_version_sync
+from app.utils.detail_cache import detail_cache
+from app.utils.db_metrics import track_queries
+from app.utils.pubsub import publish_statuses_sync
+
+logger = logging.getLogger("app")
+
+# Режим обработки в воркере: "prefork" (поток на анализ) или "async" (asyncio)
+ANALYSIS_WORKER_MODE = os.getenv("ANALYSIS_WORKER_MODE", "prefork")
+
+_client: AsyncAnalyzerClient | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_client() -> AsyncAnalyzerClient:
+    global _client
+    if _client is None:
+        _client = AsyncAnalyzerClient(cache=analysis_cache)
+    return _client
+
+
+def _notify_sync(user_ids: set[UUID], values: list[dict]) -> None:
+    """Инвалидация кэшей и публикация статусов после коммита: синхронный Redis, вызывается вне цикла событий"""
+    bump_user_cache_version_sync(*user_ids)
+    detail_cache.patch_sync(values)
+    publish_statuses_sync([(value["id"], value["processing_status"]) for value in values])
+
+
+@track_queries
+async def process_chunk_async(notification_ids: list[UUID], client: AsyncAnalyzerClient, session_factory=async_session) -> None:
+    """Асинхронная обработка части пакета теми же тремя запросами, что и в синхронной задаче."""
+    async with session_factory() as db:
+        rows = (await db.execute(
+            filter_by_ids(
+                select(Notification.id, Notification.created_at, Notification.user_id, Notification.text),
+                notification_ids,
+            )
+        )).all()
+        if len(rows) < len(notification_ids):
+            logger.warning(f"Не найдены уведомления для анализа: {len(notification_ids) - len(rows)} из {len(notification_ids)}")
+        if not rows:
+            return
+        user_ids = {row.user_id for row in rows}
+        created = [row.created_at for row in rows]
+
+        await db.execute(
+            update(Notification)
+            .where(
+                Notification.id.in_([row.id for row in rows]),
+                Notification.created_at.between(min(created), max(created)),
+            )
+            .values(processing_status="processing")
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        loop = asyncio.get_running_loop()
+        # Обращения к Redis не должны останавливать остальные части пакета в этом цикле
+        await loop.run_in_executor(
+            None, _notify_sync, user_ids, [{"id": row.id, "processing_status": "processing"} for row in rows]
+        )
+
+        texts = [row.text for row in rows]
+        if classifier.ANALYSIS_ENGINE != "api":
+            # Локальный движок нагружает процессор: пакет классифицируется вне цикла событий
+            analyses = await loop.run_in_executor(None, classifier.classify_many, texts)
+        else:
+            analyses = await client.analyze_many(texts)
+
+        values = []
+        for row, analysis in zip(rows, analyses):
+            if analysis is None or isinstance(analysis, BaseException):
+                logger.error(f"Ошибка анализа уведомления {row.id}: {analysis}")
+                values.append({"id": row.id, "created_at": row.created_at, "processing_status": "failed"})
+            else:
+                values.append({
+                    "id": row.id,
+                    "created_at": row.created_at,
+                    "category": analysis["category"],
+                    "confidence": analysis["confidence"],
+                    "processing_status": "completed",
+                })
+        await db.execute(update(Notification), values)
+        await db.commit()
+        await loop.run_in_executor(None, _notify_sync, user_ids, values)
+
+
+async def process_batch_async(
+    notification_ids: list[UUID],
+    chunk_size: int,
+    client: AsyncAnalyzerClient | None = None,
+    session_factory=async_session,
+) -> None:
+    """Конкурентная обработка всех частей пакета; общее число анализов ограничено клиентом."""
+    client = client or get_client()
+    chunks = [notification_ids[start:start + chunk_size] for start in range(0, len(notification_ids), chunk_size)]
+    await asyncio.gather(*(process_chunk_async(chunk, client, session_factory) for chunk in chunks))
+
+
+def run_batch(notification_ids: list[UUID], chunk_size: int) -> None:
+    """Синхронная точка входа для задач Celery.
+
+    Цикл событий живёт всё время работы процесса воркера, чтобы пул соединений
+    асинхронного движка не пересоздавался на каждую задачу.
+    """
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    _loop.run_until_complete(process_batch_async(notification_ids, chunk_size))
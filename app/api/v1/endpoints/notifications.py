@@ -1,49 +1,130 @@
-from fastapi import APIRouter, Depends, Query, Request, Path, Body
+from fastapi import APIRouter, Depends, Query, Request, Response, Path, Body, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal
 from uuid import UUID
-from app.schemas.notification import NotificationCreate, NotificationRead
-from app.config.database import get_session
+from app.schemas.notification import (
+    NotificationCreate,
+    NotificationRead,
+    NotificationPage,
+    NotificationSummaryPage,
+    UnreadCount,
+    NotificationBatchCreate,
+    NotificationBatchResult,
+    NotificationBulkRead,
+    NotificationBulkReadResult,
+    NotificationLookup,
+    NotificationLookupResult,
+    LOOKUP_MAX_SIZE,
+)
+from app.config.database import get_session, get_read_session, read_session
 from app.repositories.notification_repository import NotificationRepository
-from app.services.notification_service import NotificationService
-from fastapi_cache.decorator import cache
-from app.utils.cache import custom_key_builder
+from app.services.notification_service import NotificationService, select_fields
+from app.utils.cache import cache_encoded_response, CACHE_TTL
+from app.utils.serialization import encoded_response, negotiate
+from app.utils.pubsub import pubsub_hub, status_subscriptions
+from app.utils.etag import make_etag, etag_matches
+import asyncio
+import json
+import os
+
+# Статусы, после которых обработка уведомления больше не меняется
+TERMINAL_STATUSES = {"completed", "failed"}
+# Интервал комментариев-пингов, удерживающих SSE-соединение через прокси
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Максимальное время ожидания изменения статуса в режиме long polling
+STATUS_WAIT_MAX = float(os.getenv("STATUS_WAIT_MAX_SECONDS", "30"))
 
 router = APIRouter(tags=["notifications"])
 
+async def get_lookup_session(
+    request: Request,
+    primary: AsyncSession = Depends(get_session),
+):
+    """Сессия для POST /lookup: недавняя запись проверяется для каждого ID из тела запроса"""
+    # FastAPI уже разобрал тело: request.json() возвращает сохранённый результат
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    ids = body.get("ids") if isinstance(body, dict) else None
+    async with read_session(
+        primary, notification_ids=ids[:LOOKUP_MAX_SIZE] if isinstance(ids, list) else (),
+    ) as session:
+        yield session
+
 @router.get(
     "/",
-    response_model=list[NotificationRead],
+    response_model=NotificationPage | NotificationSummaryPage,
     summary="Получить список уведомлений",
-    description="Возвращает список уведомлений для указанного пользователя с поддержкой пагинации",
-    response_description="Список объектов уведомлений",
+    description=(
+        "Возвращает страницу уведомлений пользователя (новые первыми) с курсорной пагинацией; "
+        "view=summary или fields=... ограничивают поля элементов и столбцы, читаемые из БД; "
+        "Accept: application/msgpack — ответ в формате MessagePack"
+    ),
+    response_description="Страница уведомлений и курсор следующей страницы",
 )
-@cache(expire=60, namespace="notifications", key_builder=custom_key_builder)
+@cache_encoded_response(expire=CACHE_TTL, namespace="notifications")
 async def get_notifications(
     request: Request,
+    response: Response,
     user_id: UUID = Query(..., description="ID пользователя"),
-    skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
+    cursor: str | None = Query(None, description="Курсор из next_cursor предыдущей страницы"),
     limit: int = Query(10, ge=1, le=100, description="Максимальное количество возвращаемых записей"),
+    view: Literal["full", "summary"] = Query(
+        "full", description="summary — только id, title, category, created_at и read_at"
+    ),
+    fields: str | None = Query(None, description="Поля элементов через запятую; заменяет view"),
+    accept: str | None = Header(None, description="application/msgpack — ответ в формате MessagePack"),
+    db: AsyncSession = Depends(get_read_session),
+):
+    repo = NotificationRepository(db)
+    service = NotificationService(repo)
+    page = await service.get_notifications(user_id, cursor, limit, select_fields(view, fields))
+    return encoded_response(page, negotiate(accept))
+
+@router.get(
+    "/unread_count",
+    response_model=UnreadCount,
+    summary="Получить количество непрочитанных уведомлений",
+    description="Возвращает количество непрочитанных уведомлений пользователя из счётчика в Redis без обращения к БД",
+    response_description="Количество непрочитанных уведомлений",
+)
+async def get_unread_count(
+    user_id: UUID = Query(..., description="ID пользователя"),
     db: AsyncSession = Depends(get_session),
 ):
     repo = NotificationRepository(db)
     service = NotificationService(repo)
-    notifications = await service.get_notifications(user_id, skip, limit)
-    return notifications
+    return UnreadCount(user_id=user_id, unread=await service.get_unread_count(user_id))
 
 @router.get(
     "/{notification_id}",
     response_model=NotificationRead,
     summary="Получить детальную информацию об уведомлении",
-    description="Возвращает полную информацию о конкретном уведомлении по его ID",
+    description=(
+        "Возвращает полную информацию о конкретном уведомлении по его ID. "
+        "If-None-Match с актуальным ETag даёт 304 без тела"
+    ),
     response_description="Объект уведомления",
 )
 async def get_notification(
+    response: Response,
     notification_id: UUID = Path(..., description="ID уведомления"),
-    db: AsyncSession = Depends(get_session),
+    if_none_match: str | None = Header(None, description="ETag ранее полученной версии уведомления"),
+    db: AsyncSession = Depends(get_read_session),
 ):
     repo = NotificationRepository(db)
     service = NotificationService(repo)
-    return await service.get_notification(notification_id)
+    if if_none_match:
+        # Для проверки актуальности достаточно изменяемых полей, без заголовка и текста
+        etag = _notification_etag(await service.get_state(notification_id))
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+    notification = await service.get_notification(notification_id)
+    response.headers["ETag"] = _notification_etag(notification)
+    response.headers["Cache-Control"] = "no-cache"
+    return notification
 
 @router.post(
     "/",
@@ -60,6 +141,57 @@ async def create_notification(
     service = NotificationService(repo)
     return await service.create_notification(notification)
 
+@router.post(
+    "/batch",
+    response_model=NotificationBatchResult,
+    summary="Создать пакет уведомлений",
+    description="Создает несколько уведомлений одним запросом и отправляет их на анализ одной задачей Celery",
+    response_description="Результат по каждому элементу пакета: ID созданного уведомления или ошибка",
+)
+async def create_notifications_batch(
+    batch: NotificationBatchCreate = Body(..., description="Пакет уведомлений для создания"),
+    db: AsyncSession = Depends(get_session),
+):
+    repo = NotificationRepository(db)
+    service = NotificationService(repo)
+    return await service.create_notifications_batch(batch.items)
+
+@router.post(
+    "/lookup",
+    response_model=NotificationLookupResult,
+    summary="Получить уведомления или статусы по списку ID",
+    description=(
+        "Возвращает уведомления (view=full) или только статусы обработки (view=status) "
+        "в порядке переданных ID; для несуществующих ID found=false"
+    ),
+    response_description="Элементы в порядке ID запроса",
+)
+async def lookup_notifications(
+    data: NotificationLookup = Body(..., description="ID уведомлений и вид ответа"),
+    db: AsyncSession = Depends(get_lookup_session),
+):
+    repo = NotificationRepository(db)
+    service = NotificationService(repo)
+    return await service.lookup(data)
+
+@router.patch(
+    "/read",
+    response_model=NotificationBulkReadResult,
+    summary="Отметить несколько уведомлений как прочитанные",
+    description=(
+        "Одним запросом отмечает прочитанными уведомления из списка ID или все уведомления "
+        "пользователя, созданные не позже until. Уже прочитанные уведомления не изменяются"
+    ),
+    response_description="Количество отмеченных уведомлений и, по запросу, их ID",
+)
+async def mark_notifications_as_read(
+    data: NotificationBulkRead = Body(..., description="Уведомления для отметки"),
+    db: AsyncSession = Depends(get_session),
+):
+    repo = NotificationRepository(db)
+    service = NotificationService(repo)
+    return await service.mark_many_as_read(data)
+
 @router.patch(
     "/{notification_id}/read",
     response_model=NotificationRead,
@@ -79,13 +211,122 @@ async def mark_notification_as_read(
     "/{notification_id}/status",
     response_model=dict,
     summary="Получить статус обработки уведомления",
-    description="Возвращает текущий статус обработки уведомления (pending, processing, completed, failed)",
+    description=(
+        "Возвращает текущий статус обработки уведомления (pending, processing, completed, failed). "
+        "С параметром wait ждёт изменения статуса до указанного числа секунд; "
+        "If-None-Match с актуальным ETag даёт 304 без тела"
+    ),
     response_description="Статус обработки",
 )
 async def get_notification_status(
+    response: Response,
     notification_id: UUID = Path(..., description="ID уведомления"),
-    db: AsyncSession = Depends(get_session),
+    wait: float = Query(
+        0, ge=0, le=STATUS_WAIT_MAX, description="Сколько секунд ждать изменения статуса (long polling)"
+    ),
+    if_none_match: str | None = Header(None, description="ETag ранее полученного статуса"),
+    db: AsyncSession = Depends(get_read_session),
 ):
-    repo = NotificationRepository(db)
-    service = NotificationService(repo)
-    return await service.get_status(notification_id)
\ No newline at end of file
+    # Подписка оформляется до чтения статуса, чтобы не пропустить переход между ними
+    queue = status_subscriptions.subscribe(notification_id) if wait and pubsub_hub.running else None
+    try:
+        repo = NotificationRepository(db)
+        service = NotificationService(repo)
+        status = (await service.get_status(notification_id))["status"]
+        # Ждём, только если клиент уже знает текущий статус и он ещё может измениться
+        if (
+            queue is not None
+            and status not in TERMINAL_STATUSES
+            and (not if_none_match or etag_matches(if_none_match, _status_etag(notification_id, status)))
+        ):
+            # Соединение с БД на время ожидания не нужно: возвращаем его в пул
+            await db.commit()
+            status = await _wait_for_status_change(queue, status, wait)
+    finally:
+        if queue is not None:
+            status_subscriptions.unsubscribe(notification_id, queue)
+
+    etag = _status_etag(notification_id, status)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return {"status": status}
+
+def _notification_etag(notification) -> str:
+    return make_etag(notification.id, notification.processing_status, notification.read_at, notification.category)
+
+def _status_etag(notification_id: UUID, status: str) -> str:
+    # Тело ответа /status зависит только от статуса
+    return make_etag(notification_id, status)
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+async def _wait_for_status_change(queue: asyncio.Queue, status: str, timeout: float) -> str:
+    """Дождаться статуса, отличного от status; по истечении timeout вернуть прежний"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while (remaining := deadline - loop.time()) > 0:
+        try:
+            event = await asyncio.wait_for(queue.get(), remaining)
+        except asyncio.TimeoutError:
+            break
+        if event["status"] != status:
+            return event["status"]
+    return status
+
+def _sse_status(status: str) -> str:
+    return f"event: status\ndata: {json.dumps({'status': status})}\n\n"
+
+async def _status_events(notification_id: UUID, status: str, queue: asyncio.Queue | None):
+    """Поток SSE: текущий статус, затем переходы до завершения обработки"""
+    try:
+        # Без подписки клиент переподключится через retry и получит актуальный статус
+        yield f"retry: 3000\n{_sse_status(status)}"
+        if status in TERMINAL_STATUSES or queue is None:
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event["status"] == status:
+                continue
+            status = event["status"]
+            yield _sse_status(status)
+            if status in TERMINAL_STATUSES:
+                return
+    finally:
+        if queue is not None:
+            status_subscriptions.unsubscribe(notification_id, queue)
+
+@router.get(
+    "/{notification_id}/status/stream",
+    summary="Подписаться на статус обработки уведомления",
+    description=(
+        "Server-Sent Events: сразу отправляет текущий статус, затем каждое его изменение "
+        "до завершения обработки (completed или failed)"
+    ),
+    response_description="Поток событий status",
+)
+async def stream_notification_status(
+    notification_id: UUID = Path(..., description="ID уведомления"),
+    db: AsyncSession = Depends(get_read_session),
+):
+    # Подписка оформляется до чтения статуса, чтобы не пропустить переход между ними
+    queue = status_subscriptions.subscribe(notification_id) if pubsub_hub.running else None
+    try:
+        repo = NotificationRepository(db)
+        service = NotificationService(repo)
+        status = (await service.get_status(notification_id))["status"]
+    except Exception:
+        if queue is not None:
+            status_subscriptions.unsubscribe(notification_id, queue)
+        raise
+    return StreamingResponse(
+        _status_events(notification_id, status, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,6 +1,9 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 from dotenv import load_dotenv
+from prometheus_client import CollectorRegistry, REGISTRY, multiprocess, start_http_server
 from app.config.logging_config import setup_logging
+import glob
 import os
 
 # Загружаем переменные окружения из .env
@@ -12,6 +15,13 @@ redis_url = os.getenv("REDIS_URL")
 if not redis_url:
     raise ValueError("REDIS_URL не установлен в переменных окружения")
 
+# Очереди анализа по полосам: priority — тексты, похожие на критичные, default — одиночные
+# уведомления, bulk — пакеты. У priority может быть свой воркер (-Q analysis.priority)
+ANALYSIS_QUEUES = {
+    lane: os.getenv(f"ANALYSIS_{lane.upper()}_QUEUE", f"analysis.{lane}")
+    for lane in ("priority", "default", "bulk")
+}
+
 # Создаём экземпляр Celery
 celery_app = Celery(
     "notification_service",
@@ -26,6 +36,56 @@ celery_app.conf.update(
     accept_content=["json"],
     timezone="UTC",
     enable_utc=True,
+    # Задачи без явной очереди попадают в полосу default
+    task_routes={"app.tasks.process_notifications_batch": {"queue": ANALYSIS_QUEUES["default"]}},
+    # Процесс берёт следующую задачу, только освободившись: очередь брокера остаётся
+    # общей для всех воркеров, и релей outbox решает, чья задача пойдёт следующей
+    worker_prefetch_multiplier=int(os.getenv("CELERY_PREFETCH_MULTIPLIER", "1")),
+    beat_schedule={
+        # Исправляет расхождения счётчиков непрочитанных с БД
+        "reconcile-unread-counts": {
+            "task": "app.tasks.reconcile_unread_counts",
+            "schedule": float(os.getenv("UNREAD_RECONCILE_INTERVAL", "300")),
+        },
+        # Создаёт секции уведомлений на следующие месяцы и убирает устаревшие
+        "maintain-notification-partitions": {
+            "task": "app.tasks.maintain_notification_partitions",
+            "schedule": float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "3600")),
+        },
+        # Переносит старые прочитанные уведомления в сжатый архив
+        "archive-read-notifications": {
+            "task": "app.tasks.archive_read_notifications",
+            "schedule": float(os.getenv("NOTIFICATION_ARCHIVE_INTERVAL", "3600")),
+        },
+    },
 )
 
+# Порт HTTP-эндпоинта метрик воркера (пул соединений, запросы к БД, кэш анализа); 0 — не запускать
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+# Каталог метрик процессов пула prefork: без него видны только метрики главного процесса
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+@worker_init.connect
+def start_worker_metrics_server(**kwargs):
+    if not WORKER_METRICS_PORT:
+        return
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Файлы процессов прошлого запуска исказили бы суммы
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.remove(path)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(WORKER_METRICS_PORT, registry=registry)
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Gauge завершившегося процесса больше не входят в сумму livesum
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
 setup_logging()
\ No newline at end of file
@@ -1,50 +1,212 @@
+import atexit
+import logging
 import logging.config
+import logging.handlers
+import os
+import queue
+import random
+
+# Режим записи логов: "sync" — обработчики пишут в потоке вызова,
+# "queue" — запись в очередь, консоль и файл обслуживает фоновый поток
+LOG_MODE = os.getenv("LOG_MODE", "sync")
+# Формат строк: "text" или "json" (python-json-logger)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Файл логов; пустое значение — только консоль
+LOG_FILE = os.getenv("LOG_FILE", "/app/app.log")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+UVICORN_LOG_LEVEL = os.getenv("UVICORN_LOG_LEVEL", LOG_LEVEL)
+CELERY_LOG_LEVEL = os.getenv("CELERY_LOG_LEVEL", LOG_LEVEL)
+# INFO — текст каждого SQL-запроса, WARNING — только ошибки
+SQLALCHEMY_LOG_LEVEL = os.getenv("SQLALCHEMY_LOG_LEVEL", "WARNING")
+# Обработчики пропускают записи самого подробного из уровней логгеров: уровни задают логгеры
+HANDLER_LOG_LEVEL = min(
+    (LOG_LEVEL, UVICORN_LOG_LEVEL, CELERY_LOG_LEVEL, SQLALCHEMY_LOG_LEVEL),
+    key=lambda level: logging.getLevelNamesMapping().get(level.upper(), logging.INFO),
+).upper()
+
+# Доля записей, которые попадают в лог, для шумных логгеров (1 — все, 0 — ни одной)
+SQL_LOG_SAMPLE_RATE = float(os.getenv("SQL_LOG_SAMPLE_RATE", "1"))
+CACHE_KEY_LOG_SAMPLE_RATE = float(os.getenv("CACHE_KEY_LOG_SAMPLE_RATE", "1"))
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает заданную долю записей логгеров по префиксу имени.
+
+    Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, rates: dict[str, float] | None = None):
+        super().__init__()
+        self.rates = {name: rate for name, rate in (rates or {}).items() if rate < 1}
+
+    def _rate(self, name: str) -> float:
+        for prefix, rate in self.rates.items():
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.rates or record.levelno >= logging.WARNING:
+            return True
+        # Решение запоминается в записи, чтобы консоль и файл получали одну выборку
+        sampled = getattr(record, "sampled", None)
+        if sampled is None:
+            rate = self._rate(record.name)
+            sampled = record.sampled = rate >= 1 or random.random() < rate
+        return sampled
+
 
 LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "sampling": {
+            "()": SamplingFilter,
+            "rates": {
+                "sqlalchemy.engine": SQL_LOG_SAMPLE_RATE,
+                "app.cache": CACHE_KEY_LOG_SAMPLE_RATE,
+            },
+        },
+    },
     "formatters": {
         "standard": {
             "format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
         },
+        "json": {
+            "()": "pythonjsonlogger.jsonlogger.JsonFormatter",
+            "fmt": "%(asctime)s %(levelname)s %(name)s %(message)s",
+            "rename_fields": {"levelname": "level", "name": "logger"},
+        },
     },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
-            "level": "INFO",
+            "level": HANDLER_LOG_LEVEL,
             "formatter": "standard",
+            "filters": ["sampling"],
             "stream": "ext://sys.stdout",
         },
         "file": {
             "class": "logging.FileHandler",
-            "level": "INFO",
+            "level": HANDLER_LOG_LEVEL,
             "formatter": "standard",
-            "filename": "/app/app.log",
+            "filters": ["sampling"],
+            "filename": LOG_FILE,
         },
     },
     "loggers": {
         "app": {
-            "level": "INFO",
+            "level": LOG_LEVEL,
             "handlers": ["console", "file"],
             "propagate": False,
         },
         "uvicorn": {
-            "level": "INFO",
+            "level": UVICORN_LOG_LEVEL,
             "handlers": ["console", "file"],
             "propagate": False,
         },
         "sqlalchemy.engine": {
-            "level": "INFO",
+            "level": SQLALCHEMY_LOG_LEVEL,
             "handlers": ["console", "file"],
             "propagate": False,
         },
         "celery": {
-            "level": "INFO",
+            "level": CELERY_LOG_LEVEL,
             "handlers": ["console", "file"],
             "propagate": False,
         },
     },
 }
 
-def setup_logging():
-    logging.config.dictConfig(LOGGING_CONFIG)
\ No newline at end of file
+_listener: logging.handlers.QueueListener | None = None
+# Обработчик, через который логгеры пишут в очередь (LOG_MODE=queue)
+_queue_handler: logging.handlers.QueueHandler | None = None
+
+
+def _build_config(fmt: str, log_file: str, sample_rates: dict[str, float] | None) -> dict:
+    config = {**LOGGING_CONFIG, "handlers": dict(LOGGING_CONFIG["handlers"]), "loggers": {}}
+    if sample_rates is not None:
+        config["filters"] = {"sampling": {"()": SamplingFilter, "rates": sample_rates}}
+    for name, handler in config["handlers"].items():
+        config["handlers"][name] = {**handler, "formatter": "json" if fmt == "json" else "standard"}
+    if log_file:
+        config["handlers"]["file"]["filename"] = log_file
+    else:
+        del config["handlers"]["file"]
+    for name, logger in LOGGING_CONFIG["loggers"].items():
+        config["loggers"][name] = {
+            **logger, "handlers": [handler for handler in logger["handlers"] if handler in config["handlers"]],
+        }
+    return config
+
+
+def _start_listener(log_queue: queue.Queue, handlers: list[logging.Handler]) -> None:
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        # Дописывает оставшиеся в очереди записи
+        _listener.stop()
+        _listener = None
+
+
+def _restart_listener_in_child() -> None:
+    # Поток записи не переживает fork (процессы пула prefork Celery): запускаем свой.
+    # Очередь родителя не переиспользуется: её блокировка могла быть захвачена в момент
+    # fork, а уже поставленные записи запишет сам родитель
+    global _queue_handler
+    if _listener is None or _queue_handler is None:
+        return
+    parent_handler = _queue_handler
+    _queue_handler = logging.handlers.QueueHandler(queue.Queue(-1))
+    for log_filter in parent_handler.filters:
+        _queue_handler.addFilter(log_filter)
+    loggers = [logging.getLogger(), *(
+        logger for logger in logging.Logger.manager.loggerDict.values() if isinstance(logger, logging.Logger)
+    )]
+    for logger in loggers:
+        if parent_handler in logger.handlers:
+            logger.handlers = [_queue_handler if handler is parent_handler else handler for handler in logger.handlers]
+    _start_listener(_queue_handler.queue, list(_listener.handlers))
+
+
+def setup_logging(
+    mode: str = LOG_MODE,
+    fmt: str = LOG_FORMAT,
+    log_file: str = LOG_FILE,
+    sample_rates: dict[str, float] | None = None,
+) -> None:
+    """Настроить логирование; sample_rates (префикс логгера -> доля) заменяет выборку из окружения"""
+    global _queue_handler
+    _stop_listener()
+    _queue_handler = None
+    config = _build_config(fmt, log_file, sample_rates)
+    logging.config.dictConfig(config)
+    if mode != "queue":
+        return
+
+    # Логгеры пишут в неограниченную очередь, не блокируясь на диске и консоли
+    handlers = {}
+    log_queue = queue.Queue(-1)
+    queue_handler = _queue_handler = logging.handlers.QueueHandler(log_queue)
+    for name in config["loggers"]:
+        logger = logging.getLogger(name)
+        for handler in logger.handlers:
+            handlers[id(handler)] = handler
+        logger.handlers = [queue_handler]
+    # Выборка выполняется до постановки в очередь: отброшенные записи не занимают поток записи
+    for handler in handlers.values():
+        for log_filter in list(handler.filters):
+            if isinstance(log_filter, SamplingFilter):
+                queue_handler.addFilter(log_filter)
+                handler.removeFilter(log_filter)
+    _start_listener(log_queue, list(handlers.values()))
+
+
+atexit.register(_stop_listener)
+os.register_at_fork(after_in_child=_restart_listener_in_child)
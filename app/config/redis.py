@@ -0,0 +1,40 @@
+from redis import asyncio as aioredis
+from weakref import WeakKeyDictionary
+import asyncio
+import redis
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+# Общее асинхронное подключение процесса API; устанавливается в startup
+_redis: aioredis.Redis | None = None
+# Синхронное подключение для воркеров Celery; создаётся при первом обращении
+_sync_redis: redis.Redis | None = None
+# Асинхронные подключения воркеров по циклам событий: соединения redis.asyncio привязаны к своему циклу
+_loop_redis: WeakKeyDictionary = WeakKeyDictionary()
+
+def set_redis(client: aioredis.Redis | None) -> None:
+    global _redis
+    _redis = client
+
+def get_redis() -> aioredis.Redis | None:
+    """Подключение к Redis процесса API или None, если Redis недоступен"""
+    return _redis
+
+def get_sync_redis() -> redis.Redis:
+    """Синхронное подключение к Redis для задач Celery"""
+    global _sync_redis
+    if _sync_redis is None:
+        _sync_redis = redis.Redis.from_url(REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _sync_redis
+
+def get_loop_redis() -> aioredis.Redis:
+    """Асинхронное подключение к Redis для текущего цикла событий (воркер анализа в режиме asyncio)"""
+    loop = asyncio.get_running_loop()
+    client = _loop_redis.get(loop)
+    if client is None:
+        client = _loop_redis[loop] = aioredis.Redis.from_url(REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return client
@@ -29,4 +29,18 @@ class DatabaseConnectionException(NotificationServiceException):
         super().__init__(
             status_code=503,
             detail=detail
-        )
\ No newline at end of file
+        )
+
+class InvalidCursorException(NotificationServiceException):
+    def __init__(self, cursor: str):
+        super().__init__(
+            status_code=400,
+            detail=f"Некорректный курсор пагинации: {cursor}"
+        )
+
+class InvalidFieldsException(NotificationServiceException):
+    def __init__(self, fields: list[str]):
+        super().__init__(
+            status_code=400,
+            detail=f"Неизвестные поля уведомления: {', '.join(fields)}"
+        )
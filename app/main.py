@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import ValidationError
 from app.api.v1.router import router as router_v1
 from app.config.logging_config import setup_logging
@@ -14,6 +14,8 @@ from dotenv import load_dotenv
 import logging
 from prometheus_fastapi_instrumentator import Instrumentator
 from app.utils.cache import custom_key_builder
+from app.config.redis import set_redis
+from app.utils.pubsub import pubsub_hub
 
 load_dotenv()
 
@@ -25,13 +27,22 @@ app = FastAPI(
     openapi_url="/openapi.json",
     docs_url="/docs",
     redoc_url="/redoc",
+    # Ответы эндпоинтов кодируются orjson вместо json.dumps
+    default_response_class=ORJSONResponse,
 )
 
 # Настройка Prometheus
 Instrumentator().instrument(app).expose(app)
 
-# Добавляем middleware
-app.add_middleware(RateLimitMiddleware, rate_limit_per_minute=60)
+# Добавляем middleware; лимиты общие для всех реплик через Redis
+app.add_middleware(
+    RateLimitMiddleware,
+    rate_limit_per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "60")),
+    key_by=os.getenv("RATE_LIMIT_KEY_BY", "ip"),
+    route_limits={
+        "/api/v1/notifications/batch": int(os.getenv("RATE_LIMIT_BATCH_PER_MINUTE", "10")),
+    },
+)
 
 # Подключаем роутер версии v1
 app.include_router(router_v1, prefix="/api/v1")
@@ -66,10 +77,18 @@ async def startup():
         await redis.ping()
         logger.info("Успешное подключение к Redis")
         FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+        set_redis(redis)
+        # Одна подписка на процесс для потоковой передачи статусов
+        await pubsub_hub.start(redis)
+        logger.info("Подписка Redis pub/sub запущена")
         logger.info("FastAPICache инициализирован")
     except Exception as e:
         logger.info(f"Ошибка инициализации Redis: {e}")
 
+@app.on_event("shutdown")
+async def shutdown():
+    await pubsub_hub.stop()
+
 # def custom_key_builder(
 #     func,
 #     namespace: str = "",
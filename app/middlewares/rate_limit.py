@@ -1,31 +1,213 @@
 # app/middlewares/rate_limit.py
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from array import array
+from collections import OrderedDict
+from urllib.parse import parse_qsl
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import asyncio
+import logging
+import math
 import time
-from starlette.middleware.base import BaseHTTPMiddleware  # Изменено здесь
+from redis.exceptions import RedisError
+from app.config.redis import get_redis
 
+logger = logging.getLogger("app")
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: FastAPI, rate_limit_per_minute: int = 60):
-        super().__init__(app)
-        self.rate_limit = rate_limit_per_minute
-        self.clients = {}
+WINDOW_MS = 60_000
+
+# Token bucket: ёмкость = лимит в минуту, пополнение равномерно в течение минуты.
+# Время берётся у Redis, чтобы все реплики API считали одинаково.
+# Возвращает {allowed, remaining, retry_after_ms, reset_ms}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local rate = capacity / window_ms
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window_ms)
+return {allowed, math.floor(tokens), retry_after, math.ceil((capacity - tokens) / rate)}
+"""
+
+
+class LocalTokenBucket:
+    """Token bucket в памяти процесса с O(1) на запрос и ограниченным числом клиентов.
+
+    Состояние клиента — два числа в массивах (токены и время обновления), ключ
+    хранит только номер слота. Слоты давно неактивных клиентов переиспользуются
+    в порядке LRU: клиент, простоявший дольше окна, всё равно имеет полный бакет.
+    """
+
+    def __init__(self, max_clients: int = 100_000, window_ms: int = WINDOW_MS):
+        self.max_clients = max_clients
+        self.window = window_ms / 1000
+        self._slots: OrderedDict[str, int] = OrderedDict()
+        self._tokens = array("d", bytes(8 * max_clients))
+        self._updated = array("d", bytes(8 * max_clients))
+        self._free: list[int] = []
+        self._next_slot = 0
 
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        current_time = time.time()
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _allocate(self, key: str, now: float) -> int:
+        # Освобождаем до двух простаивающих слотов за вставку, чтобы память не росла до предела
+        for _ in range(2):
+            if not self._slots:
+                break
+            oldest_key = next(iter(self._slots))
+            oldest_slot = self._slots[oldest_key]
+            if now - self._updated[oldest_slot] < self.window:
+                break
+            del self._slots[oldest_key]
+            self._free.append(oldest_slot)
+
+        if self._free:
+            slot = self._free.pop()
+        elif self._next_slot < self.max_clients:
+            slot = self._next_slot
+            self._next_slot += 1
+        else:
+            # Все слоты заняты активными клиентами: вытесняем давно не обращавшегося
+            _, slot = self._slots.popitem(last=False)
+        self._slots[key] = slot
+        return slot
+
+    def hit(self, key: str, capacity: int) -> tuple[bool, int, int, int]:
+        """Списать токен; возвращает (allowed, remaining, retry_after_ms, reset_ms)"""
+        now = time.monotonic()
+        rate = capacity / self.window
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._allocate(key, now)
+            tokens = float(capacity)
+        else:
+            self._slots.move_to_end(key)
+            tokens = min(capacity, self._tokens[slot] + (now - self._updated[slot]) * rate)
 
-        if client_ip in self.clients:
-            self.clients[client_ip] = [t for t in self.clients[client_ip] if current_time - t < 60]
+        allowed = tokens >= 1
+        retry_after_ms = 0
+        if allowed:
+            tokens -= 1
         else:
-            self.clients[client_ip] = []
+            retry_after_ms = math.ceil((1 - tokens) / rate * 1000)
+        self._tokens[slot] = tokens
+        self._updated[slot] = now
+        return allowed, int(tokens), retry_after_ms, math.ceil((capacity - tokens) / rate * 1000)
+
+
+class RateLimitMiddleware:
+    """ASGI-middleware ограничения скорости запросов без буферизации ответа"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate_limit_per_minute: int = 60,
+        key_by: str = "ip",
+        route_limits: dict[str, int] | None = None,
+        redis_timeout: float = 0.05,
+        redis_retry_after: float = 5.0,
+        max_local_clients: int = 100_000,
+    ):
+        self.app = app
+        self.rate_limit = rate_limit_per_minute
+        # "ip" — по адресу клиента, "user_id" — по адресу и параметру запроса user_id.
+        # user_id задаёт клиент: без адреса в ключе чужой запрос мог бы исчерпать бакет
+        # пользователя. Смена user_id с одного адреса даёт новый бакет, поэтому без
+        # шлюза, проверяющего user_id, надёжен только режим "ip"
+        self.key_by = key_by
+        # Отдельные лимиты для префиксов путей; самый длинный совпавший префикс побеждает
+        self.route_limits = sorted((route_limits or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.redis_timeout = redis_timeout
+        # После ошибки Redis лимитер работает локально указанное число секунд
+        self.redis_retry_after = redis_retry_after
+        self._redis_disabled_until = 0.0
+        self._script = None
+        self._script_client = None
+        self.local = LocalTokenBucket(max_clients=max_local_clients)
+
+    def _client_key(self, scope: Scope) -> str:
+        client = scope.get("client")
+        key = f"ip:{client[0] if client else 'unknown'}"
+        if self.key_by == "user_id":
+            for name, value in parse_qsl(scope.get("query_string", b"").decode("latin-1")):
+                if name == "user_id" and value:
+                    return f"{key}:user:{value}"
+        return key
+
+    def _route_limit(self, path: str) -> tuple[str, int]:
+        for prefix, limit in self.route_limits:
+            if path.startswith(prefix):
+                return prefix, limit
+        return "*", self.rate_limit
+
+    async def _check_redis(self, key: str, limit: int) -> tuple[bool, int, int, int] | None:
+        """Проверка лимита в Redis; None, если Redis недоступен или отвечает слишком медленно"""
+        redis = get_redis()
+        if redis is None or time.monotonic() < self._redis_disabled_until:
+            return None
+        if self._script_client is not redis:
+            self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+            self._script_client = redis
+        try:
+            allowed, remaining, retry_after_ms, reset_ms = await asyncio.wait_for(
+                self._script(keys=[f"ratelimit:{key}"], args=[limit, WINDOW_MS]),
+                timeout=self.redis_timeout,
+            )
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"Redis недоступен для ограничения запросов, используется локальный лимит: {e!r}")
+            self._redis_disabled_until = time.monotonic() + self.redis_retry_after
+            return None
+        return bool(allowed), int(remaining), int(retry_after_ms), int(reset_ms)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route, limit = self._route_limit(scope["path"])
+        key = f"{route}:{self._client_key(scope)}"
+
+        result = await self._check_redis(key, limit)
+        if result is None:
+            result = self.local.hit(key, limit)
+        allowed, remaining, retry_after_ms, reset_ms = result
 
-        if len(self.clients[client_ip]) >= self.rate_limit:
-            return JSONResponse(
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(math.ceil(reset_ms / 1000)),
+        }
+        if not allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(retry_after_ms / 1000)))
+            response = JSONResponse(
                 status_code=429,
-                content={"detail": "Rate limit exceeded. Try again later."}
+                content={"detail": "Rate limit exceeded. Try again later."},
+                headers=headers,
             )
+            await response(scope, receive, send)
+            return
 
-        self.clients[client_ip].append(current_time)
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
 
-        return await call_next(request)
\ No newline at end of file
+        await self.app(scope, receive, send_with_headers)
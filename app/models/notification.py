@@ -1,17 +1,18 @@
 from sqlalchemy import Column, String, DateTime, Float, Index
 from sqlalchemy.dialects.postgresql import UUID
 from app.config.database import Base
+from app.utils.ids import uuid7
 from datetime import datetime
-import uuid
 
 class Notification(Base):
     __tablename__ = "notifications"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(UUID(as_uuid=True), nullable=False, index=True)
     title = Column(String, nullable=False)
     text = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Ключ секционирования входит в первичный ключ таблицы (требование PostgreSQL)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     read_at = Column(DateTime, nullable=True)
     category = Column(String, nullable=True)
     confidence = Column(Float, nullable=True)
@@ -22,4 +23,14 @@ class Notification(Base):
         Index('idx_user_id', 'user_id'),
         Index('idx_created_at', 'created_at'),
         Index('idx_category', 'category'),
-    )
\ No newline at end of file
+        # Частичный индекс для подсчёта непрочитанных
+        Index(
+            'idx_unread_user', user_id,
+            postgresql_where=read_at.is_(None),
+            sqlite_where=read_at.is_(None),
+        ),
+        # Помесячные секции по created_at; их создаёт и удаляет задача maintain_partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # Для ORM уведомление однозначно определяется своим ID
+    __mapper_args__ = {"primary_key": [id]}
\ No newline at end of file
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Date, Index, Integer, LargeBinary
+from sqlalchemy.dialects.postgresql import UUID
+from app.config.database import Base
+
+class NotificationArchive(Base):
+    """Прочитанные старые уведомления пользователя за день одним сжатым блоком"""
+    __tablename__ = "notification_archive"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        # Удаление архива старше срока хранения
+        Index('idx_archive_day', day),
+    )
+
+class NotificationArchiveId(Base):
+    """Где искать архивное уведомление по его ID"""
+    __tablename__ = "notification_archive_ids"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    day = Column(Date, nullable=False)
+
+    __table_args__ = (
+        Index('idx_archive_ids_day', day),
+    )
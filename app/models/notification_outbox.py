@@ -0,0 +1,21 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from app.config.database import Base
+from datetime import datetime
+
+class NotificationOutbox(Base):
+    """Уведомления, ожидающие отправки на анализ; запись создаётся в транзакции создания уведомления"""
+    __tablename__ = "notification_outbox"
+
+    # Порядок отправки; в SQLite автоинкремент есть только у INTEGER
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    notification_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    # Полоса анализа (app.analysis.routing): определяет очередь Celery
+    lane = Column(String, nullable=False, default="default")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Выборка релея: очередь полосы по пользователям в порядке записи
+        Index('idx_outbox_lane_user', lane, user_id, id),
+    )
@@ -0,0 +1,299 @@
+"""Релей outbox: пересылает уведомления из notification_outbox в очереди Celery.
+
+Запись в outbox создаётся в транзакции создания уведомления, поэтому воркер
+получает только зафиксированные ID, а сбой брокера не ломает запрос API.
+Релей забирает записи через SELECT ... FOR UPDATE SKIP LOCKED и удаляет их
+в той же транзакции после отправки. Доставка "хотя бы один раз": если коммит
+после отправки не удался, пакет будет отправлен повторно.
+
+Каждая полоса (priority, default, bulk) отправляется в свою очередь, и в
+очереди брокера держится не больше ANALYSIS_QUEUE_MAX_DEPTH задач: остальное
+ждёт в outbox, где записи выбираются по кругу между пользователями. Проход
+обходит пользователей полосы по индексу (не больше OUTBOX_FAIR_USERS, начиная
+с места, где остановился прошлый проход) и одним запросом с LATERAL
+блокирует у каждого несколько самых старых записей. Поэтому пользователь
+с большим пакетом не задерживает остальных дольше, чем на один круг,
+стоимость прохода не растёт с размером очереди, а одновременные релеи
+пропускают чужие заблокированные записи и берут следующие записи тех же
+пользователей.
+
+    python -m app.outbox_relay
+"""
+from datetime import datetime
+from itertools import zip_longest
+from uuid import UUID
+from prometheus_client import Gauge, Histogram, start_http_server
+from redis.exceptions import RedisError
+from sqlalchemy import column, delete, func, true, values
+from sqlalchemy.future import select
+from app.analysis.routing import LANES
+from app.celery_app import ANALYSIS_QUEUES, celery_app
+from app.config.logging_config import setup_logging
+from app.config.redis import get_sync_redis
+from app.models.notification_outbox import NotificationOutbox
+from app.tasks import ANALYSIS_BATCH_SIZE, sync_session
+from app.utils.db_metrics import track_queries
+from app.utils.pubsub import OUTBOX_CHANNEL
+import logging
+import os
+import time
+
+# Количество записей outbox, пересылаемых одной транзакцией
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "1000"))
+# Интервал опроса таблицы, если API не разбудил релей через Redis
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+# Сколько пользователей полосы обслуживает один проход релея
+OUTBOX_FAIR_USERS = int(os.getenv("OUTBOX_FAIR_USERS", "100"))
+# Предельное число задач в очереди брокера на полосу
+ANALYSIS_QUEUE_MAX_DEPTH = int(os.getenv("ANALYSIS_QUEUE_MAX_DEPTH", "20"))
+# Как часто обновлять метрики очередей и отставания пользователей, и сколько пользователей показывать
+OUTBOX_METRICS_INTERVAL = float(os.getenv("OUTBOX_METRICS_INTERVAL", "5"))
+OUTBOX_LAG_TOP_TENANTS = int(os.getenv("OUTBOX_LAG_TOP_TENANTS", "10"))
+# Порт HTTP-эндпоинта метрик релея; 0 — не запускать
+OUTBOX_METRICS_PORT = int(os.getenv("OUTBOX_METRICS_PORT", "0"))
+
+QUEUE_DEPTH = Gauge("analysis_queue_depth", "Задач анализа в очереди брокера", ["queue"])
+OUTBOX_PENDING = Gauge("notification_outbox_pending", "Уведомлений в outbox, ожидающих отправки", ["lane"])
+DISPATCH_LAG = Histogram(
+    "notification_outbox_dispatch_lag_seconds",
+    "Время от создания уведомления до отправки в очередь анализа",
+    ["lane"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+# Метки только для OUTBOX_LAG_TOP_TENANTS самых отстающих пользователей: число рядов ограничено
+TENANT_LAG = Gauge(
+    "notification_outbox_tenant_lag_seconds", "Возраст самой старой записи outbox пользователя", ["user_id"]
+)
+TENANT_PENDING = Gauge("notification_outbox_tenant_pending", "Записей outbox пользователя", ["user_id"])
+
+logger = logging.getLogger("app")
+
+# Последний обслуженный пользователь каждой полосы: следующий проход начинается после него
+_user_cursor: dict[str, UUID] = {}
+
+
+def queue_depth(queue: str) -> int | None:
+    """Длина очереди брокера (список Redis) или None, если Redis недоступен"""
+    try:
+        return get_sync_redis().llen(queue)
+    except RedisError as e:
+        logger.warning(f"Не удалось получить длину очереди {queue}: {e}")
+        return None
+
+
+def _round_robin(rows: list) -> list:
+    """Записи по кругу между пользователями: первая каждого, затем вторая и т.д."""
+    by_user: dict = {}
+    for row in sorted(rows, key=lambda row: row.id):
+        by_user.setdefault(row.user_id, []).append(row)
+    return [row for turn in zip_longest(*by_user.values()) for row in turn if row is not None]
+
+
+def _lane_users(db, lane: str, after: UUID | None, limit: int) -> list[UUID]:
+    """Пользователи с записями в полосе в порядке user_id, после after.
+
+    Рекурсивный запрос переходит к следующему пользователю по индексу
+    (lane, user_id, id), не читая записи каждого: цена зависит от числа
+    пользователей, а не от размера их очередей.
+    """
+    outbox = NotificationOutbox.__table__
+
+    def next_user(*conditions):
+        # ORDER BY ... LIMIT 1 вместо min(): в PostgreSQL нет агрегата min для uuid
+        return (
+            select(outbox.c.user_id).where(outbox.c.lane == lane, *conditions)
+            .order_by(outbox.c.user_id).limit(1).scalar_subquery()
+        )
+
+    users = select(
+        (next_user(outbox.c.user_id > after) if after is not None else next_user()).label("user_id")
+    ).cte("lane_users", recursive=True)
+    users = users.union_all(
+        select(next_user(outbox.c.user_id > users.c.user_id)).where(users.c.user_id.is_not(None))
+    )
+    return list(db.scalars(select(users.c.user_id).where(users.c.user_id.is_not(None)).limit(limit)))
+
+
+def _fair_users(db, lane: str, limit: int) -> list[UUID]:
+    """До limit пользователей полосы по кругу: продолжение с курсора, затем с начала"""
+    after = _user_cursor.get(lane)
+    users = _lane_users(db, lane, after, limit)
+    if after is not None and len(users) < limit:
+        users += [user_id for user_id in _lane_users(db, lane, None, limit - len(users)) if user_id not in users]
+    return users
+
+
+_COLUMNS = (
+    NotificationOutbox.id, NotificationOutbox.notification_id,
+    NotificationOutbox.user_id, NotificationOutbox.created_at,
+)
+
+
+def _lock_user_rows_statement(lane: str, users: list[UUID], per_user: int):
+    """До per_user самых старых записей каждого пользователя одним запросом (PostgreSQL).
+
+    LATERAL выполняет выборку по индексу (lane, user_id, id) для каждого
+    пользователя; SKIP LOCKED действует внутри неё, поэтому записи,
+    заблокированные другим релеем, не занимают долю пользователя и релей
+    берёт следующие.
+    """
+    relay_users = values(
+        column("user_id", NotificationOutbox.user_id.type), name="relay_users"
+    ).data([(user_id,) for user_id in users])
+    picked = (
+        select(*_COLUMNS)
+        .where(NotificationOutbox.lane == lane, NotificationOutbox.user_id == relay_users.c.user_id)
+        .order_by(NotificationOutbox.id)
+        .limit(per_user)
+        .with_for_update(skip_locked=True)
+        .lateral("picked")
+    )
+    return select(picked).select_from(relay_users).join(picked, true())
+
+
+def _user_rows(db, lane: str, users: list[UUID], per_user: int) -> list:
+    """Самые старые записи пользователей полосы, не заблокированные другими релеями"""
+    if db.get_bind().dialect.name == "postgresql":
+        return db.execute(_lock_user_rows_statement(lane, users, per_user)).all()
+    # В других СУБД (SQLite в тестах) нет LATERAL и блокировок строк: доля считается оконной функцией
+    rank = func.row_number().over(partition_by=NotificationOutbox.user_id, order_by=NotificationOutbox.id)
+    ranked = (
+        select(*_COLUMNS, rank.label("rank"))
+        .where(NotificationOutbox.lane == lane, NotificationOutbox.user_id.in_(users))
+        .subquery()
+    )
+    return db.execute(
+        select(ranked.c.id, ranked.c.notification_id, ranked.c.user_id, ranked.c.created_at)
+        .where(ranked.c.rank <= per_user)
+    ).all()
+
+
+@track_queries
+def relay_batch(lane: str, limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Отправить до limit записей полосы задачами по ANALYSIS_BATCH_SIZE ID; возвращает их количество.
+
+    Записи выбираются по кругу между пользователями: каждый из OUTBOX_FAIR_USERS
+    пользователей прохода даёт равную долю самых старых своих записей.
+    """
+    with sync_session() as db:
+        users = _fair_users(db, lane, min(OUTBOX_FAIR_USERS, limit))
+        if not users:
+            return 0
+        per_user = -(-limit // len(users))
+        rows = _user_rows(db, lane, users, per_user)
+        if not rows:
+            return 0
+        rows = _round_robin(rows)[:limit]
+        ids = [str(row.notification_id) for row in rows]
+        for start in range(0, len(ids), ANALYSIS_BATCH_SIZE):
+            celery_app.send_task(
+                "app.tasks.process_notifications_batch",
+                args=[ids[start:start + ANALYSIS_BATCH_SIZE]],
+                queue=ANALYSIS_QUEUES[lane],
+            )
+        db.execute(
+            delete(NotificationOutbox)
+            .where(NotificationOutbox.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    _user_cursor[lane] = users[-1]
+    now = datetime.utcnow()
+    for row in rows:
+        DISPATCH_LAG.labels(lane).observe((now - row.created_at).total_seconds())
+    return len(rows)
+
+
+def relay_once(batch_size: int = OUTBOX_BATCH_SIZE, max_depth: int = ANALYSIS_QUEUE_MAX_DEPTH) -> int:
+    """Один проход по полосам: каждая дополняет свою очередь брокера до max_depth задач"""
+    sent = 0
+    for lane in LANES:
+        depth = queue_depth(ANALYSIS_QUEUES[lane])
+        # Без Redis длина очереди неизвестна: отправка важнее ограничения
+        free = max_depth - (depth or 0)
+        if free > 0:
+            sent += relay_batch(lane, min(batch_size, free * ANALYSIS_BATCH_SIZE))
+    return sent
+
+
+@track_queries
+def update_metrics() -> None:
+    """Глубина очередей брокера, размер outbox по полосам и самые отстающие пользователи"""
+    for lane in LANES:
+        depth = queue_depth(ANALYSIS_QUEUES[lane])
+        if depth is not None:
+            QUEUE_DEPTH.labels(ANALYSIS_QUEUES[lane]).set(depth)
+    now = datetime.utcnow()
+    with sync_session() as db:
+        pending = dict(db.execute(
+            select(NotificationOutbox.lane, func.count()).group_by(NotificationOutbox.lane)
+        ).all())
+        oldest = func.min(NotificationOutbox.created_at)
+        tenants = db.execute(
+            select(NotificationOutbox.user_id, oldest, func.count())
+            .group_by(NotificationOutbox.user_id)
+            .order_by(oldest)
+            .limit(OUTBOX_LAG_TOP_TENANTS)
+        ).all()
+    for lane in LANES:
+        OUTBOX_PENDING.labels(lane).set(pending.get(lane, 0))
+    # Пользователи, выпавшие из списка, не должны оставаться с последним значением
+    TENANT_LAG.clear()
+    TENANT_PENDING.clear()
+    for user_id, created_at, count in tenants:
+        TENANT_LAG.labels(str(user_id)).set((now - created_at).total_seconds())
+        TENANT_PENDING.labels(str(user_id)).set(count)
+
+
+class RelayWakeup:
+    """Ожидание сигнала API о новых записях; без Redis — обычная пауза между опросами"""
+
+    def __init__(self, timeout: float = OUTBOX_POLL_INTERVAL):
+        self.timeout = timeout
+        self._pubsub = None
+
+    def wait(self) -> None:
+        try:
+            if self._pubsub is None:
+                self._pubsub = get_sync_redis().pubsub(ignore_subscribe_messages=True)
+                self._pubsub.subscribe(OUTBOX_CHANNEL)
+            if self._pubsub.get_message(timeout=self.timeout) is not None:
+                # Несколько сигналов подряд обслуживаются одним проходом по таблице
+                while self._pubsub.get_message(timeout=0) is not None:
+                    pass
+        except (RedisError, OSError) as e:
+            logger.warning(f"Подписка релея outbox недоступна, опрос по интервалу: {e!r}")
+            self._pubsub = None
+            time.sleep(self.timeout)
+
+
+def run() -> None:
+    if OUTBOX_METRICS_PORT:
+        start_http_server(OUTBOX_METRICS_PORT)
+    wakeup = RelayWakeup()
+    metrics_updated = 0.0
+    logger.info("Релей outbox запущен")
+    while True:
+        if time.monotonic() - metrics_updated >= OUTBOX_METRICS_INTERVAL:
+            metrics_updated = time.monotonic()
+            try:
+                update_metrics()
+            except Exception:
+                logger.exception("Не удалось обновить метрики outbox")
+        try:
+            sent = relay_once()
+        except Exception:
+            # Записи остались в outbox и будут отправлены на следующем проходе
+            logger.exception("Ошибка пересылки outbox в Celery")
+            time.sleep(OUTBOX_POLL_INTERVAL)
+            continue
+        if sent:
+            logger.info(f"Отправлено на анализ уведомлений из outbox: {sent}")
+        else:
+            # Новых записей нет или очереди брокера заполнены: ждём сигнала или интервала опроса
+            wakeup.wait()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    run()
@@ -1,34 +1,243 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, update, func, and_, or_, tuple_
 from sqlalchemy.future import select
 from app.models.notification import Notification
+from app.models.notification_archive import NotificationArchive, NotificationArchiveId
+from app.models.notification_outbox import NotificationOutbox
+from app.utils.archive import archive_horizon, unpack_notifications
+from app.utils.ids import created_at_bounds
+from app.utils.db_metrics import track_queries
 from uuid import UUID
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+
+def filter_by_ids(stmt, ids: List[UUID]):
+    """Условие по ID с границами created_at: PostgreSQL просматривает только нужные секции"""
+    if len(ids) == 1:
+        stmt = stmt.where(Notification.id == ids[0])
+    else:
+        stmt = stmt.where(Notification.id.in_(ids))
+    bounds = created_at_bounds(ids)
+    if bounds is not None:
+        stmt = stmt.where(Notification.created_at.between(*bounds))
+    return stmt
 
 class NotificationRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    @track_queries
     async def get_by_id(self, notification_id: UUID) -> Optional[Notification]:
         """Получить уведомление по ID"""
+        result = await self.db.execute(filter_by_ids(select(Notification), [notification_id]))
+        return result.scalars().first() or await self._get_archived(notification_id)
+
+    @track_queries
+    async def get_state(self, notification_id: UUID):
+        """Получить только изменяемые поля уведомления (id, статус, прочтение, категория)"""
         result = await self.db.execute(
-            select(Notification).where(Notification.id == notification_id)
+            filter_by_ids(
+                select(
+                    Notification.id,
+                    Notification.processing_status,
+                    Notification.read_at,
+                    Notification.category,
+                ),
+                [notification_id],
+            )
         )
-        return result.scalars().first()
+        return result.first() or await self._get_archived(notification_id)
+
+    @track_queries
+    async def get_many(self, ids: List[UUID], state_only: bool = False) -> Dict[UUID, Notification]:
+        """Уведомления по списку ID одним запросом; отсутствующие в основной таблице ищутся в архиве.
+
+        С state_only загружаются только изменяемые поля, как в get_state.
+        """
+        columns = (
+            (Notification.id, Notification.processing_status, Notification.read_at, Notification.category)
+            if state_only else (Notification,)
+        )
+        result = await self.db.execute(filter_by_ids(select(*columns), ids))
+        rows = result.all() if state_only else result.scalars().all()
+        found = {row.id: row for row in rows}
+        missing = [notification_id for notification_id in ids if notification_id not in found]
+        if missing:
+            found.update(await self._get_archived_many(missing))
+        return found
+
+    @track_queries
+    async def _get_archived(self, notification_id: UUID) -> Optional[Notification]:
+        """Уведомление из архива; вызывается, только если его нет в основной таблице"""
+        result = await self.db.execute(
+            select(NotificationArchive.user_id, NotificationArchive.payload)
+            .join(
+                NotificationArchiveId,
+                and_(
+                    NotificationArchiveId.user_id == NotificationArchive.user_id,
+                    NotificationArchiveId.day == NotificationArchive.day,
+                ),
+            )
+            .where(NotificationArchiveId.id == notification_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        return next((n for n in unpack_notifications(row.payload, row.user_id) if n.id == notification_id), None)
+
+    @track_queries
+    async def _get_archived_many(self, ids: List[UUID]) -> Dict[UUID, Notification]:
+        """Архивные уведомления по списку ID: каждый блок архива читается один раз"""
+        blocks = (await self.db.execute(
+            select(NotificationArchiveId.user_id, NotificationArchiveId.day)
+            .where(NotificationArchiveId.id.in_(ids))
+            .distinct()
+        )).all()
+        if not blocks:
+            return {}
+        wanted = set(ids)
+        found = {}
+        result = await self.db.execute(
+            select(NotificationArchive.user_id, NotificationArchive.payload)
+            .where(tuple_(NotificationArchive.user_id, NotificationArchive.day).in_([tuple(b) for b in blocks]))
+        )
+        for row in result:
+            found.update((n.id, n) for n in unpack_notifications(row.payload, row.user_id) if n.id in wanted)
+        return found
+
+    @track_queries
+    async def get_list(
+        self,
+        user_id: UUID,
+        after: Tuple[datetime, UUID] | None,
+        limit: int,
+        columns: Sequence[str] | None = None,
+    ) -> List[Notification]:
+        """Получить страницу уведомлений пользователя после позиции (created_at, id).
 
-    async def get_list(self, user_id: UUID, last_created_at: datetime | None, limit: int) -> List[Notification]:
-        query = select(Notification).where(Notification.user_id == user_id)
-        if last_created_at:
-            query = query.where(Notification.created_at < last_created_at)
-        query = query.order_by(Notification.created_at.desc()).limit(limit)
+        С columns (обязательно с id и created_at) загружаются только эти столбцы
+        строками результата, без создания ORM-объектов.
+        """
+        if columns is None:
+            query = select(Notification)
+        else:
+            query = select(*(getattr(Notification, column) for column in columns))
+        query = query.where(Notification.user_id == user_id)
+        if after:
+            created_at, notification_id = after
+            # created_at <= ... даёт границу для idx_user_created, id разрешает равные created_at
+            query = query.where(
+                and_(
+                    Notification.created_at <= created_at,
+                    or_(Notification.created_at < created_at, Notification.id < notification_id),
+                )
+            )
+        query = query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit)
         result = await self.db.execute(query)
-        return result.scalars().all()
+        notifications = result.scalars().all() if columns is None else result.all()
+        # В архиве только уведомления старше горизонта: страница, не дошедшая до него, полна без архива
+        if len(notifications) == limit and notifications[-1].created_at >= archive_horizon():
+            return notifications
+        archived = await self._get_archived_list(user_id, after, limit)
+        if not archived:
+            return notifications
+        merged = sorted([*notifications, *archived], key=lambda n: (n.created_at, n.id), reverse=True)
+        return merged[:limit]
 
+    @track_queries
+    async def _get_archived_list(
+        self,
+        user_id: UUID,
+        after: Tuple[datetime, UUID] | None,
+        limit: int,
+    ) -> List[Notification]:
+        """Не больше limit архивных уведомлений пользователя после позиции (created_at, id)"""
+        query = select(NotificationArchive.payload).where(NotificationArchive.user_id == user_id)
+        if after:
+            query = query.where(NotificationArchive.day <= after[0].date())
+        # В каждом блоке хотя бы одно уведомление, первый может целиком лежать до курсора
+        query = query.order_by(NotificationArchive.day.desc()).limit(limit + 1)
+        notifications = []
+        for payload in (await self.db.execute(query)).scalars():
+            notifications.extend(
+                n for n in unpack_notifications(payload, user_id)
+                if after is None or (n.created_at, n.id) < after
+            )
+            if len(notifications) >= limit:
+                break
+        return notifications[:limit]
+
+    @track_queries
+    async def count_unread(self, user_id: UUID) -> int:
+        """Количество непрочитанных уведомлений пользователя (частичный индекс idx_unread_user)"""
+        result = await self.db.execute(
+            select(func.count())
+            .select_from(Notification)
+            .where(Notification.user_id == user_id, Notification.read_at.is_(None))
+        )
+        return result.scalar_one()
+
+    @track_queries
+    async def mark_read(self, notification_id: UUID) -> Optional[Notification]:
+        """Отметить уведомление прочитанным; None, если оно уже прочитано или не существует"""
+        result = await self.db.execute(
+            filter_by_ids(update(Notification), [notification_id])
+            .where(Notification.read_at.is_(None))
+            .values(read_at=datetime.utcnow())
+            .returning(Notification)
+        )
+        return result.scalars().first()
+
+    @track_queries
+    async def mark_read_many(
+        self,
+        ids: List[UUID] | None = None,
+        user_id: UUID | None = None,
+        until: datetime | None = None,
+        returning: bool = True,
+    ) -> Tuple[int, List[Tuple[UUID, UUID]]]:
+        """Отметить прочитанными одним UPDATE; уже прочитанные не затрагиваются.
+
+        Возвращает количество обновлённых строк и, если returning, пары (id, user_id).
+        """
+        stmt = (
+            update(Notification)
+            .where(Notification.read_at.is_(None))
+            .values(read_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if ids is not None:
+            stmt = filter_by_ids(stmt, ids)
+        else:
+            stmt = stmt.where(Notification.user_id == user_id)
+            if until is not None:
+                stmt = stmt.where(Notification.created_at <= until)
+        if not returning:
+            result = await self.db.execute(stmt)
+            return result.rowcount, []
+        result = await self.db.execute(stmt.returning(Notification.id, Notification.user_id))
+        rows = [(row.id, row.user_id) for row in result.all()]
+        return len(rows), rows
+
+    @track_queries
     async def create(self, notification: Notification) -> Notification:
         self.db.add(notification)
         await self.db.flush()
         return notification
 
+    @track_queries
+    async def add_to_outbox(self, entries: List[dict]) -> None:
+        """Поставить уведомления в очередь на анализ в транзакции сессии (notification_id, user_id, lane)"""
+        if entries:
+            await self.db.execute(insert(NotificationOutbox), entries)
+
+    @track_queries
+    async def create_many(self, rows: List[dict]) -> None:
+        """Создать несколько уведомлений одним многострочным INSERT"""
+        if rows:
+            await self.db.execute(insert(Notification).values(rows))
+
+    @track_queries
     async def update(self, notification: Notification) -> Notification:
         await self.db.flush()
         return notification
\ No newline at end of file
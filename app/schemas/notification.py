@@ -1,6 +1,13 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Any, Literal
+import os
+
+# Максимальное количество уведомлений в одном пакетном запросе
+BATCH_MAX_SIZE = int(os.getenv("NOTIFICATION_BATCH_MAX_SIZE", "1000"))
+# Максимальное количество ID в одном запросе lookup
+LOOKUP_MAX_SIZE = int(os.getenv("NOTIFICATION_LOOKUP_MAX_SIZE", "500"))
 
 class NotificationCreate(BaseModel):
     user_id: UUID
@@ -19,4 +26,81 @@ class NotificationRead(BaseModel):
     processing_status: str
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class NotificationPage(BaseModel):
+    items: list[NotificationRead]
+    # Курсор следующей страницы; None, если элементов больше нет
+    next_cursor: str | None = None
+
+class NotificationSummary(BaseModel):
+    """Поля уведомления для списка во входящих (view=summary)"""
+    id: UUID
+    title: str
+    category: str | None
+    created_at: datetime
+    read_at: datetime | None
+
+class NotificationSummaryPage(BaseModel):
+    items: list[NotificationSummary]
+    next_cursor: str | None = None
+
+class UnreadCount(BaseModel):
+    user_id: UUID
+    unread: int
+
+class NotificationBulkRead(BaseModel):
+    # Либо список ID, либо пользователь с необязательной верхней границей created_at
+    ids: list[UUID] | None = Field(None, min_length=1, max_length=BATCH_MAX_SIZE)
+    user_id: UUID | None = None
+    until: datetime | None = None
+    return_ids: bool = False
+
+    @field_validator("until")
+    @classmethod
+    def to_naive_utc(cls, value: datetime | None) -> datetime | None:
+        # created_at хранится без часового пояса в UTC; asyncpg не сравнивает его со значением с поясом
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    @model_validator(mode="after")
+    def check_selector(self):
+        if (self.ids is None) == (self.user_id is None):
+            raise ValueError("Нужно указать либо ids, либо user_id")
+        if self.ids is not None and self.until is not None:
+            raise ValueError("until используется только вместе с user_id")
+        return self
+
+class NotificationBulkReadResult(BaseModel):
+    updated: int
+    ids: list[UUID] | None = None
+
+class NotificationLookup(BaseModel):
+    ids: list[UUID] = Field(..., min_length=1, max_length=LOOKUP_MAX_SIZE)
+    # "full" — уведомления целиком, "status" — только статусы обработки
+    view: Literal["full", "status"] = "full"
+
+class NotificationLookupItem(BaseModel):
+    id: UUID
+    found: bool
+    notification: NotificationRead | None = None
+    status: str | None = None
+
+class NotificationLookupResult(BaseModel):
+    # Элементы в порядке ID запроса, включая ненайденные
+    items: list[NotificationLookupItem]
+
+class NotificationBatchCreate(BaseModel):
+    # Элементы валидируются по отдельности, чтобы ошибка в одном не отклоняла весь пакет
+    items: list[dict[str, Any]] = Field(..., min_length=1, max_length=BATCH_MAX_SIZE)
+
+class NotificationBatchItem(BaseModel):
+    index: int
+    id: UUID | None = None
+    error: str | None = None
+
+class NotificationBatchResult(BaseModel):
+    created: int
+    failed: int
+    items: list[NotificationBatchItem]
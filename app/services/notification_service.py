@@ -1,32 +1,174 @@
 from app.repositories.notification_repository import NotificationRepository
-from app.schemas.notification import NotificationCreate
+from app.schemas.notification import (
+    NotificationCreate,
+    NotificationRead,
+    NotificationBatchItem,
+    NotificationBatchResult,
+    NotificationBulkRead,
+    NotificationBulkReadResult,
+    NotificationLookup,
+    NotificationLookupItem,
+    NotificationLookupResult,
+    NotificationSummary,
+)
 from app.models.notification import Notification
-from uuid import UUID, uuid4
+from uuid import UUID
 from datetime import datetime
-from app.exceptions import NotificationNotFoundException
-from app.celery_app import celery_app
-from sqlalchemy import update
+from app.exceptions import NotificationNotFoundException, InvalidCursorException, InvalidFieldsException
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.serialization import row_to_dict
+from app.utils.ids import uuid7
+from app.utils.cache import bump_user_cache_version
+from app.utils.detail_cache import detail_cache, MISSING
+from app.utils.counters import get_unread_count, init_unread_count, change_unread_counts
+from app.config.database import after_commit, reads_from_replica
+from app.utils.consistency import read_your_writes
+from app.utils.pubsub import wake_outbox_relay
+from app.analysis.routing import choose_lanes
+from pydantic import ValidationError
+
+# Поля уведомления в ответах API (порядок NotificationRead)
+NOTIFICATION_FIELDS = tuple(NotificationRead.model_fields)
+# Поля списка во входящих (view=summary): без текста уведомления
+SUMMARY_FIELDS = tuple(NotificationSummary.model_fields)
+# Без этих полей нельзя упорядочить страницу и построить курсор
+CURSOR_FIELDS = ("id", "created_at")
+
+
+def select_fields(view: str = "full", fields: str | None = None) -> tuple[str, ...]:
+    """Поля элементов списка: явный список через запятую или набор вида (full, summary)"""
+    if not fields:
+        return SUMMARY_FIELDS if view == "summary" else NOTIFICATION_FIELDS
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = sorted(requested - set(NOTIFICATION_FIELDS))
+    if unknown or not requested:
+        raise InvalidFieldsException(unknown or [fields])
+    return tuple(field for field in NOTIFICATION_FIELDS if field in requested)
 
 
 class NotificationService:
     def __init__(self, repo: NotificationRepository):
         self.repo = repo
 
+    def _invalidate_lists(self, *user_ids: UUID) -> None:
+        """Сбросить кэш списков пользователей после коммита транзакции"""
+        if user_ids:
+            after_commit(self.repo.db, lambda: bump_user_cache_version(*user_ids))
+
+    def _remember_writes(self, user_ids, notification_ids) -> None:
+        """Направлять чтения этих пользователей и уведомлений в основную БД, пока реплики догоняют"""
+        user_ids, notification_ids = list(user_ids), list(notification_ids)
+        if user_ids or notification_ids:
+            after_commit(self.repo.db, lambda: read_your_writes.mark(user_ids, notification_ids))
+
+    def _write_details(self, *notifications: Notification) -> None:
+        """Записать изменённые уведомления в кэш по ID после коммита транзакции"""
+        if notifications:
+            after_commit(self.repo.db, lambda: detail_cache.write(notifications))
+
+    def _invalidate_details(self, notification_ids) -> None:
+        notification_ids = list(notification_ids)
+        if notification_ids:
+            after_commit(self.repo.db, lambda: detail_cache.invalidate(notification_ids))
+
+    async def _enqueue_analysis(self, notifications: list[dict], bulk: bool = False) -> None:
+        """Записать уведомления (id, user_id, text) в outbox той же транзакцией с полосой очереди.
+
+        В Celery их отправит релей после коммита.
+        """
+        lanes = choose_lanes([n["text"] for n in notifications], bulk)
+        await self.repo.add_to_outbox([
+            {"notification_id": n["id"], "user_id": n["user_id"], "lane": lane}
+            for n, lane in zip(notifications, lanes)
+        ])
+        after_commit(self.repo.db, wake_outbox_relay)
+
+    def _change_unread(self, deltas: dict[UUID, int]) -> None:
+        """Изменить счётчики непрочитанных после коммита транзакции"""
+        if deltas:
+            after_commit(self.repo.db, lambda: change_unread_counts(deltas))
+
     async def get_notification(self, notification_id: UUID) -> Notification:
-        """Получить уведомление по ID"""
+        """Получить уведомление по ID (из кэша, если оно там есть)"""
+        cached = await detail_cache.get(notification_id)
+        if cached is MISSING:
+            raise NotificationNotFoundException(str(notification_id))
+        if cached is not None:
+            return cached
         notification = await self.repo.get_by_id(notification_id)
+        # Отсутствие запоминается, только если его подтвердила основная БД: реплика могла отстать
+        if notification or not reads_from_replica(self.repo.db):
+            await detail_cache.fill(notification_id, notification)
         if not notification:
             raise NotificationNotFoundException(str(notification_id))
         return notification
 
-    async def get_notifications(self, user_id: UUID, skip: int, limit: int) -> list[Notification]:
-        """Получить список уведомлений пользователя"""
-        return await self.repo.get_list(user_id, skip, limit)
+    async def lookup(self, data: NotificationLookup) -> NotificationLookupResult:
+        """Уведомления или их статусы по списку ID: кэш одним MGET, остальные одним запросом к БД"""
+        ids = list(dict.fromkeys(data.ids))
+        found = await detail_cache.get_many(ids)
+        missing = [notification_id for notification_id in ids if notification_id not in found]
+        if missing:
+            # Для заполнения кэша нужны уведомления целиком
+            loaded = await self.repo.get_many(missing, state_only=data.view == "status" and not detail_cache.enabled)
+            # Отсутствие не запоминается: чтение могло прийти из отстающей реплики
+            await detail_cache.fill_many(loaded)
+            found.update(loaded)
+
+        items = []
+        for notification_id in data.ids:
+            notification = found.get(notification_id, MISSING)
+            if notification is MISSING:
+                items.append(NotificationLookupItem(id=notification_id, found=False))
+            elif data.view == "status":
+                items.append(NotificationLookupItem(
+                    id=notification_id, found=True, status=notification.processing_status,
+                ))
+            else:
+                items.append(NotificationLookupItem(
+                    id=notification_id, found=True, notification=NotificationRead.model_validate(notification),
+                ))
+        return NotificationLookupResult(items=items)
+
+    async def get_notifications(
+        self,
+        user_id: UUID,
+        cursor: str | None,
+        limit: int,
+        fields: tuple[str, ...] = NOTIFICATION_FIELDS,
+    ) -> dict:
+        """Получить страницу уведомлений пользователя по курсору.
+
+        Страница возвращается словарём с полями NotificationPage: эндпоинт кодирует
+        её сразу, без валидации каждого элемента моделью pydantic. Для неполного
+        набора fields из БД читаются только нужные столбцы.
+        """
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except ValueError:
+                raise InvalidCursorException(cursor)
+
+        # Лишний элемент показывает, есть ли следующая страница
+        columns = None
+        if fields != NOTIFICATION_FIELDS:
+            columns = [*CURSOR_FIELDS, *(field for field in fields if field not in CURSOR_FIELDS)]
+        notifications = await self.repo.get_list(user_id, after, limit + 1, columns)
+        next_cursor = None
+        if len(notifications) > limit:
+            notifications = notifications[:limit]
+            last = notifications[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return {
+            "items": [row_to_dict(n, fields) for n in notifications],
+            "next_cursor": next_cursor,
+        }
 
     async def create_notification(self, notification_data: NotificationCreate) -> Notification:
         """Создать новое уведомление и запустить обработку"""
         new_notification = Notification(
-            id=uuid4(),
+            id=uuid7(),
             user_id=notification_data.user_id,
             title=notification_data.title,
             text=notification_data.text,
@@ -34,29 +176,126 @@ class NotificationService:
             processing_status="pending"
         )
         created_notification = await self.repo.create(new_notification)
+        self._invalidate_lists(created_notification.user_id)
+        self._change_unread({created_notification.user_id: 1})
+        self._remember_writes([created_notification.user_id], [created_notification.id])
+        self._write_details(created_notification)
 
-        # Запуск асинхронной обработки
-        celery_app.send_task("app.tasks.process_notification", args=[str(created_notification.id)])
+        # Анализ запустится только после коммита: воркер не получит ещё невидимый ID
+        await self._enqueue_analysis([{
+            "id": created_notification.id,
+            "user_id": created_notification.user_id,
+            "text": created_notification.text,
+        }])
 
         return created_notification
 
+    async def create_notifications_batch(self, items: list[dict]) -> NotificationBatchResult:
+        """Создать пакет уведомлений одним INSERT и одной записью в outbox"""
+        now = datetime.utcnow()
+        rows = []
+        results = []
+        for index, item in enumerate(items):
+            try:
+                data = NotificationCreate.model_validate(item)
+            except ValidationError as e:
+                error = "; ".join(
+                    f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+                )
+                results.append(NotificationBatchItem(index=index, error=error))
+                continue
+            notification_id = uuid7()
+            rows.append({
+                "id": notification_id,
+                "user_id": data.user_id,
+                "title": data.title,
+                "text": data.text,
+                "created_at": now,
+                "processing_status": "pending",
+            })
+            results.append(NotificationBatchItem(index=index, id=notification_id))
+
+        await self.repo.create_many(rows)
+        self._invalidate_lists(*{row["user_id"] for row in rows})
+        unread = {}
+        for row in rows:
+            unread[row["user_id"]] = unread.get(row["user_id"], 0) + 1
+        self._change_unread(unread)
+        self._remember_writes(unread, [row["id"] for row in rows])
+
+        # Один INSERT в outbox на весь пакет; некритичные уведомления идут в полосу bulk
+        if rows:
+            await self._enqueue_analysis(rows, bulk=True)
+
+        return NotificationBatchResult(
+            created=len(rows),
+            failed=len(results) - len(rows),
+            items=results,
+        )
+
     async def mark_as_read(self, notification_id: UUID) -> Notification:
         """Отметить уведомление как прочитанное"""
-        stmt = (
-            update(Notification)
-            .where(Notification.id == notification_id)
-            .values(read_at=datetime.utcnow())
-            .returning(Notification)
-        )
-        result = await self.repo.db.execute(stmt)
-        notification = result.scalars().first()
+        notification = await self.repo.mark_read(notification_id)
+        if notification:
+            self._invalidate_lists(notification.user_id)
+            self._change_unread({notification.user_id: -1})
+            self._remember_writes([notification.user_id], [notification.id])
+            self._write_details(notification)
+            return notification
+
+        # Повторная отметка не меняет время прочтения и счётчик
+        notification = await self.repo.get_by_id(notification_id)
         if not notification:
             raise NotificationNotFoundException(str(notification_id))
         return notification
 
+    async def mark_many_as_read(self, data: NotificationBulkRead) -> NotificationBulkReadResult:
+        """Отметить прочитанными список уведомлений или все уведомления пользователя до границы"""
+        if data.user_id is not None and not data.return_ids and not detail_cache.enabled:
+            # Все строки принадлежат одному пользователю: ID для счётчиков не нужны,
+            # а без кэша по ID — и для инвалидации
+            updated, _ = await self.repo.mark_read_many(
+                user_id=data.user_id, until=data.until, returning=False
+            )
+            if updated:
+                self._invalidate_lists(data.user_id)
+                self._change_unread({data.user_id: -updated})
+                self._remember_writes([data.user_id], [])
+            return NotificationBulkReadResult(updated=updated)
+
+        updated, rows = await self.repo.mark_read_many(ids=data.ids, user_id=data.user_id, until=data.until)
+        unread = {}
+        for _, user_id in rows:
+            unread[user_id] = unread.get(user_id, 0) - 1
+        self._invalidate_lists(*unread)
+        self._change_unread(unread)
+        self._remember_writes(unread, [notification_id for notification_id, _ in rows])
+        self._invalidate_details(notification_id for notification_id, _ in rows)
+        return NotificationBulkReadResult(
+            updated=updated,
+            ids=[notification_id for notification_id, _ in rows] if data.return_ids else None,
+        )
+
+    async def get_unread_count(self, user_id: UUID) -> int:
+        """Количество непрочитанных уведомлений из счётчика Redis"""
+        count = await get_unread_count(user_id)
+        if count is None:
+            # Холодный старт: один раз считаем по БД и инициализируем счётчик
+            count = await self.repo.count_unread(user_id)
+            await init_unread_count(user_id, count)
+        return count
+
+    async def get_state(self, notification_id: UUID):
+        """Получить изменяемые поля уведомления без загрузки заголовка и текста"""
+        if detail_cache.enabled:
+            # Кэш хранит уведомление целиком: один полный запрос вместо запроса на каждый опрос статуса
+            return await self.get_notification(notification_id)
+        state = await self.repo.get_state(notification_id)
+        if not state:
+            raise NotificationNotFoundException(str(notification_id))
+        return state
+
     async def get_status(self, notification_id: UUID) -> dict:
         """Получить статус обработки уведомления"""
-        notification = await self.repo.get_by_id(notification_id)
-        if not notification:
-            raise NotificationNotFoundException(str(notification_id))
-        return {"status": notification.processing_status}
\ No newline at end of file
+        state = await self.get_state(notification_id)
+        return {"status": state.processing_status}
\ No newline at end of file
@@ -1,56 +1,292 @@
 import random
 import time
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from uuid import UUID
 from celery import shared_task
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, update, insert, delete, func, tuple_
 from sqlalchemy.future import select
 from app.models.notification import Notification
+from app.models.notification_archive import NotificationArchive, NotificationArchiveId
+from app.repositories.notification_repository import filter_by_ids
 from app.config.database import DATABASE_URL
+from app.analysis.client import classify_text, MOCK_LATENCY
+from app.analysis.cache import analysis_cache
+from app.analysis import classifier
+from app.analysis import worker as async_worker
+from app.utils.cache import bump_user_cache_version_sync
+from app.utils.detail_cache import detail_cache
+from app.utils.counters import UNREAD_COUNT_TTL, UNREAD_DIRTY_KEY
+from app.config.redis import get_sync_redis
+from app.utils.pubsub import publish_statuses_sync
+from app.utils import partitions, archive
+from app.utils.db_metrics import InstrumentedQueuePool, instrument_engine, track_queries
 
+logger = logging.getLogger("app")
+
+# Максимальное количество уведомлений, обрабатываемых одним набором запросов
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "100"))
+# Количество команд Redis в одном пайплайне при сверке счётчиков
+UNREAD_RECONCILE_CHUNK = 1000
+# Количество одновременных обращений к AI API внутри пакета
+ANALYSIS_BATCH_CONCURRENCY = int(os.getenv("ANALYSIS_BATCH_CONCURRENCY", "16"))
+
+# Синхронный драйвер для воркера; по умолчанию тот же адрес, что и у API, без asyncpg
+SYNC_DATABASE_URL = os.getenv("SYNC_DATABASE_URL", DATABASE_URL.replace("postgresql+asyncpg", "postgresql"))
 
 sync_engine = create_engine(
-    DATABASE_URL.replace("postgresql+asyncpg", "postgresql"),
+    SYNC_DATABASE_URL,
     pool_size=10,
     max_overflow=5,
-    pool_pre_ping=True
+    pool_pre_ping=True,
+    poolclass=InstrumentedQueuePool,
+    pool_logging_name="worker",
 )
+instrument_engine(sync_engine, "worker")
 sync_session = sessionmaker(sync_engine)
 
 # Синхронная версия функции анализа текста
 def analyze_text(text: str) -> dict:
-    """Имитация работы AI API с задержкой 1-3 секунды."""
-    time.sleep(random.uniform(1, 3))  # Используем time.sleep вместо asyncio.sleep
-    if any(word in text.lower() for word in ["error", "exception", "failed"]):
-        category = "critical"
-        confidence = random.uniform(0.7, 0.95)
-    elif any(word in text.lower() for word in ["warning", "attention", "careful"]):
-        category = "warning"
-        confidence = random.uniform(0.6, 0.9)
-    else:
-        category = "info"
-        confidence = random.uniform(0.8, 0.99)
-    return {
-        "category": category,
-        "confidence": confidence,
-        "keywords": random.sample(text.split(), min(3, len(text.split())))
-    }
+    """Имитация работы AI API с задержкой (по умолчанию 1-3 секунды)."""
+    time.sleep(random.uniform(*MOCK_LATENCY))  # Используем time.sleep вместо asyncio.sleep
+    return classify_text(text)
+
+def _safe_analyze(text: str) -> dict | None:
+    """Анализ текста через кэш результатов, при ошибке AI API возвращает None."""
+    try:
+        return analysis_cache.get_or_compute(text, analyze_text)
+    except Exception:
+        logger.exception("Ошибка анализа текста уведомления")
+        return None
+
+def _analyze_many(texts: list[str]) -> list[dict | None]:
+    """Параллельный анализ текстов пакета: вызовы AI API ограничены вводом-выводом."""
+    if classifier.ANALYSIS_ENGINE != "api":
+        # Локальный движок получает весь пакет одним вызовом
+        return classifier.classify_many(texts)
+    if len(texts) == 1:
+        return [_safe_analyze(texts[0])]
+    with ThreadPoolExecutor(max_workers=min(len(texts), ANALYSIS_BATCH_CONCURRENCY)) as executor:
+        return list(executor.map(_safe_analyze, texts))
+
+@track_queries
+def _process_chunk(notification_ids: list[UUID]) -> None:
+    """Обработка части пакета: один SELECT ... IN, один UPDATE статуса и один массовый UPDATE результатов."""
+    with sync_session() as db:
+        rows = db.execute(
+            filter_by_ids(
+                select(Notification.id, Notification.created_at, Notification.user_id, Notification.text),
+                notification_ids,
+            )
+        ).all()
+        if len(rows) < len(notification_ids):
+            logger.warning(f"Не найдены уведомления для анализа: {len(notification_ids) - len(rows)} из {len(notification_ids)}")
+        if not rows:
+            return
+        user_ids = {row.user_id for row in rows}
+        created = [row.created_at for row in rows]
+
+        db.execute(
+            update(Notification)
+            .where(
+                Notification.id.in_([row.id for row in rows]),
+                Notification.created_at.between(min(created), max(created)),
+            )
+            .values(processing_status="processing")
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        bump_user_cache_version_sync(*user_ids)
+        detail_cache.patch_sync([{"id": row.id, "processing_status": "processing"} for row in rows])
+        publish_statuses_sync([(row.id, "processing") for row in rows])
+
+        analyses = _analyze_many([row.text for row in rows])
+
+        # Массовый UPDATE по первичному ключу (id, created_at): каждая строка ищется в своей секции
+        values = [
+            {
+                "id": row.id,
+                "created_at": row.created_at,
+                "category": analysis["category"],
+                "confidence": analysis["confidence"],
+                "processing_status": "completed",
+            }
+            if analysis is not None
+            else {"id": row.id, "created_at": row.created_at, "processing_status": "failed"}
+            for row, analysis in zip(rows, analyses)
+        ]
+        db.execute(update(Notification), values)
+        db.commit()
+        bump_user_cache_version_sync(*user_ids)
+        detail_cache.patch_sync(values)
+        publish_statuses_sync([(value["id"], value["processing_status"]) for value in values])
 
 @shared_task
 def process_notification(notification_id: str):
-    """Синхронная задача Celery для обработки уведомления."""
-    with sync_session() as db:  # Создаём синхронную сессию базы данных
-        # Находим уведомление по ID
-        notification = db.query(Notification).filter(Notification.id == notification_id).first()
-        if notification:
-            # Обновляем статус на "processing"
-            notification.processing_status = "processing"
-            db.commit()
-
-            # Анализируем текст
-            analysis = analyze_text(notification.text)
-
-            # Обновляем уведомление с результатами анализа
-            notification.category = analysis["category"]
-            notification.confidence = analysis["confidence"]
-            notification.processing_status = "completed"
-            db.commit()
\ No newline at end of file
+    """Синхронная задача Celery для обработки уведомления (совместимость с пакетной обработкой)."""
+    process_notifications_batch([notification_id])
+
+@shared_task
+def process_notifications_batch(notification_ids: list[str]):
+    """Задача Celery для обработки пакета уведомлений частями по ANALYSIS_BATCH_SIZE."""
+    ids = [UUID(notification_id) for notification_id in notification_ids]
+    if async_worker.ANALYSIS_WORKER_MODE == "async":
+        async_worker.run_batch(ids, ANALYSIS_BATCH_SIZE)
+        return
+    for start in range(0, len(ids), ANALYSIS_BATCH_SIZE):
+        _process_chunk(ids[start:start + ANALYSIS_BATCH_SIZE])
+
+
+# Записать значение из БД, только если счётчик не изменился с момента чтения перед запросом к БД.
+# KEYS — счётчики; ARGV — пары (значение до запроса, значение из БД) в порядке KEYS и последним TTL.
+RECONCILE_SCRIPT = """
+local ttl = ARGV[#ARGV]
+local updated = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[2 * i - 1] then
+        redis.call('SET', key, ARGV[2 * i], 'EX', ttl)
+        updated = updated + 1
+    end
+end
+return updated
+"""
+
+
+@shared_task
+@track_queries
+def reconcile_unread_counts():
+    """Периодическая сверка с БД счётчиков непрочитанных, изменённых с прошлой сверки.
+
+    Между чтением из БД и записью в Redis может прийти инкремент запроса API:
+    значение из БД записывается, только если счётчик не изменился с момента
+    чтения перед запросом к БД. Изменённый счётчик снова попал в UNREAD_DIRTY_KEY
+    и будет сверен в следующий раз.
+    """
+    redis = get_sync_redis()
+    reconcile = redis.register_script(RECONCILE_SCRIPT)
+    checked = updated = 0
+    while keys := [key.decode() for key in redis.spop(UNREAD_DIRTY_KEY, UNREAD_RECONCILE_CHUNK) or []]:
+        # Отсутствующие счётчики не создаются: их инициализирует первое чтение
+        seen = {key: value for key, value in zip(keys, redis.mget(keys)) if value is not None}
+        if not seen:
+            continue
+        user_ids = [UUID(key.rsplit(":", 1)[1]) for key in seen]
+        with sync_session() as db:
+            # Запрос обслуживается частичным индексом idx_unread_user
+            counts = dict(db.execute(
+                select(Notification.user_id, func.count())
+                .where(Notification.read_at.is_(None), Notification.user_id.in_(user_ids))
+                .group_by(Notification.user_id)
+            ).all())
+        args = []
+        for user_id, value in zip(user_ids, seen.values()):
+            args += [value, counts.get(user_id, 0)]
+        updated += reconcile(keys=list(seen), args=[*args, UNREAD_COUNT_TTL])
+        checked += len(seen)
+    logger.info(f"Сверены счётчики непрочитанных: проверено {checked}, исправлено или продлено {updated}")
+
+
+@shared_task
+@track_queries
+def maintain_notification_partitions():
+    """Периодическое обслуживание секций: новые месяцы заранее, устаревшие — отсоединить или удалить."""
+    with sync_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not partitions.is_partitioned(conn):
+            logger.info("Таблица уведомлений не секционирована, обслуживание секций пропущено")
+            return
+        created, expired = partitions.maintain_partitions(conn, datetime.utcnow().date())
+    if created:
+        logger.info(f"Созданы секции уведомлений: {', '.join(created)}")
+    if expired:
+        logger.info(f"Убраны устаревшие секции уведомлений: {', '.join(expired)}")
+
+
+@track_queries
+def _archive_batch(db, cutoff: datetime) -> int:
+    """Перенести в архив одну порцию прочитанных уведомлений старше cutoff; возвращает их количество."""
+    notifications = db.execute(
+        select(Notification)
+        .where(Notification.read_at.is_not(None), Notification.created_at < cutoff)
+        .order_by(Notification.created_at)
+        .limit(archive.ARCHIVE_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not notifications:
+        return 0
+
+    groups: dict[tuple, list[Notification]] = {}
+    for notification in notifications:
+        groups.setdefault((notification.user_id, notification.created_at.date()), []).append(notification)
+
+    for (user_id, day), group in groups.items():
+        # Блок за день дополняется, если часть уведомлений дня уже в архиве
+        block = db.get(NotificationArchive, (user_id, day), with_for_update=True)
+        if block is None:
+            block = NotificationArchive(user_id=user_id, day=day)
+            db.add(block)
+        else:
+            group = archive.unpack_notifications(block.payload, user_id) + group
+        block.payload = archive.pack_notifications(group)
+        block.count = len(group)
+
+    db.execute(insert(NotificationArchiveId), [
+        {"id": n.id, "user_id": n.user_id, "day": n.created_at.date()} for n in notifications
+    ])
+    db.execute(
+        delete(Notification)
+        .where(
+            Notification.id.in_([n.id for n in notifications]),
+            Notification.created_at.between(notifications[0].created_at, notifications[-1].created_at),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return len(notifications)
+
+@track_queries
+def _expire_archive_batch(db, cutoff: date) -> int:
+    """Удалить порцию блоков архива и ID архивных уведомлений за дни раньше cutoff; возвращает наибольшую из порций."""
+    ids = select(NotificationArchiveId.id).where(NotificationArchiveId.day < cutoff).limit(archive.ARCHIVE_BATCH_SIZE)
+    expired_ids = db.execute(
+        delete(NotificationArchiveId).where(NotificationArchiveId.id.in_(ids))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    blocks = (
+        select(NotificationArchive.user_id, NotificationArchive.day)
+        .where(NotificationArchive.day < cutoff)
+        .limit(archive.ARCHIVE_BATCH_SIZE)
+    )
+    expired_blocks = db.execute(
+        delete(NotificationArchive).where(tuple_(NotificationArchive.user_id, NotificationArchive.day).in_(blocks))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return max(expired_ids, expired_blocks)
+
+@shared_task
+def archive_read_notifications():
+    """Периодический перенос прочитанных уведомлений старше NOTIFICATION_ARCHIVE_AFTER_DAYS в архив.
+
+    Архив за дни старше NOTIFICATION_RETENTION_MONTHS удаляется: уведомления,
+    ушедшие в архив, не попадают под удаление секций горячей таблицы.
+    """
+    cutoff = archive.archive_horizon()
+    total = 0
+    with sync_session() as db:
+        while True:
+            archived = _archive_batch(db, cutoff)
+            total += archived
+            if archived < archive.ARCHIVE_BATCH_SIZE:
+                break
+    logger.info(f"Перенесено в архив уведомлений: {total}")
+
+    retention_cutoff = archive.retention_cutoff(datetime.utcnow().date())
+    if retention_cutoff is None:
+        return
+    with sync_session() as db:
+        while _expire_archive_batch(db, retention_cutoff) >= archive.ARCHIVE_BATCH_SIZE:
+            pass
+    logger.info(f"Удалён архив уведомлений до {retention_cutoff.isoformat()}")
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
+from app.config.redis import set_redis
 
 
 @pytest.fixture(autouse=True)
@@ -40,4 +41,28 @@ async def init_cache():
         # Очищаем кэш после теста (используем AsyncMock)
         clear_mock = AsyncMock()
         with patch('fastapi_cache.FastAPICache.clear', clear_mock):
-            await FastAPICache.clear()
\ No newline at end of file
+            await FastAPICache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_redis():
+    # Общее подключение к Redis не должно переходить между тестами
+    set_redis(None)
+    yield
+    set_redis(None)
+
+
+@pytest.fixture(autouse=True)
+def reset_analysis_cache():
+    # Результаты анализа не должны переходить между тестами
+    from app.analysis.cache import analysis_cache
+    analysis_cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_detail_cache():
+    # Локальные копии уведомлений не должны переходить между тестами
+    from app.utils.detail_cache import detail_cache
+    detail_cache.clear()
+    yield
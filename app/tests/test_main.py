@@ -83,8 +83,8 @@ def mock_redis_and_celery():
         mock_redis_instance.ping.return_value = True
         mock_redis.return_value = mock_redis_instance
 
-        # Мокируем Celery
-        with patch("app.services.notification_service.celery_app") as mock_celery:
+        # Мокируем Celery: задачи отправляет только релей outbox
+        with patch("app.outbox_relay.celery_app") as mock_celery:
             mock_celery.send_task.return_value = MagicMock()
             yield
 
@@ -128,6 +128,47 @@ async def test_create_notification(async_client, setup_database):
     assert "id" in data
 
 
+# Тест для пакетного создания уведомлений
+@pytest.mark.asyncio
+async def test_create_notifications_batch(async_client, db_session, setup_database):
+    user_id = str(uuid.uuid4())
+    items = [
+        {"user_id": user_id, "title": "First", "text": "Error happened"},
+        {"user_id": "not-a-uuid", "title": "Broken", "text": "Test text"},
+        {"user_id": user_id, "title": "Second", "text": "All good"},
+    ]
+
+    response = await async_client.post("/api/v1/notifications/batch", json={"items": items})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["failed"] == 1
+    assert [item["index"] for item in data["items"]] == [0, 1, 2]
+    assert data["items"][0]["id"] is not None
+    assert data["items"][1]["id"] is None
+    assert "user_id" in data["items"][1]["error"]
+
+    # Весь пакет ставится на анализ в outbox той же транзакцией
+    from sqlalchemy import select
+    from app.models.notification_outbox import NotificationOutbox
+    queued = (await db_session.execute(
+        select(NotificationOutbox.notification_id, NotificationOutbox.lane).order_by(NotificationOutbox.id)
+    )).all()
+    # Похожее на критичное уведомление идёт в полосу priority, остальные уведомления пакета — в bulk
+    assert [(str(notification_id), lane) for notification_id, lane in queued] == [
+        (data["items"][0]["id"], "priority"), (data["items"][2]["id"], "bulk"),
+    ]
+
+    created = await db_session.get(Notification, uuid.UUID(data["items"][2]["id"]))
+    assert created.title == "Second"
+    assert created.processing_status == "pending"
+
+    # Пустой пакет отклоняется валидацией
+    response = await async_client.post("/api/v1/notifications/batch", json={"items": []})
+    assert response.status_code == 422
+
+
 # Тест для получения списка уведомлений
 @pytest.mark.asyncio
 async def test_get_notifications(async_client, db_session, setup_database):
@@ -160,14 +201,15 @@ async def test_get_notifications(async_client, db_session, setup_database):
 
         # Получаем уведомления через API
         response = await async_client.get(
-            f"/api/v1/notifications/?user_id={user_id}&skip=0&limit=10"
+            f"/api/v1/notifications/?user_id={user_id}&limit=10"
         )
 
         assert response.status_code == 200
         data = response.json()
-        assert len(data) == 3
+        assert len(data["items"]) == 3
+        assert data["next_cursor"] is None
 
-    # Проверяем пагинацию с новым патчем
+    # Проверяем курсорную пагинацию с новым патчем
     with patch('fastapi_cache.FastAPICache.get_backend') as mock_get_backend:
         backend = AsyncMock()
         backend.get = AsyncMock(return_value=None)
@@ -175,13 +217,68 @@ async def test_get_notifications(async_client, db_session, setup_database):
         mock_get_backend.return_value = backend
 
         response = await async_client.get(
-            f"/api/v1/notifications/?user_id={user_id}&skip=1&limit=1"
+            f"/api/v1/notifications/?user_id={user_id}&limit=2"
         )
 
         assert response.status_code == 200
-        data = response.json()
-        assert len(data) == 1
-        assert data[0]["title"] == "Test Notification 1"
+        first_page = response.json()
+        assert len(first_page["items"]) == 2
+        assert first_page["next_cursor"] is not None
+
+        response = await async_client.get(
+            f"/api/v1/notifications/?user_id={user_id}&limit=2&cursor={first_page['next_cursor']}"
+        )
+
+        assert response.status_code == 200
+        second_page = response.json()
+        assert len(second_page["items"]) == 1
+        assert second_page["next_cursor"] is None
+
+        returned_ids = [item["id"] for item in first_page["items"] + second_page["items"]]
+        assert sorted(returned_ids) == sorted(str(n.id) for n in notifications)
+
+
+# Тест для стабильной пагинации при одинаковом created_at
+@pytest.mark.asyncio
+async def test_get_notifications_cursor_ties(async_client, db_session, setup_database):
+    user_id = uuid.uuid4()
+    created_at = datetime.utcnow()
+    ids = [uuid.uuid4() for _ in range(5)]
+    for notification_id in ids:
+        db_session.add(Notification(
+            id=notification_id,
+            user_id=user_id,
+            title="Test Notification",
+            text="Test text",
+            created_at=created_at,
+            processing_status="completed",
+        ))
+    await db_session.commit()
+
+    with patch('fastapi_cache.FastAPICache.get_backend') as mock_get_backend:
+        backend = AsyncMock()
+        backend.get_with_ttl = AsyncMock(return_value=(None, None))
+        mock_get_backend.return_value = backend
+
+        returned_ids = []
+        cursor = None
+        while True:
+            url = f"/api/v1/notifications/?user_id={user_id}&limit=2"
+            if cursor:
+                url += f"&cursor={cursor}"
+            response = await async_client.get(url)
+            assert response.status_code == 200
+            page = response.json()
+            returned_ids.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        # Все элементы ровно по одному разу, в порядке убывания id при равном created_at
+        assert returned_ids == [str(i) for i in sorted(ids, reverse=True)]
+
+        response = await async_client.get(f"/api/v1/notifications/?user_id={user_id}&cursor=broken")
+        assert response.status_code == 400
 
 
 # Тест для получения детальной информации об уведомлении
@@ -333,7 +430,7 @@ async def test_notifications_caching(async_client, db_session, setup_database):
         mock_get_backend.return_value = backend
 
         response = await async_client.get(
-            f"/api/v1/notifications/?user_id={user_id}&skip=0&limit=10"
+            f"/api/v1/notifications/?user_id={user_id}&limit=10"
         )
 
         assert response.status_code == 200
@@ -343,7 +440,7 @@ async def test_notifications_caching(async_client, db_session, setup_database):
 
     # Второй запрос (должен использовать кэш)
     # Вместо списка используем строку JSON, которая хешируема
-    cached_data = json.dumps([{
+    cached_data = json.dumps({"items": [{
         "id": str(notification.id),
         "user_id": str(user_id),
         "title": "Test Notification",
@@ -353,7 +450,7 @@ async def test_notifications_caching(async_client, db_session, setup_database):
         "category": "info",
         "confidence": 0.9,
         "processing_status": "completed"
-    }])
+    }], "next_cursor": None})
 
     with patch('fastapi_cache.FastAPICache.get_backend') as mock_get_backend:
         backend = AsyncMock()
@@ -365,13 +462,13 @@ async def test_notifications_caching(async_client, db_session, setup_database):
         # Патчим декодирование кэша, чтобы оно возвращало правильный объект
         with patch('fastapi_cache.coder.JsonCoder.decode', return_value=json.loads(cached_data)):
             response = await async_client.get(
-                f"/api/v1/notifications/?user_id={user_id}&skip=0&limit=10"
+                f"/api/v1/notifications/?user_id={user_id}&limit=10"
             )
 
             assert response.status_code == 200
             data = response.json()
-            assert len(data) == 1
-            assert data[0]["id"] == str(notification.id)
+            assert len(data["items"]) == 1
+            assert data["items"][0]["id"] == str(notification.id)
 
 
 # Тест для startup события
@@ -382,10 +479,12 @@ async def test_startup_event():
         mock_redis_instance.ping.return_value = True
         mock_redis.return_value = mock_redis_instance
 
-        with patch("app.main.FastAPICache") as mock_cache:
+        with patch("app.main.FastAPICache") as mock_cache, patch("app.main.pubsub_hub") as mock_hub:
+            mock_hub.start = AsyncMock()
             await startup()
             mock_redis.assert_called_once()
             mock_cache.init.assert_called_once()
+            mock_hub.start.assert_awaited_once_with(mock_redis_instance)
 
 
 # Тест для обработки исключений
@@ -400,4 +499,1452 @@ async def test_exception_handlers(async_client, setup_database):
     assert response.status_code == 422
 
     # Проверяем, что обработчик исключений настроен
-    assert Exception in app.exception_handlers
\ No newline at end of file
+    assert Exception in app.exception_handlers
+
+# Тест для пакетной обработки уведомлений задачей Celery
+def test_process_notifications_batch():
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    from app.tasks import process_notifications_batch, process_notification
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(engine)
+
+    user_id = uuid.uuid4()
+    ids = [uuid.uuid4() for _ in range(3)]
+    with session_factory() as db:
+        for notification_id, text in zip(ids, ["Error happened", "Warning: disk", "Hello"]):
+            db.add(Notification(
+                id=notification_id,
+                user_id=user_id,
+                title="Test Notification",
+                text=text,
+                created_at=datetime.utcnow(),
+                processing_status="pending",
+            ))
+        db.commit()
+
+    def fake_analyze(text):
+        if text == "Hello":
+            raise RuntimeError("AI API недоступен")
+        return {"category": "critical" if "Error" in text else "warning", "confidence": 0.9, "keywords": []}
+
+    with patch("app.tasks.sync_session", session_factory), \
+            patch("app.tasks.analyze_text", side_effect=fake_analyze), \
+            patch("app.tasks.ANALYSIS_BATCH_SIZE", 2), \
+            patch("app.tasks.bump_user_cache_version_sync") as mock_bump:
+        # Несуществующий ID пропускается без ошибки
+        process_notifications_batch([str(i) for i in ids] + [str(uuid.uuid4())])
+
+    with session_factory() as db:
+        rows = {n.id: n for n in db.query(Notification).all()}
+    assert rows[ids[0]].category == "critical"
+    assert rows[ids[0]].processing_status == "completed"
+    assert rows[ids[1]].category == "warning"
+    assert rows[ids[2]].processing_status == "failed"
+    # Кэш списков пользователя сбрасывается после каждой фиксации статусов
+    mock_bump.assert_called_with(user_id)
+
+    # Задача для одного уведомления использует пакетную обработку
+    with patch("app.tasks.process_notifications_batch") as mock_batch:
+        process_notification(str(ids[0]))
+        mock_batch.assert_called_once_with([str(ids[0])])
+
+
+# Тест для пересылки outbox в Celery
+def test_outbox_relay():
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    from app.models.notification_outbox import NotificationOutbox
+    from app.outbox_relay import relay_batch, relay_once, update_metrics, TENANT_PENDING
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(engine)
+    noisy, quiet = uuid.uuid4(), uuid.uuid4()
+    # Пользователь с большим пакетом записал свои уведомления раньше
+    entries = [(noisy, "bulk")] * 4 + [(quiet, "bulk"), (quiet, "priority")]
+    ids = [uuid.uuid4() for _ in entries]
+    with session_factory() as db:
+        db.add_all(
+            NotificationOutbox(notification_id=notification_id, user_id=user_id, lane=lane)
+            for notification_id, (user_id, lane) in zip(ids, entries)
+        )
+        db.commit()
+
+    with patch("app.outbox_relay.sync_session", session_factory), \
+            patch("app.outbox_relay.ANALYSIS_BATCH_SIZE", 2), \
+            patch("app.outbox_relay.celery_app") as mock_celery:
+        # Сбой брокера оставляет записи в outbox
+        mock_celery.send_task.side_effect = ConnectionError("брокер недоступен")
+        with pytest.raises(ConnectionError):
+            relay_batch("bulk", limit=3)
+        with session_factory() as db:
+            assert db.query(NotificationOutbox).count() == 6
+        mock_celery.send_task.reset_mock(side_effect=True)
+
+        # Уведомления пользователей чередуются: второй пользователь не ждёт весь чужой пакет
+        assert relay_batch("bulk", limit=3) == 3
+        calls = mock_celery.send_task.call_args_list
+        assert [call.kwargs["args"][0] for call in calls] == [[str(ids[0]), str(ids[4])], [str(ids[1])]]
+        assert {call.kwargs["queue"] for call in calls} == {"analysis.bulk"}
+
+        update_metrics()
+        assert TENANT_PENDING.labels(str(noisy))._value.get() == 2
+
+        # Полоса с заполненной очередью брокера ждёт в outbox, остальные отправляются
+        mock_celery.send_task.reset_mock()
+        depths = {"analysis.priority": 0, "analysis.default": 0, "analysis.bulk": 20}
+        with patch("app.outbox_relay.queue_depth", side_effect=depths.get):
+            assert relay_once() == 1
+        assert mock_celery.send_task.call_args.kwargs["queue"] == "analysis.priority"
+        with patch("app.outbox_relay.queue_depth", return_value=0):
+            assert relay_once() == 2
+            assert relay_once() == 0
+    with session_factory() as db:
+        assert db.query(NotificationOutbox).count() == 0
+
+
+# Тест для одновременных релеев outbox: второй релей берёт следующие записи, а не пустой набор
+def test_outbox_relay_concurrent():
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.pool import StaticPool
+    from app.models.notification_outbox import NotificationOutbox
+    from app.outbox_relay import relay_batch, _lock_user_rows_statement
+
+    # В PostgreSQL записи всех пользователей прохода выбираются одним запросом; SKIP LOCKED
+    # действует внутри выборки пользователя, поэтому чужие блокировки не занимают его долю
+    noisy, quiet = uuid.uuid4(), uuid.uuid4()
+    sql = " ".join(str(_lock_user_rows_statement("bulk", [noisy, quiet], 2).compile(
+        dialect=postgresql.dialect()
+    )).split())
+    assert "FROM (VALUES (%(param_1)s::UUID), (%(param_2)s::UUID)) AS relay_users (user_id) JOIN LATERAL (" in sql
+    assert "notification_outbox.user_id = relay_users.user_id ORDER BY notification_outbox.id " \
+        "LIMIT %(param_3)s FOR UPDATE SKIP LOCKED) AS picked ON true" in sql
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(engine)
+    entries = [noisy] * 6 + [quiet] * 2
+    ids = {uuid.uuid4(): user_id for user_id in entries}
+    with session_factory() as db:
+        db.add_all(NotificationOutbox(notification_id=notification_id, user_id=user_id, lane="bulk")
+                   for notification_id, user_id in ids.items())
+        db.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    sent = []
+    with patch("app.outbox_relay.sync_session", session_factory), \
+            patch("app.outbox_relay.ANALYSIS_BATCH_SIZE", 4), \
+            patch.dict("app.outbox_relay._user_cursor", clear=True), \
+            patch("app.outbox_relay.celery_app") as mock_celery:
+        mock_celery.send_task.side_effect = lambda name, args, queue: sent.append(args[0])
+        assert relay_batch("bulk", limit=4) == 4
+        # Записи пользователей прохода читаются одним запросом, а не запросом на пользователя
+        assert len([s for s in statements if "row_number()" in s]) == 1
+        assert relay_batch("bulk", limit=4) == 4
+
+    # Первый проход взял по две записи каждого пользователя, второй — следующие записи пакета
+    assert [ids[uuid.UUID(i)] for i in sent[0]].count(quiet) == 2
+    assert not set(sent[0]) & set(sent[1])
+    assert {ids[uuid.UUID(i)] for i in sent[1]} == {noisy}
+    with session_factory() as db:
+        assert db.query(NotificationOutbox).count() == 0
+
+
+# Тест для асинхронного воркера анализа
+@pytest.mark.asyncio
+async def test_process_batch_async(db_session, setup_database):
+    import asyncio
+    from app.analysis.client import AsyncAnalyzerClient
+    from app.analysis.worker import process_batch_async
+
+    user_id = uuid.uuid4()
+    ids = [uuid.uuid4() for _ in range(5)]
+    for notification_id in ids:
+        db_session.add(Notification(
+            id=notification_id,
+            user_id=user_id,
+            title="Test Notification",
+            text="Error happened",
+            created_at=datetime.utcnow(),
+            processing_status="pending",
+        ))
+    await db_session.commit()
+
+    client = AsyncAnalyzerClient(concurrency=2, latency=(0.01, 0.01))
+    in_flight = 0
+    max_in_flight = 0
+    original_sleep = asyncio.sleep
+
+    async def tracking_sleep(delay):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await original_sleep(delay)
+        in_flight -= 1
+
+    import threading
+    redis_threads = set()
+
+    with patch("app.analysis.client.asyncio.sleep", tracking_sleep), \
+            patch("app.analysis.worker.bump_user_cache_version_sync",
+                  side_effect=lambda *user_ids: redis_threads.add(threading.get_ident())):
+        await process_batch_async(ids, chunk_size=2, client=client, session_factory=TestingSessionLocal)
+
+    # Лимит одновременных запросов к AI API соблюдается для всех частей пакета
+    assert max_in_flight == 2
+    # Синхронный Redis вызывается вне потока цикла событий
+    assert redis_threads and threading.get_ident() not in redis_threads
+
+    db_session.expire_all()
+    for notification_id in ids:
+        notification = await db_session.get(Notification, notification_id)
+        assert notification.processing_status == "completed"
+        assert notification.category == "critical"
+
+
+# Тест для версионирования кэша списков пользователя
+@pytest.mark.asyncio
+async def test_user_cache_versioning():
+    from starlette.requests import Request
+    from app.config.redis import set_redis
+    from app.config.database import after_commit
+    from app.utils.cache import custom_key_builder, bump_user_cache_version
+    from app.api.v1.endpoints.notifications import get_notifications
+    from unittest.mock import ANY
+
+    user_id = str(uuid.uuid4())
+    request = Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/notifications/",
+        "query_string": f"user_id={user_id}&limit=10".encode(),
+        "headers": [],
+    })
+
+    # Без Redis используется нулевая версия
+    key = await custom_key_builder(get_notifications, "test:notifications", request=request)
+    assert f":{user_id}:v0:none:10" in key
+
+    redis = AsyncMock()
+    redis.getex = AsyncMock(return_value=b"7")
+    pipeline = MagicMock()
+    pipeline.__aenter__ = AsyncMock(return_value=pipeline)
+    pipeline.__aexit__ = AsyncMock(return_value=False)
+    pipeline.execute = AsyncMock()
+    redis.pipeline = MagicMock(return_value=pipeline)
+    set_redis(redis)
+
+    key = await custom_key_builder(get_notifications, "test:notifications", request=request)
+    assert f":{user_id}:v7:none:10" in key
+
+    # user_id в другом регистре попадает в ту же запись и читает ту же версию, что увеличивает инвалидация
+    mixed_request = Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/notifications/",
+        "query_string": f"user_id={user_id.upper()}&limit=10".encode(),
+        "headers": [],
+    })
+    assert await custom_key_builder(get_notifications, "test:notifications", request=mixed_request) == key
+    redis.getex.assert_awaited_with(f"notifications:cache-version:{user_id}", ex=ANY)
+
+    # Версия увеличивается одной пачкой команд для всех пользователей
+    await bump_user_cache_version(user_id, user_id)
+    pipeline.incr.assert_called_once_with(f"notifications:cache-version:{user_id}")
+    pipeline.execute.assert_awaited_once()
+
+    # Отложенные действия выполняются только после коммита сессии запроса
+    callback = AsyncMock()
+    with patch("app.config.database.async_session", TestingSessionLocal):
+        sessions = get_session()
+        session = await sessions.__anext__()
+        after_commit(session, callback)
+        callback.assert_not_awaited()
+        with pytest.raises(StopAsyncIteration):
+            await sessions.__anext__()
+    callback.assert_awaited_once()
+
+
+# Тест для распределённого ограничения скорости запросов
+@pytest.mark.asyncio
+async def test_rate_limit_middleware():
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    from app.config.redis import set_redis
+    from app.middlewares.rate_limit import RateLimitMiddleware
+
+    limited_app = FastAPI()
+    limited_app.add_middleware(
+        RateLimitMiddleware,
+        rate_limit_per_minute=100,
+        key_by="user_id",
+        route_limits={"/batch": 2},
+    )
+
+    @limited_app.get("/batch")
+    async def batch():
+        return {"ok": True}
+
+    async with AsyncClient(app=limited_app, base_url="http://test") as client:
+        # Без Redis работает локальный лимит со своим значением для маршрута
+        for remaining in (1, 0):
+            response = await client.get("/batch?user_id=a")
+            assert response.status_code == 200
+            assert response.headers["X-RateLimit-Limit"] == "2"
+            assert response.headers["X-RateLimit-Remaining"] == str(remaining)
+
+        response = await client.get("/batch?user_id=a")
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+
+        # Лимит считается отдельно для каждого пользователя
+        response = await client.get("/batch?user_id=b")
+        assert response.status_code == 200
+
+        # С Redis решение принимает Lua-скрипт, один вызов на запрос
+        script = AsyncMock(return_value=[0, 0, 1500, 30000])
+        redis = MagicMock()
+        redis.register_script = MagicMock(return_value=script)
+        set_redis(redis)
+
+        response = await client.get("/batch?user_id=c")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert response.headers["X-RateLimit-Reset"] == "30"
+        # Ключ пользователя включает адрес клиента: чужой клиент не исчерпает его бакет
+        script.assert_awaited_once_with(keys=["ratelimit:/batch:ip:127.0.0.1:user:c"], args=[2, 60_000])
+
+        # Ошибка Redis не блокирует запросы: используется локальный лимит
+        script.side_effect = RedisConnectionError("down")
+        response = await client.get("/batch?user_id=c")
+        assert response.status_code == 200
+        assert response.headers["X-RateLimit-Remaining"] == "1"
+
+
+# Тест для ограничения памяти локального лимитера
+def test_local_token_bucket_eviction():
+    from app.middlewares.rate_limit import LocalTokenBucket
+
+    bucket = LocalTokenBucket(max_clients=3, window_ms=60_000)
+    for i in range(10):
+        assert bucket.hit(f"ip:{i}", 5)[0]
+    # Число отслеживаемых клиентов не превышает лимит, вытесняются самые давние
+    assert len(bucket) == 3
+    assert set(bucket._slots) == {"ip:7", "ip:8", "ip:9"}
+
+    # Простаивающие дольше окна клиенты освобождают слоты при следующих вставках
+    idle = LocalTokenBucket(max_clients=100, window_ms=1)
+    for i in range(3):
+        idle.hit(f"ip:{i}", 5)
+    import time
+    time.sleep(0.01)
+    idle.hit("ip:new", 5)
+    assert len(idle) == 2
+
+
+# Тест для счётчика непрочитанных уведомлений
+@pytest.mark.asyncio
+async def test_unread_count(async_client, db_session, setup_database):
+    from app.config.redis import set_redis
+
+    user_id = uuid.uuid4()
+    ids = [uuid.uuid4() for _ in range(3)]
+    for i, notification_id in enumerate(ids):
+        db_session.add(Notification(
+            id=notification_id,
+            user_id=user_id,
+            title="Test Notification",
+            text="Test text",
+            created_at=datetime.utcnow(),
+            processing_status="completed",
+            read_at=datetime.utcnow() if i == 0 else None,
+        ))
+    await db_session.commit()
+
+    # Счётчика ещё нет: значение считается по БД
+    response = await async_client.get(f"/api/v1/notifications/unread_count?user_id={user_id}")
+    assert response.status_code == 200
+    assert response.json() == {"user_id": str(user_id), "unread": 2}
+
+    # Повторная отметка не меняет время прочтения
+    first = await async_client.patch(f"/api/v1/notifications/{ids[1]}/read")
+    second = await async_client.patch(f"/api/v1/notifications/{ids[1]}/read")
+    assert first.status_code == second.status_code == 200
+    assert first.json()["read_at"] == second.json()["read_at"]
+
+    # Счётчик в Redis отдаётся без обращения к БД
+    redis = AsyncMock()
+    redis.get = AsyncMock(return_value=b"5")
+    redis.register_script = MagicMock(return_value=AsyncMock(return_value=[1, 59, 0, 1000]))
+    set_redis(redis)
+    with patch("app.repositories.notification_repository.NotificationRepository.count_unread") as mock_count:
+        response = await async_client.get(f"/api/v1/notifications/unread_count?user_id={user_id}")
+        mock_count.assert_not_called()
+    assert response.json()["unread"] == 5
+
+
+# Тест для изменения счётчиков непрочитанных
+@pytest.mark.asyncio
+async def test_change_unread_counts():
+    from app.config.redis import set_redis
+    from app.utils.counters import change_unread_counts
+
+    first_user, second_user = uuid.uuid4(), uuid.uuid4()
+    script = AsyncMock()
+    redis = MagicMock()
+    redis.register_script = MagicMock(return_value=script)
+    set_redis(redis)
+
+    # Изменения всех пользователей отправляются одним вызовом скрипта
+    await change_unread_counts({first_user: 2, second_user: -1, uuid.uuid4(): 0})
+    script.assert_awaited_once_with(
+        keys=[f"notifications:unread:{first_user}", f"notifications:unread:{second_user}", "notifications:unread-dirty"],
+        args=[2, -1],
+    )
+
+
+# Тест для сверки счётчиков непрочитанных с БД
+def test_reconcile_unread_counts():
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    from app.tasks import reconcile_unread_counts
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(engine)
+    drifted, emptied, racing, untouched, missing = (uuid.uuid4() for _ in range(5))
+    with session_factory() as db:
+        for user_id, unread in ((drifted, 2), (racing, 1), (untouched, 1)):
+            db.add_all(
+                Notification(id=uuid.uuid4(), user_id=user_id, title="t", text="t",
+                             created_at=datetime.utcnow(), processing_status="completed")
+                for _ in range(unread)
+            )
+        db.commit()
+
+    key = "notifications:unread:{}".format
+    store = {key(drifted): b"7", key(emptied): b"3", key(racing): b"1", key(untouched): b"9"}
+    dirty = {key(user_id).encode() for user_id in (drifted, emptied, racing, missing)}
+    ttls = {}
+
+    def mget(keys):
+        values = [store.get(k) for k in keys]
+        # Инкремент запроса API приходит после чтения счётчика, но до записи значения из БД
+        store[key(racing)] = b"2"
+        return values
+
+    def reconcile(keys, args):
+        *pairs, ttl = args
+        updated = 0
+        for index, k in enumerate(keys):
+            if store.get(k) == pairs[2 * index]:
+                store[k], ttls[k] = str(pairs[2 * index + 1]).encode(), ttl
+                updated += 1
+        return updated
+
+    redis = MagicMock()
+    redis.spop.side_effect = lambda name, count: [dirty.pop() for _ in range(min(count, len(dirty)))]
+    redis.mget.side_effect = mget
+    redis.register_script.return_value = MagicMock(side_effect=reconcile)
+    with patch("app.tasks.sync_session", session_factory), patch("app.tasks.get_sync_redis", return_value=redis):
+        reconcile_unread_counts()
+
+    assert store[key(drifted)] == b"2"
+    assert store[key(emptied)] == b"0"
+    # Счётчик, изменённый во время сверки, не перезаписывается устаревшим значением
+    assert store[key(racing)] == b"2"
+    # Сверяются только изменённые с прошлого раза счётчики; отсутствующие не создаются
+    assert store[key(untouched)] == b"9"
+    assert key(missing) not in store
+    assert set(ttls) == {key(drifted), key(emptied)}
+
+
+# Тест для массовой отметки уведомлений как прочитанных
+@pytest.mark.asyncio
+async def test_mark_notifications_as_read_bulk(async_client, db_session, setup_database):
+    from datetime import timedelta
+    from app.schemas.notification import NotificationBulkRead
+
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+    already_read_at = now - timedelta(days=1)
+    ids = [uuid.uuid4() for _ in range(4)]
+    for i, notification_id in enumerate(ids):
+        db_session.add(Notification(
+            id=notification_id,
+            user_id=user_id,
+            title=f"Test Notification {i}",
+            text="Test text",
+            created_at=now - timedelta(minutes=10 - i),
+            processing_status="completed",
+            read_at=already_read_at if i == 0 else None,
+        ))
+    await db_session.commit()
+
+    # По списку ID: уже прочитанное уведомление не перезаписывается
+    response = await async_client.patch(
+        "/api/v1/notifications/read",
+        json={"ids": [str(ids[0]), str(ids[1])], "return_ids": True},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"updated": 1, "ids": [str(ids[1])]}
+
+    # Все уведомления пользователя до границы created_at
+    response = await async_client.patch(
+        "/api/v1/notifications/read",
+        json={"user_id": str(user_id), "until": (now - timedelta(minutes=8)).isoformat()},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"updated": 1, "ids": None}
+
+    db_session.expire_all()
+    first = await db_session.get(Notification, ids[0])
+    last = await db_session.get(Notification, ids[3])
+    assert first.read_at == already_read_at
+    assert last.read_at is None
+
+    # Граница с часовым поясом (ISO 8601 с Z) приводится к UTC без пояса, как created_at
+    response = await async_client.patch(
+        "/api/v1/notifications/read",
+        json={"user_id": str(user_id), "until": (now - timedelta(minutes=6)).isoformat() + "Z"},
+    )
+    assert response.json() == {"updated": 1, "ids": None}
+    bulk = NotificationBulkRead(user_id=user_id, until="2024-05-01T15:00:00+03:00")
+    assert bulk.until == datetime(2024, 5, 1, 12, 0) and bulk.until.tzinfo is None
+
+    # Нужно указать ровно один способ выбора уведомлений
+    response = await async_client.patch(
+        "/api/v1/notifications/read",
+        json={"ids": [str(ids[3])], "user_id": str(user_id)},
+    )
+    assert response.status_code == 422
+
+
+# Тест для потоковой передачи статуса через SSE
+@pytest.mark.asyncio
+async def test_stream_notification_status(async_client, db_session, setup_database):
+    import asyncio
+    from app.api.v1.endpoints.notifications import _status_events
+    from app.utils.pubsub import status_subscriptions
+
+    notification_id = uuid.uuid4()
+    db_session.add(Notification(
+        id=notification_id,
+        user_id=uuid.uuid4(),
+        title="Test Notification",
+        text="Test text",
+        created_at=datetime.utcnow(),
+        processing_status="completed",
+    ))
+    await db_session.commit()
+
+    # Для завершённой обработки поток содержит одно событие
+    response = await async_client.get(f"/api/v1/notifications/{notification_id}/status/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.count("event: status") == 1
+    assert 'data: {"status": "completed"}' in response.text
+
+    response = await async_client.get(f"/api/v1/notifications/{uuid.uuid4()}/status/stream")
+    assert response.status_code == 404
+
+    # События из общей подписки доходят до подписчика уведомления
+    pending_id = uuid.uuid4()
+    queue = status_subscriptions.subscribe(pending_id)
+    events = _status_events(pending_id, "pending", queue)
+    assert "pending" in await events.__anext__()
+
+    status_subscriptions.dispatch({"id": str(uuid.uuid4()), "status": "completed"})
+    status_subscriptions.dispatch({"id": str(pending_id), "status": "processing"})
+    assert "processing" in await asyncio.wait_for(events.__anext__(), 1)
+    status_subscriptions.dispatch({"id": str(pending_id), "status": "completed"})
+    assert "completed" in await asyncio.wait_for(events.__anext__(), 1)
+
+    # После завершения поток закрывается и подписка удаляется
+    with pytest.raises(StopAsyncIteration):
+        await events.__anext__()
+    assert str(pending_id) not in status_subscriptions._subscribers
+
+
+# Тест для условных запросов и long polling статуса
+@pytest.mark.asyncio
+async def test_conditional_get_and_status_wait(async_client, db_session, setup_database):
+    import asyncio
+    from app.utils.pubsub import status_subscriptions
+
+    notification_id = uuid.uuid4()
+    db_session.add(Notification(
+        id=notification_id,
+        user_id=uuid.uuid4(),
+        title="Test Notification",
+        text="Test text",
+        created_at=datetime.utcnow(),
+        processing_status="pending",
+    ))
+    await db_session.commit()
+
+    # Повторный запрос с актуальным ETag возвращает 304 без тела
+    response = await async_client.get(f"/api/v1/notifications/{notification_id}")
+    etag = response.headers["ETag"]
+    response = await async_client.get(f"/api/v1/notifications/{notification_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    # После изменения уведомления ETag меняется
+    await async_client.patch(f"/api/v1/notifications/{notification_id}/read")
+    response = await async_client.get(f"/api/v1/notifications/{notification_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    response = await async_client.get(f"/api/v1/notifications/{notification_id}/status")
+    status_etag = response.headers["ETag"]
+    response = await async_client.get(
+        f"/api/v1/notifications/{notification_id}/status", headers={"If-None-Match": status_etag}
+    )
+    assert response.status_code == 304
+
+    with patch("app.api.v1.endpoints.notifications.pubsub_hub") as mock_hub:
+        mock_hub.running = True
+
+        # Без изменений ожидание заканчивается по таймауту ответом 304
+        response = await async_client.get(
+            f"/api/v1/notifications/{notification_id}/status?wait=0.05",
+            headers={"If-None-Match": status_etag},
+        )
+        assert response.status_code == 304
+
+        # Переход статуса завершает ожидание новым статусом
+        async def publish():
+            await asyncio.sleep(0.05)
+            status_subscriptions.dispatch({"id": str(notification_id), "status": "pending"})
+            status_subscriptions.dispatch({"id": str(notification_id), "status": "processing"})
+
+        task = asyncio.create_task(publish())
+        response = await async_client.get(
+            f"/api/v1/notifications/{notification_id}/status?wait=5",
+            headers={"If-None-Match": status_etag},
+        )
+        await task
+        assert response.status_code == 200
+        assert response.json() == {"status": "processing"}
+        assert response.headers["ETag"] != status_etag
+        assert str(notification_id) not in status_subscriptions._subscribers
+
+
+# Тест для кэша результатов анализа
+@pytest.mark.asyncio
+async def test_analysis_cache():
+    import asyncio
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.analysis.cache import AnalysisCache, CACHE_REQUESTS, content_digest
+
+    store = {}
+
+    def fake_set(key, value, ex=None, nx=False, px=None):
+        if nx and key in store:
+            return None
+        store[key] = value
+        return True
+
+    redis = MagicMock()
+    redis.get.side_effect = store.get
+    redis.set.side_effect = fake_set
+    redis.exists.side_effect = lambda key: int(key in store)
+    redis.register_script.return_value = MagicMock(side_effect=lambda keys, args: store.pop(keys[0], None))
+
+    calls = []
+
+    def compute(text):
+        calls.append(text)
+        time.sleep(0.05)
+        return {"category": "critical", "confidence": 0.9, "keywords": []}
+
+    with patch("app.analysis.cache.get_sync_redis", return_value=redis):
+        cache = AnalysisCache(ttl=60, local_size=2)
+
+        # Одновременные одинаковые тексты ждут один вызов AI API
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda text: cache.get_or_compute(text, compute), ["Payment failed for order 1"] * 4))
+        assert len(calls) == 1
+        assert all(result["category"] == "critical" for result in results)
+        # Блокировка анализа снята, результат сохранён в Redis
+        assert [key for key in store if key.startswith("analysis:lock:")] == []
+
+        # По умолчанию на ключ не влияют только пробелы: текст с другими числами или регистром анализируется заново
+        cache.get_or_compute(" Payment   failed for order 1", compute)
+        assert len(calls) == 1
+        cache.get_or_compute("Payment failed for order 1000", compute)
+        cache.get_or_compute("PAYMENT FAILED FOR ORDER 1", compute)
+        assert len(calls) == 3
+        # Регистр и числа объединяются только по явной настройке
+        with patch("app.analysis.cache.ANALYSIS_CACHE_FOLD_CASE", True), \
+                patch("app.analysis.cache.ANALYSIS_CACHE_MASK_DIGITS", True):
+            assert content_digest("payment FAILED for order 42") == content_digest("Payment failed for order 7")
+        assert content_digest("Payment of 5 failed") != content_digest("Payment of 5000 failed")
+
+        # Новый процесс получает результат из общего уровня в Redis
+        redis_hits = CACHE_REQUESTS.labels("redis", "hit")._value.get()
+        other = AnalysisCache(ttl=60, local_size=2)
+        other.get_or_compute("Payment failed for order 1", compute)
+        assert len(calls) == 3
+        assert CACHE_REQUESTS.labels("redis", "hit")._value.get() == redis_hits + 1
+
+        # Ошибки не кэшируются
+        def broken(text):
+            raise RuntimeError("AI API недоступен")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute("Backup completed", broken)
+        assert cache.get_or_compute("Backup completed", compute)["category"] == "critical"
+
+        # Локальный уровень ограничен по размеру
+        cache.get_or_compute("Disk is full", compute)
+        assert len(cache._local) == 2
+
+    # Асинхронный вариант также выполняет один вызов на текст и обращается к Redis через redis.asyncio
+    async_redis = MagicMock()
+    async_redis.get = AsyncMock(side_effect=store.get)
+    async_redis.set = AsyncMock(side_effect=fake_set)
+    async_redis.exists = AsyncMock(side_effect=lambda key: int(key in store))
+    async_redis.register_script.return_value = AsyncMock(side_effect=lambda keys, args: store.pop(keys[0], None))
+    async_calls = []
+
+    async def compute_async(text):
+        async_calls.append(text)
+        await asyncio.sleep(0.01)
+        return {"category": "info", "confidence": 0.9, "keywords": []}
+
+    sync_redis = MagicMock()
+    with patch("app.analysis.cache.get_sync_redis", return_value=sync_redis), \
+            patch("app.analysis.cache.get_loop_redis", return_value=async_redis):
+        results = await asyncio.gather(*(cache.get_or_compute_async("Hello there", compute_async) for _ in range(3)))
+        assert len(async_calls) == 1
+        assert [result["category"] for result in results] == ["info"] * 3
+        assert async_redis.set.await_count == 2
+        assert [key for key in store if key.startswith("analysis:lock:")] == []
+        # Другой процесс ждёт владельца блокировки, не блокируя цикл событий, и получает его результат
+        result_key = next(key for key in store if key.startswith("analysis:result:"))
+        stored = store.pop(result_key)
+        store[result_key.replace(":result:", ":lock:")] = "other-worker"
+
+        async def finish_other_worker():
+            await asyncio.sleep(0.1)
+            store[result_key] = stored
+
+        other = AnalysisCache(ttl=60, local_size=0)
+        result, _ = await asyncio.gather(other.get_or_compute_async("Hello there", compute_async), finish_other_worker())
+        assert result["category"] == "info" and len(async_calls) == 1
+    sync_redis.assert_not_called()
+    assert sync_redis.method_calls == []
+
+
+# Тест для движков классификации
+def test_classifier_engines():
+    from app.analysis.classifier import (
+        Classifier, KeywordClassifier, register_engine, get_classifier, classify_many
+    )
+    from app.analysis.cache import analysis_cache
+
+    classifier = KeywordClassifier()
+    results = classifier.classify_batch([
+        "Warning: backup FAILED",
+        "Attention please",
+        "System started successfully",
+        "",
+    ])
+    # Критическое правило приоритетнее предупреждения независимо от порядка слов
+    assert [result["category"] for result in results] == ["critical", "warning", "info", "info"]
+    assert results[0]["keywords"] == ["warning", "failed"]
+    assert 0.7 <= results[0]["confidence"] <= 0.95
+
+    # Движок модели получает весь пакет одним вызовом
+    batches = []
+
+    class ModelClassifier(Classifier):
+        name = "model"
+
+        def classify_batch(self, texts):
+            batches.append(list(texts))
+            return [{"category": "info", "confidence": 0.5, "keywords": []} for _ in texts]
+
+    register_engine("model", ModelClassifier)
+    redis = MagicMock()
+    redis.mget.side_effect = lambda keys: [None] * len(keys)
+    # Уникальные тексты: локальный уровень общего кэша мог запомнить результаты других тестов
+    hello, bye = f"Hello {uuid.uuid4()}", f"Bye {uuid.uuid4()}"
+    # Общий кэш мог временно отключить Redis после ошибок соединения в других тестах
+    with patch("app.analysis.cache.get_sync_redis", return_value=redis), \
+            patch.object(analysis_cache, "_redis_disabled_until", 0):
+        results = classify_many([hello, bye, hello], engine="model")
+    assert [result["category"] for result in results] == ["info"] * 3
+    # Повторяющиеся тексты пакета классифицируются один раз
+    assert batches == [[hello, bye]]
+    # Кэш пакета читается одним MGET и пишется одним конвейером
+    redis.mget.assert_called_once()
+    assert len(redis.mget.call_args.args[0]) == 2
+    redis.get.assert_not_called()
+    assert redis.pipeline.return_value.set.call_count == 2
+    redis.pipeline.return_value.execute.assert_called_once()
+    assert get_classifier("model") is get_classifier("model")
+
+    # Движок без classify_batch не создаётся
+    class Incomplete(Classifier):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+    with pytest.raises(ValueError):
+        get_classifier("unknown")
+
+
+# Тест для обслуживания помесячных секций и границ created_at по UUIDv7
+def test_notification_partitions():
+    from datetime import date, timedelta
+    from app.utils import partitions
+    from app.utils.ids import uuid7, uuid7_time, created_at_bounds
+
+    conn = MagicMock()
+    existing = {
+        date(2025, 9, 1): "notifications_p202509",
+        date(2025, 10, 1): "notifications_p202510",
+        date(2026, 10, 1): "notifications_p202610",
+    }
+    with patch("app.utils.partitions.existing_partitions", return_value=existing), \
+            patch("app.utils.partitions.default_partition_months", return_value=[]), \
+            patch("app.utils.partitions.has_default_partition", return_value=True):
+        created, expired = partitions.maintain_partitions(
+            conn, date(2026, 10, 18), ahead=2, retention=12, action="drop"
+        )
+    assert created == ["notifications_p202611", "notifications_p202612"]
+    # Хранятся 12 полных месяцев до текущего, более старые секции удаляются целиком
+    assert expired == ["notifications_p202509"]
+    statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+    assert "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')" in statements[1]
+    # При секции по умолчанию PostgreSQL не допускает DETACH ... CONCURRENTLY
+    assert statements[2:] == [
+        "ALTER TABLE notifications DETACH PARTITION notifications_p202509",
+        "DROP TABLE notifications_p202509",
+    ]
+
+    # Без секции по умолчанию секция отсоединяется без блокировки записи
+    conn = MagicMock()
+    with patch("app.utils.partitions.existing_partitions", return_value=existing), \
+            patch("app.utils.partitions.default_partition_months", return_value=[]), \
+            patch("app.utils.partitions.has_default_partition", return_value=False):
+        partitions.maintain_partitions(conn, date(2026, 10, 18), ahead=0, retention=12, action="detach")
+    statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+    assert statements[-1] == "ALTER TABLE notifications DETACH PARTITION notifications_p202509 CONCURRENTLY"
+
+    # Обслуживание отстало: строки месяца без секции лежат в секции по умолчанию и переносятся
+    conn = MagicMock()
+    with patch("app.utils.partitions.existing_partitions", return_value={date(2026, 10, 1): "notifications_p202610"}), \
+            patch("app.utils.partitions.default_partition_months", return_value=[date(2026, 11, 1)]):
+        created, _ = partitions.maintain_partitions(conn, date(2026, 11, 3), ahead=1, retention=0)
+    assert created == ["notifications_p202611", "notifications_p202612"]
+    statements = [" ".join(str(call.args[0]).split()) for call in conn.execute.call_args_list]
+    assert statements[:5] == [
+        "BEGIN",
+        "CREATE TABLE notifications_p202611 (LIKE notifications INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        "WITH moved AS (DELETE FROM notifications_default WHERE created_at >= :start AND created_at < :end "
+        "RETURNING *) INSERT INTO notifications_p202611 SELECT * FROM moved",
+        "ALTER TABLE notifications ATTACH PARTITION notifications_p202611 "
+        "FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')",
+        "COMMIT",
+    ]
+    assert statements[5].startswith("CREATE TABLE IF NOT EXISTS notifications_p202612 PARTITION OF")
+
+    # Время в UUIDv7 ограничивает created_at, чтобы запрос по ID попадал в одну секцию
+    notification_id = uuid7()
+    assert notification_id.version == 7
+    assert abs(uuid7_time(notification_id) - datetime.utcnow()) < timedelta(seconds=5)
+    low, high = created_at_bounds([notification_id])
+    assert low < datetime.utcnow() < high
+    assert created_at_bounds([notification_id, uuid.uuid4()]) is None
+
+
+# Тест для переноса прочитанных уведомлений в архив
+def test_archive_read_notifications():
+    from datetime import timedelta
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    from app.models.notification_archive import NotificationArchive, NotificationArchiveId
+    from app.tasks import archive_read_notifications
+    from app.utils.archive import unpack_notifications
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(engine)
+
+    user_id = uuid.uuid4()
+    old = datetime(2020, 1, 10, 12, 0)
+    now = datetime.utcnow()
+    rows = {
+        "old_read_1": (old, now),
+        "old_read_2": (old + timedelta(hours=1), now),
+        "old_read_3": (old + timedelta(hours=2), now),
+        "old_read_other_day": (old + timedelta(days=1), now),
+        "old_unread": (old, None),
+        "recent_read": (now, now),
+    }
+    ids = {name: uuid.uuid4() for name in rows}
+    with session_factory() as db:
+        for name, (created_at, read_at) in rows.items():
+            db.add(Notification(
+                id=ids[name], user_id=user_id, title=name, text="Backup completed",
+                created_at=created_at, read_at=read_at, processing_status="completed",
+            ))
+        db.commit()
+
+    # Маленькая порция проверяет дополнение уже существующего блока за день
+    with patch("app.tasks.sync_session", session_factory), patch("app.utils.archive.ARCHIVE_BATCH_SIZE", 2), \
+            patch("app.utils.partitions.RETENTION_MONTHS", 0):
+        archive_read_notifications()
+
+    with session_factory() as db:
+        hot = {n.title for n in db.query(Notification).all()}
+        blocks = {block.day: block for block in db.query(NotificationArchive).all()}
+        archived_ids = {row.id for row in db.query(NotificationArchiveId).all()}
+    assert hot == {"old_unread", "recent_read"}
+    assert blocks[old.date()].count == 3
+    assert [n.title for n in unpack_notifications(blocks[old.date()].payload, user_id)] == [
+        "old_read_3", "old_read_2", "old_read_1"
+    ]
+    assert blocks[(old + timedelta(days=1)).date()].count == 1
+    assert archived_ids == {ids[name] for name in rows if name.startswith("old_read")}
+
+    # Архив старше срока хранения секций удаляется тем же заданием, свежий остаётся
+    recent_id = uuid.uuid4()
+    with session_factory() as db:
+        db.add(NotificationArchive(user_id=user_id, day=now.date(), count=1, payload=b""))
+        db.add(NotificationArchiveId(id=recent_id, user_id=user_id, day=now.date()))
+        db.commit()
+    with patch("app.tasks.sync_session", session_factory), patch("app.utils.archive.ARCHIVE_BATCH_SIZE", 1), \
+            patch("app.utils.partitions.RETENTION_MONTHS", 12):
+        archive_read_notifications()
+    with session_factory() as db:
+        assert [block.day for block in db.query(NotificationArchive).all()] == [now.date()]
+        assert [row.id for row in db.query(NotificationArchiveId).all()] == [recent_id]
+
+
+# Тест для чтения архивных уведомлений через API
+@pytest.mark.asyncio
+async def test_archive_fallback_reads(async_client, db_session, setup_database):
+    from datetime import timedelta
+    from app.models.notification_archive import NotificationArchive, NotificationArchiveId
+    from app.utils.archive import pack_notifications
+
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+    hot = [
+        Notification(id=uuid.uuid4(), user_id=user_id, title="recent", text="t",
+                     created_at=now, processing_status="completed"),
+        # Старое непрочитанное уведомление остаётся в основной таблице между архивными
+        Notification(id=uuid.uuid4(), user_id=user_id, title="old unread", text="t",
+                     created_at=now - timedelta(days=100, hours=12), processing_status="completed"),
+    ]
+    archived = [
+        Notification(id=uuid.uuid4(), user_id=user_id, title=f"archived {i}", text="t",
+                     created_at=now - timedelta(days=100 + i), read_at=now,
+                     category="info", confidence=0.9, processing_status="completed")
+        for i in range(3)
+    ]
+    db_session.add_all(hot)
+    for n in archived:
+        db_session.add(NotificationArchive(
+            user_id=user_id, day=n.created_at.date(), count=1, payload=pack_notifications([n]),
+        ))
+        db_session.add(NotificationArchiveId(id=n.id, user_id=user_id, day=n.created_at.date()))
+    await db_session.commit()
+
+    response = await async_client.get(f"/api/v1/notifications/{archived[1].id}")
+    assert response.status_code == 200
+    assert response.json()["title"] == "archived 1"
+    assert response.json()["category"] == "info"
+
+    titles = []
+    cursor = None
+    while True:
+        params = {"user_id": str(user_id), "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await async_client.get("/api/v1/notifications/", params=params)).json()
+        titles += [item["title"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert titles == ["recent", "archived 0", "old unread", "archived 1", "archived 2"]
+
+
+# Тест для чтения из реплики и гарантии read-your-writes
+@pytest.mark.asyncio
+async def test_read_replica_routing(async_client, db_session, setup_database, tmp_path):
+    from app.config.database import ReplicaRouter
+    from app.utils.consistency import ReadYourWrites
+    from app.utils.detail_cache import detail_cache
+
+    # Отстающая реплика: схема есть, данных основной БД ещё нет
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replica_session = sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+
+    user_id = uuid.uuid4()
+    notification_id = uuid.uuid4()
+    db_session.add(Notification(
+        id=notification_id, user_id=user_id, title="Test Notification", text="Test text",
+        created_at=datetime.utcnow(), processing_status="completed",
+    ))
+    await db_session.commit()
+
+    guard = ReadYourWrites(window=60)
+    with patch("app.config.database.replica_router", ReplicaRouter([replica_session])), \
+            patch("app.config.database.read_your_writes", guard):
+        # Без недавних записей чтения идут в реплику
+        response = await async_client.get("/api/v1/notifications/", params={"user_id": str(user_id)})
+        assert response.json()["items"] == []
+        with patch.object(detail_cache, "fill", AsyncMock()) as fill:
+            response = await async_client.get(f"/api/v1/notifications/{notification_id}")
+            assert response.status_code == 404
+            # Отсутствие в отстающей реплике не запоминается в кэше
+            fill.assert_not_called()
+
+        response = await async_client.post("/api/v1/notifications/lookup", json={"ids": [str(notification_id)]})
+        assert response.json()["items"][0]["found"] is False
+
+        # После записи пользователь и уведомление читаются из основной БД
+        await guard.mark([user_id], [notification_id])
+        response = await async_client.get("/api/v1/notifications/", params={"user_id": str(user_id)})
+        assert len(response.json()["items"]) == 1
+        # UUID в параметре запроса сравнивается в каноническом виде
+        response = await async_client.get("/api/v1/notifications/", params={"user_id": str(user_id).upper()})
+        assert len(response.json()["items"]) == 1
+        response = await async_client.get(f"/api/v1/notifications/{notification_id}")
+        assert response.status_code == 200
+        # В POST /lookup проверяются ID из тела запроса
+        response = await async_client.post(
+            "/api/v1/notifications/lookup", json={"ids": [str(uuid.uuid4()), str(notification_id).upper()]},
+        )
+        assert [item["found"] for item in response.json()["items"]] == [False, True]
+
+    # Недоступная реплика временно исключается, чтение идёт в основную БД
+    broken = MagicMock(return_value=MagicMock(connection=AsyncMock(side_effect=OSError("connection refused")), close=AsyncMock()))
+    router = ReplicaRouter([broken])
+    with patch("app.config.database.replica_router", router):
+        response = await async_client.get(f"/api/v1/notifications/{notification_id}/status")
+        assert response.status_code == 200
+        assert router.choose() is None
+    await replica_engine.dispose()
+
+    # Выбирается реплика с наименьшим числом открытых сессий
+    router = ReplicaRouter([MagicMock(), MagicMock(), MagicMock()])
+    router._in_use = [2, 0, 1]
+    assert router.choose() == 1
+
+
+# Тест для метрик пула соединений и длительности запросов
+@pytest.mark.asyncio
+async def test_db_pool_and_query_metrics(tmp_path):
+    from prometheus_client import REGISTRY
+    from sqlalchemy import create_engine, text
+    from app.utils.db_metrics import (
+        InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine, track_queries,
+    )
+    from app.repositories.notification_repository import NotificationRepository
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    sync_engine = create_engine(
+        f"sqlite:///{tmp_path / 'sync.db'}", poolclass=InstrumentedQueuePool,
+        pool_size=1, max_overflow=1, pool_logging_name="test-sync",
+    )
+    instrument_engine(sync_engine, "test-sync")
+
+    @track_queries
+    def load():
+        with sync_engine.connect() as conn:
+            assert sample("db_pool_connections_in_use", engine="test-sync") == 1
+            with sync_engine.connect():
+                # Второе соединение сверх pool_size
+                assert sample("db_pool_overflow_connections", engine="test-sync") == 1
+            conn.execute(text("SELECT 1"))
+
+    load()
+    assert sample("db_pool_connections_in_use", engine="test-sync") == 0
+    assert sample("db_pool_checkout_wait_seconds_count", engine="test-sync") == 2
+    assert sample("db_query_duration_seconds_count", engine="test-sync", method=load.__qualname__) == 1
+    sync_engine.dispose()
+
+    # Асинхронный движок: запросы помечаются методом репозитория
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'async.db'}", poolclass=InstrumentedAsyncQueuePool,
+        pool_logging_name="test-async",
+    )
+    instrument_engine(async_engine, "test-async")
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with sessionmaker(async_engine, class_=AsyncSession)() as session:
+        assert await NotificationRepository(session).count_unread(uuid.uuid4()) == 0
+    assert sample(
+        "db_query_duration_seconds_count", engine="test-async", method="NotificationRepository.count_unread"
+    ) == 1
+    assert sample("db_query_duration_seconds_count", engine="test-async", method="other") > 0
+    assert sample("db_pool_connections_in_use", engine="test-async") == 0
+    await async_engine.dispose()
+
+
+# Тест для логирования через очередь с выборкой шумных логгеров
+def test_queue_logging_with_sampling(tmp_path):
+    import logging
+    from app.config import logging_config
+    from app.config.logging_config import SamplingFilter, setup_logging, _stop_listener
+
+    log_file = tmp_path / "app.log"
+    try:
+        setup_logging(mode="queue", fmt="json", log_file=str(log_file), sample_rates={"app.cache": 0})
+        logging.getLogger("app").info("обычная запись")
+        logging.getLogger("app.cache").info("ключ кэша")
+        logging.getLogger("app.cache").warning("ошибка кэша")
+        _stop_listener()
+        records = [json.loads(line) for line in log_file.read_text().splitlines()]
+        assert [(r["logger"], r["level"], r["message"]) for r in records] == [
+            ("app", "INFO", "обычная запись"),
+            ("app.cache", "WARNING", "ошибка кэша"),
+        ]
+
+        # Процесс после fork пишет через новую очередь и обработчик, а не через очередь родителя
+        setup_logging(mode="queue", fmt="json", log_file=str(log_file), sample_rates={"app.cache": 0})
+        parent_listener = logging_config._listener
+        parent_queue = logging.getLogger("app").handlers[0].queue
+        logging_config._restart_listener_in_child()
+        parent_listener.stop()
+        child_handler = logging.getLogger("app").handlers[0]
+        assert child_handler.queue is not parent_queue
+        assert logging.getLogger("uvicorn").handlers == [child_handler]
+        logging.getLogger("app.cache").info("ключ кэша")
+        logging.getLogger("app").info("запись дочернего процесса")
+        _stop_listener()
+        assert json.loads(log_file.read_text().splitlines()[-1])["message"] == "запись дочернего процесса"
+    finally:
+        setup_logging(mode="sync", log_file="")
+
+    # Доля пропускаемых записей соответствует настройке
+    sampling = SamplingFilter({"sqlalchemy.engine": 0.2})
+    passed = sum(
+        sampling.filter(logging.LogRecord("sqlalchemy.engine.Engine", logging.INFO, "", 0, "SELECT 1", None, None))
+        for _ in range(10000)
+    )
+    assert 1500 < passed < 2500
+    assert sampling.filter(logging.LogRecord("app", logging.INFO, "", 0, "text", None, None))
+
+
+# Тест для двухуровневого кэша уведомлений по ID
+@pytest.mark.asyncio
+async def test_detail_cache(async_client, db_session, setup_database):
+    from unittest.mock import PropertyMock
+    from app.config.redis import set_redis
+    from app.utils.detail_cache import detail_cache, DETAIL_KEY, INVALIDATE_CHANNEL, MISSING
+    from app.utils.pubsub import PubSubHub
+
+    class FakePipeline:
+        def __init__(self, redis):
+            self.redis, self.commands = redis, []
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+        async def execute(self):
+            # Команды других кэшей (версии списков и т.п.) в этом тесте не нужны
+            methods = [(getattr(self.redis, name, None), args, kwargs) for name, args, kwargs in self.commands]
+            return [await method(*args, **kwargs) if method else None for method, args, kwargs in methods]
+
+    class FakeRedis:
+        def __init__(self):
+            self.data, self.published, self.gets = {}, [], 0
+
+        async def mget(self, keys):
+            self.gets += 1
+            return [self.data.get(key) for key in keys]
+
+        async def set(self, key, value, ex=None, nx=False, **kwargs):
+            if nx and key in self.data:
+                return None
+            self.data[key] = value.encode() if isinstance(value, str) else str(value).encode()
+            return True
+
+        def register_script(self, script):
+            # Лимитер запросов и счётчики непрочитанных
+            return AsyncMock(return_value=[1, 59, 0, 1000])
+
+        async def delete(self, *keys):
+            for key in keys:
+                self.data.pop(key, None)
+
+        async def publish(self, channel, message):
+            self.published.append((channel, json.loads(message)))
+
+        def pipeline(self, transaction=True):
+            return FakePipeline(self)
+
+    notification_id = uuid.uuid4()
+    db_session.add(Notification(
+        id=notification_id, user_id=uuid.uuid4(), title="Test Notification", text="Test text",
+        created_at=datetime.utcnow(), processing_status="completed",
+    ))
+    await db_session.commit()
+
+    redis = FakeRedis()
+    set_redis(redis)
+    repo = "app.repositories.notification_repository.NotificationRepository"
+
+    # Первое чтение идёт в БД и заполняет Redis, следующие — без БД, в том числе статус
+    response = await async_client.get(f"/api/v1/notifications/{notification_id}")
+    assert response.status_code == 200
+    assert DETAIL_KEY.format(id=notification_id) in redis.data
+    with patch(f"{repo}.get_by_id") as mock_get, patch(f"{repo}.get_state") as mock_state:
+        cached = await async_client.get(f"/api/v1/notifications/{notification_id}")
+        status = await async_client.get(f"/api/v1/notifications/{notification_id}/status")
+        mock_get.assert_not_called()
+        mock_state.assert_not_called()
+    assert cached.json() == response.json()
+    assert cached.headers["ETag"] == response.headers["ETag"]
+    assert status.json() == {"status": "completed"}
+
+    # Неизвестный ID запоминается: повторный 404 не доходит до БД
+    unknown = uuid.uuid4()
+    assert (await async_client.get(f"/api/v1/notifications/{unknown}")).status_code == 404
+    assert redis.data[DETAIL_KEY.format(id=unknown)] == MISSING.encode()
+    with patch(f"{repo}.get_by_id") as mock_get:
+        assert (await async_client.get(f"/api/v1/notifications/{unknown}")).status_code == 404
+        mock_get.assert_not_called()
+
+    # Отметка о прочтении записывает новое значение и рассылает инвалидацию другим процессам;
+    # отложенные действия выполняет настоящая сессия запроса
+    with patch("app.config.database.async_session", TestingSessionLocal), \
+            patch.dict(app.dependency_overrides, clear=True):
+        marked = await async_client.patch(f"/api/v1/notifications/{notification_id}/read")
+    assert marked.json()["read_at"] is not None
+    assert redis.published[-1] == (INVALIDATE_CHANNEL, {"ids": [str(notification_id)]})
+    with patch(f"{repo}.get_by_id") as mock_get:
+        response = await async_client.get(f"/api/v1/notifications/{notification_id}")
+        mock_get.assert_not_called()
+    assert response.json()["read_at"] == marked.json()["read_at"]
+
+    # При работающей подписке повторные чтения обслуживает локальный уровень до инвалидации
+    with patch.object(PubSubHub, "running", new_callable=PropertyMock, return_value=True):
+        await detail_cache.get(notification_id)
+        gets = redis.gets
+        await detail_cache.get(notification_id)
+        assert redis.gets == gets
+        detail_cache.handle_status({"id": str(notification_id), "status": "completed"})
+        await detail_cache.get(notification_id)
+        assert redis.gets == gets + 1
+    detail_cache.clear()
+
+    # Поиск по списку ID берёт найденное в кэше одним MGET, в БД идут только промахи
+    other = uuid.uuid4()
+    with patch(f"{repo}.get_many", AsyncMock(return_value={})) as mock_many:
+        response = await async_client.post(
+            "/api/v1/notifications/lookup", json={"ids": [str(notification_id), str(unknown), str(other)]},
+        )
+        mock_many.assert_awaited_once_with([other], state_only=False)
+    assert [item["found"] for item in response.json()["items"]] == [True, False, False]
+
+    # Воркер обновляет поля в Redis скриптом; завершённая обработка получает полное время жизни
+    script = MagicMock()
+    sync_redis = MagicMock(register_script=MagicMock(return_value=script))
+    with patch("app.utils.detail_cache.get_sync_redis", return_value=sync_redis), \
+            patch.object(detail_cache, "_patch_script", None):
+        detail_cache.patch_sync([{
+            "id": notification_id, "created_at": datetime.utcnow(), "category": "info",
+            "confidence": 0.9, "processing_status": "completed",
+        }])
+    kwargs = script.call_args.kwargs
+    assert kwargs["keys"] == [DETAIL_KEY.format(id=notification_id)]
+    assert json.loads(kwargs["args"][0]) == {"category": "info", "confidence": 0.9, "processing_status": "completed"}
+    assert kwargs["args"][1] == detail_cache.ttl
+
+
+# Тест для получения уведомлений и статусов по списку ID
+@pytest.mark.asyncio
+async def test_lookup_notifications(async_client, db_session, setup_database):
+    from datetime import timedelta
+    from app.models.notification_archive import NotificationArchive, NotificationArchiveId
+    from app.utils.archive import pack_notifications
+
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+    hot = [
+        Notification(id=uuid.uuid4(), user_id=user_id, title=f"hot {i}", text="t",
+                     created_at=now, processing_status=status)
+        for i, status in enumerate(["pending", "completed"])
+    ]
+    archived = Notification(id=uuid.uuid4(), user_id=user_id, title="archived", text="t",
+                            created_at=now - timedelta(days=100), read_at=now, processing_status="completed")
+    db_session.add_all(hot)
+    db_session.add(NotificationArchive(
+        user_id=user_id, day=archived.created_at.date(), count=1, payload=pack_notifications([archived]),
+    ))
+    db_session.add(NotificationArchiveId(id=archived.id, user_id=user_id, day=archived.created_at.date()))
+    await db_session.commit()
+
+    unknown = uuid.uuid4()
+    ids = [str(hot[1].id), str(unknown), str(archived.id), str(hot[0].id), str(hot[1].id)]
+    response = await async_client.post("/api/v1/notifications/lookup", json={"ids": ids})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    # Порядок и повторы ID запроса сохраняются, отсутствующие помечены found=false
+    assert [item["id"] for item in items] == ids
+    assert [item["found"] for item in items] == [True, False, True, True, True]
+    assert [item["notification"]["title"] for item in items if item["found"]] == [
+        "hot 1", "archived", "hot 0", "hot 1",
+    ]
+    assert items[1]["notification"] is None
+
+    response = await async_client.post(
+        "/api/v1/notifications/lookup", json={"ids": ids[:4], "view": "status"},
+    )
+    items = response.json()["items"]
+    assert [item["status"] for item in items] == ["completed", None, "completed", "pending"]
+    assert all(item["notification"] is None for item in items)
+
+    # Слишком длинный список отклоняется
+    response = await async_client.post(
+        "/api/v1/notifications/lookup", json={"ids": [str(uuid.uuid4()) for _ in range(501)]},
+    )
+    assert response.status_code == 422
+
+
+# Тест для готовых тел ответов списка: orjson, MessagePack и кэш без перекодирования
+@pytest.mark.asyncio
+async def test_encoded_list_responses(async_client, db_session, setup_database):
+    import msgpack
+    from app.schemas.notification import NotificationPage
+    from app.utils.serialization import JSON, MSGPACK, negotiate
+
+    user_id = uuid.uuid4()
+    notification = Notification(
+        id=uuid.uuid4(), user_id=user_id, title="Тест", text="Текст", created_at=datetime.utcnow(),
+        processing_status="completed", category="info", confidence=0.9,
+    )
+    db_session.add(notification)
+    await db_session.commit()
+    url = f"/api/v1/notifications/?user_id={user_id}&limit=10"
+
+    with patch("fastapi_cache.FastAPICache.get_backend") as mock_get_backend:
+        backend = AsyncMock()
+        backend.get_with_ttl = AsyncMock(return_value=(None, None))
+        mock_get_backend.return_value = backend
+
+        response = await async_client.get(url)
+        # Тело совпадает с прежней сериализацией через модель ответа
+        expected = NotificationPage(items=[notification], next_cursor=None).model_dump(mode="json")
+        assert response.json() == expected
+        assert response.headers["X-FastAPI-Cache"] == "MISS"
+        json_key, stored = backend.set.call_args.args[:2]
+        assert json_key.endswith(":json")
+
+        response = await async_client.get(url, headers={"Accept": "application/msgpack"})
+        assert response.headers["content-type"] == "application/msgpack"
+        assert msgpack.unpackb(response.content) == expected
+        assert backend.set.call_args.args[0].endswith(":msgpack")
+        assert response.headers["Vary"] == "Accept"
+
+    # Попадание отдаёт сохранённые байты как есть, с заголовками кэша
+    with patch("fastapi_cache.FastAPICache.get_backend") as mock_get_backend:
+        backend = AsyncMock()
+        backend.get_with_ttl = AsyncMock(return_value=(60, stored))
+        mock_get_backend.return_value = backend
+        with patch("fastapi_cache.coder.JsonCoder.decode") as mock_decode:
+            response = await async_client.get(url)
+            mock_decode.assert_not_called()
+    assert response.status_code == 200
+    assert response.content == stored[1:]
+    assert response.headers["X-FastAPI-Cache"] == "HIT"
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert response.headers["Vary"] == "Accept"
+
+    # Веса q из Accept: q=0 запрещает формат, при равных весах явный MessagePack
+    assert negotiate("application/msgpack;q=0, application/json") == JSON
+    assert negotiate("application/json, application/x-msgpack;q=0.5") == JSON
+    assert negotiate("application/msgpack, application/json;q=0.9") == MSGPACK
+    assert negotiate("application/vnd.msgpack, */*;q=0.1") == MSGPACK
+    assert negotiate("application/msgpack-foo") == JSON
+    assert negotiate(None) == JSON
+
+# Тест для заголовка Cache-Control списка: клиентский кэш не должен переживать инвалидацию
+@pytest.mark.asyncio
+async def test_list_cache_control(async_client, db_session, setup_database):
+    user_id = uuid.uuid4()
+    url = f"/api/v1/notifications/?user_id={user_id}&limit=10"
+
+    with patch("fastapi_cache.FastAPICache.get_backend") as mock_get_backend:
+        backend = AsyncMock()
+        backend.get_with_ttl = AsyncMock(return_value=(None, None))
+        mock_get_backend.return_value = backend
+        response = await async_client.get(url)
+        assert response.headers["X-FastAPI-Cache"] == "MISS"
+        assert response.headers["Cache-Control"] == "private, no-cache"
+        assert response.headers["ETag"]
+        stored = backend.set.call_args.args[1]
+
+    with patch("fastapi_cache.FastAPICache.get_backend") as mock_get_backend:
+        backend = AsyncMock()
+        backend.get_with_ttl = AsyncMock(return_value=(3000, stored))
+        mock_get_backend.return_value = backend
+        response = await async_client.get(url)
+        assert response.headers["X-FastAPI-Cache"] == "HIT"
+        assert response.headers.get_list("Cache-Control") == ["private, no-cache"]
+        etag = response.headers["ETag"]
+
+        # Совпавший ETag даёт 304 с тем же запретом хранить ответ
+        response = await async_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["Cache-Control"] == "private, no-cache"
+
+# Тест для выборочных полей списка (view=summary, fields)
+@pytest.mark.asyncio
+async def test_list_sparse_fields(async_client, db_session, setup_database):
+    from datetime import timedelta
+
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+    for i in range(3):
+        db_session.add(Notification(
+            id=uuid.uuid4(), user_id=user_id, title=f"Тест {i}", text="Длинный текст",
+            created_at=now - timedelta(minutes=i), processing_status="completed", category="info",
+        ))
+    await db_session.commit()
+    url = f"/api/v1/notifications/?user_id={user_id}&limit=2"
+
+    with patch("fastapi_cache.FastAPICache.get_backend") as mock_get_backend:
+        backend = AsyncMock()
+        backend.get_with_ttl = AsyncMock(return_value=(None, None))
+        mock_get_backend.return_value = backend
+
+        response = await async_client.get(f"{url}&view=summary")
+        assert response.status_code == 200
+        page = response.json()
+        assert set(page["items"][0]) == {"id", "title", "category", "created_at", "read_at"}
+        assert ":summary:" in backend.set.call_args.args[0]
+
+        # Курсор строится по неполным строкам, и следующая страница продолжает список
+        response = await async_client.get(f"{url}&fields=title&cursor={page['next_cursor']}")
+        assert response.json() == {"items": [{"title": "Тест 2"}], "next_cursor": None}
+        assert ":title:" in backend.set.call_args.args[0]
+
+        response = await async_client.get(f"{url}&fields=title,secret")
+        assert response.status_code == 400
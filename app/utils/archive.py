@@ -0,0 +1,53 @@
+from datetime import date, datetime, timedelta
+from typing import Iterable
+from uuid import UUID
+from app.models.notification import Notification
+from app.utils import partitions
+import json
+import os
+import zlib
+
+# Через сколько дней после создания прочитанное уведомление переносится в архив
+ARCHIVE_AFTER_DAYS = int(os.getenv("NOTIFICATION_ARCHIVE_AFTER_DAYS", "30"))
+# Количество уведомлений, переносимых в архив одной транзакцией
+ARCHIVE_BATCH_SIZE = int(os.getenv("NOTIFICATION_ARCHIVE_BATCH_SIZE", "5000"))
+
+# Порядок полей в записи архива; user_id и день хранятся в строке архива
+FIELDS = ("id", "title", "text", "created_at", "read_at", "category", "confidence", "processing_status")
+
+def archive_horizon() -> datetime:
+    """Все архивные уведомления созданы раньше этого момента"""
+    return datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+def retention_cutoff(today: date) -> date | None:
+    """Архив за дни раньше этой даты удаляется: тот же срок, что у секций горячей таблицы (None — хранить всё)"""
+    if partitions.RETENTION_MONTHS <= 0:
+        return None
+    return partitions.add_months(partitions.month_start(today), -partitions.RETENTION_MONTHS)
+
+def _sort_key(notification: Notification):
+    return notification.created_at, notification.id
+
+def pack_notifications(notifications: Iterable[Notification]) -> bytes:
+    """Сжатый блок уведомлений, новые первыми"""
+    entries = [
+        [
+            str(n.id), n.title, n.text, n.created_at.isoformat(),
+            n.read_at.isoformat() if n.read_at else None,
+            n.category, n.confidence, n.processing_status,
+        ]
+        for n in sorted(notifications, key=_sort_key, reverse=True)
+    ]
+    return zlib.compress(json.dumps(entries, ensure_ascii=False, separators=(",", ":")).encode())
+
+def unpack_notifications(payload: bytes, user_id: UUID) -> list[Notification]:
+    """Уведомления из архивного блока (объекты не привязаны к сессии)"""
+    notifications = []
+    for entry in json.loads(zlib.decompress(payload)):
+        values = dict(zip(FIELDS, entry))
+        values["id"] = UUID(values["id"])
+        values["created_at"] = datetime.fromisoformat(values["created_at"])
+        if values["read_at"]:
+            values["read_at"] = datetime.fromisoformat(values["read_at"])
+        notifications.append(Notification(user_id=user_id, **values))
+    return notifications
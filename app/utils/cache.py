@@ -1,9 +1,81 @@
-from fastapi import Request
+from fastapi import Request, Response
 from fastapi_cache import FastAPICache
-import datetime
+from fastapi_cache.decorator import cache
+from functools import wraps
+from redis.exceptions import RedisError
+from uuid import UUID
+from app.config.redis import get_redis, get_sync_redis
+from app.utils.serialization import EncodedResponseCoder, MSGPACK, negotiate
 import logging
+import os
 
-def custom_key_builder(
+# Время жизни закэшированных списков; инвалидация происходит через версию пользователя
+CACHE_TTL = int(os.getenv("NOTIFICATIONS_CACHE_TTL", "3600"))
+# Ключ версии живёт дольше любой записи, построенной на её основе
+CACHE_VERSION_TTL = CACHE_TTL * 2
+CACHE_VERSION_KEY = "notifications:cache-version:{user_id}"
+# Клиенты перепроверяют список по ETag при каждом запросе: кэш на их стороне не видит версию пользователя
+LIST_CACHE_CONTROL = "private, no-cache"
+
+logger = logging.getLogger("app")
+# Ключи кэша логируются на каждый запрос: отдельный логгер для выборки (CACHE_KEY_LOG_SAMPLE_RATE)
+key_logger = logging.getLogger("app.cache")
+
+def _canonical_user_id(user_id: UUID | str) -> str:
+    """user_id в виде str(UUID), как его пишет инвалидация; нераспознанное значение остаётся как есть"""
+    if isinstance(user_id, UUID):
+        return str(user_id)
+    try:
+        return str(UUID(user_id))
+    except ValueError:
+        return user_id
+
+async def get_user_cache_version(user_id: str) -> str:
+    """Текущая версия кэша пользователя (продлевает жизнь ключа версии)"""
+    redis = get_redis()
+    if redis is None or not user_id:
+        return "0"
+    try:
+        version = await redis.getex(
+            CACHE_VERSION_KEY.format(user_id=_canonical_user_id(user_id)), ex=CACHE_VERSION_TTL
+        )
+    except RedisError as e:
+        logger.warning(f"Не удалось получить версию кэша пользователя {user_id}: {e}")
+        return "0"
+    if version is None:
+        return "0"
+    return version.decode() if isinstance(version, bytes) else str(version)
+
+async def bump_user_cache_version(*user_ids: UUID | str) -> None:
+    """Инвалидировать кэшированные списки пользователей увеличением их версии"""
+    redis = get_redis()
+    if redis is None or not user_ids:
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in set(map(_canonical_user_id, user_ids)):
+                key = CACHE_VERSION_KEY.format(user_id=user_id)
+                pipe.incr(key)
+                pipe.expire(key, CACHE_VERSION_TTL)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Не удалось инвалидировать кэш пользователей: {e}")
+
+def bump_user_cache_version_sync(*user_ids: UUID | str) -> None:
+    """Синхронная версия bump_user_cache_version для задач Celery"""
+    if not user_ids:
+        return
+    try:
+        pipe = get_sync_redis().pipeline(transaction=False)
+        for user_id in set(map(_canonical_user_id, user_ids)):
+            key = CACHE_VERSION_KEY.format(user_id=user_id)
+            pipe.incr(key)
+            pipe.expire(key, CACHE_VERSION_TTL)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Не удалось инвалидировать кэш пользователей: {e}")
+
+async def custom_key_builder(
     func,
     namespace: str = "",
     request: Request = None,
@@ -13,16 +85,49 @@ def custom_key_builder(
 ):
     prefix = FastAPICache.get_prefix()
     query_params = request.query_params if request else {}
-    user_id = str(query_params.get("user_id", ""))
-    last_created_at = query_params.get("last_created_at", "none")
+    # Один пользователь — одна запись и одна версия, в каком бы регистре ни пришёл user_id
+    user_id = _canonical_user_id(str(query_params.get("user_id", "")))
+    cursor = query_params.get("cursor") or "none"
     limit = str(query_params.get("limit", "10"))
+    fields = query_params.get("fields") or query_params.get("view") or "full"
+    # Закэшированное тело уже закодировано: у каждого формата своя запись
+    media = "msgpack" if request and negotiate(request.headers.get("accept")) == MSGPACK else "json"
+    version = await get_user_cache_version(user_id)
+
+    cache_key = f"{prefix}:{namespace}:{func.__module__}:{func.__name__}:{user_id}:v{version}:{cursor}:{limit}:{fields}:{media}"
+    if key_logger.isEnabledFor(logging.INFO):
+        key_logger.info(f"Сформирован ключ кэша: {cache_key}")
+    return cache_key
+
+
+def cache_encoded_response(expire: int, namespace: str, key_builder=custom_key_builder):
+    """Декоратор fastapi-cache для эндпоинтов, возвращающих готовый Response (encoded_response).
 
-    if last_created_at != "none":
-        try:
-            last_created_at = datetime.datetime.fromisoformat(last_created_at).isoformat()
-        except ValueError:
-            last_created_at = "invalid"
+    Эндпоинт должен принимать параметр response: Response. Заголовки кэша
+    (ETag, X-FastAPI-Cache) fastapi-cache выставляет на нём, а FastAPI не
+    переносит их в возвращённый Response — это делает декоратор.
+    Cache-Control: max-age от fastapi-cache заменяется на private, no-cache:
+    иначе браузер или прокси отдавали бы список до истечения TTL, минуя
+    инвалидацию по версии пользователя. Формат тела зависит от Accept,
+    поэтому ответ помечается Vary: Accept.
+    """
+    def wrapper(func):
+        cached = cache(expire=expire, namespace=namespace, key_builder=key_builder, coder=EncodedResponseCoder)(func)
 
-    cache_key = f"{prefix}:{namespace}:{func.__module__}:{func.__name__}:{user_id}:{last_created_at}:{limit}"
-    logging.getLogger("app").info(f"Сформирован ключ кэша: {cache_key}")
-    return cache_key
\ No newline at end of file
+        @wraps(cached)
+        async def inner(*args, **kwargs):
+            result = await cached(*args, **kwargs)
+            response = kwargs.get("response")
+            if isinstance(result, Response) and response is not None and result is not response:
+                result.raw_headers.extend(
+                    header for header in response.raw_headers
+                    if header[0] not in (b"content-length", b"content-type")
+                )
+            # При If-None-Match с совпавшим ETag fastapi-cache возвращает сам response (304)
+            target = result if isinstance(result, Response) else response
+            if target is not None:
+                target.headers["Cache-Control"] = LIST_CACHE_CONTROL
+                target.headers["Vary"] = "Accept"
+            return result
+        return inner
+    return wrapper
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from redis.exceptions import RedisError
+from typing import Iterable
+from uuid import UUID
+from app.config.redis import get_redis
+import logging
+import os
+import time
+
+# Сколько секунд после записи чтения пользователя идут в основную БД, а не в реплику
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+RECENT_WRITE_KEY = "notifications:recent-write:{kind}:{value}"
+
+logger = logging.getLogger("app")
+
+
+def _canonical(value: UUID | str | None) -> str | None:
+    """ID в каноническом виде: UUID из параметров запроса может быть в верхнем регистре или без дефисов"""
+    if not value:
+        return None
+    try:
+        return str(value if isinstance(value, UUID) else UUID(str(value)))
+    except ValueError:
+        return None
+
+
+class ReadYourWrites:
+    """Отметки недавних записей пользователей и уведомлений.
+
+    Хранятся в памяти процесса и в Redis с TTL, чтобы чтение на другой реплике
+    API тоже видело запись.
+    """
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS, max_local: int = 100_000):
+        self.window = window
+        self.max_local = max_local
+        self._local: OrderedDict[str, float] = OrderedDict()
+
+    @staticmethod
+    def _keys(user_ids: Iterable, notification_ids: Iterable) -> list[str]:
+        user_ids = filter(None, map(_canonical, user_ids))
+        notification_ids = filter(None, map(_canonical, notification_ids))
+        keys = [RECENT_WRITE_KEY.format(kind="user", value=value) for value in user_ids]
+        keys += [RECENT_WRITE_KEY.format(kind="notification", value=value) for value in notification_ids]
+        return keys
+
+    async def mark(self, user_ids: Iterable[UUID] = (), notification_ids: Iterable[UUID] = ()) -> None:
+        keys = self._keys(set(user_ids), set(notification_ids))
+        if not keys:
+            return
+        expires = time.monotonic() + self.window
+        for key in keys:
+            self._local[key] = expires
+            self._local.move_to_end(key)
+        while len(self._local) > self.max_local:
+            self._local.popitem(last=False)
+
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(key, 1, px=int(self.window * 1000))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Не удалось сохранить отметки недавних записей: {e}")
+
+    async def is_recent(
+        self,
+        user_id: UUID | str | None = None,
+        notification_id: UUID | str | None = None,
+        notification_ids: Iterable[UUID | str] = (),
+    ) -> bool:
+        """Была ли запись пользователя или любого из уведомлений в течение окна (одна проверка в Redis)"""
+        keys = self._keys([user_id], {notification_id, *notification_ids})
+        if not keys:
+            return False
+        now = time.monotonic()
+        if any(self._local.get(key, 0) > now for key in keys):
+            return True
+        redis = get_redis()
+        if redis is None:
+            return False
+        try:
+            return await redis.exists(*keys) > 0
+        except RedisError as e:
+            logger.warning(f"Не удалось проверить отметки недавних записей: {e}")
+            # Без Redis безопаснее прочитать из основной БД
+            return True
+
+
+read_your_writes = ReadYourWrites()
@@ -0,0 +1,78 @@
+from redis.exceptions import RedisError
+from uuid import UUID
+from app.config.redis import get_redis
+import logging
+import os
+
+UNREAD_KEY = "notifications:unread:{user_id}"
+# Ключи счётчиков, изменённых с последней сверки (reconcile_unread_counts)
+UNREAD_DIRTY_KEY = "notifications:unread-dirty"
+# Время жизни счётчика: расхождение, пропущенное сверкой, исправится при повторной инициализации из БД
+UNREAD_COUNT_TTL = int(os.getenv("UNREAD_COUNT_TTL", "86400"))
+
+logger = logging.getLogger("app")
+
+# Изменяет только существующие счётчики: отсутствующий счётчик инициализируется
+# из БД при первом чтении, и инкремент "с нуля" дал бы неверное значение.
+# KEYS — счётчики и последним множество UNREAD_DIRTY_KEY, куда добавляются все
+# переданные счётчики; ARGV — дельты в порядке KEYS; результат не опускается ниже нуля.
+INCR_EXISTING_SCRIPT = """
+local dirty = KEYS[#KEYS]
+for i = 1, #KEYS - 1 do
+    local key = KEYS[i]
+    if redis.call('EXISTS', key) == 1 then
+        local value = redis.call('INCRBY', key, ARGV[i])
+        if value < 0 then
+            redis.call('SET', key, 0, 'KEEPTTL')
+        end
+    end
+    redis.call('SADD', dirty, key)
+end
+return #KEYS - 1
+"""
+
+_incr_script = None
+_incr_script_client = None
+
+def unread_key(user_id: UUID | str) -> str:
+    return UNREAD_KEY.format(user_id=user_id)
+
+async def get_unread_count(user_id: UUID) -> int | None:
+    """Значение счётчика непрочитанных или None, если счётчика нет или Redis недоступен"""
+    redis = get_redis()
+    if redis is None:
+        return None
+    try:
+        value = await redis.get(unread_key(user_id))
+    except RedisError as e:
+        logger.warning(f"Не удалось прочитать счётчик непрочитанных {user_id}: {e}")
+        return None
+    return int(value) if value is not None else None
+
+async def init_unread_count(user_id: UUID, count: int) -> None:
+    """Инициализировать счётчик значением из БД, если его ещё нет"""
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.set(unread_key(user_id), count, nx=True, ex=UNREAD_COUNT_TTL)
+    except RedisError as e:
+        logger.warning(f"Не удалось инициализировать счётчик непрочитанных {user_id}: {e}")
+
+async def change_unread_counts(deltas: dict[UUID, int]) -> None:
+    """Изменить счётчики непрочитанных нескольких пользователей одним вызовом"""
+    redis = get_redis()
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if redis is None or not deltas:
+        return
+    global _incr_script, _incr_script_client
+    if _incr_script_client is not redis:
+        _incr_script = redis.register_script(INCR_EXISTING_SCRIPT)
+        _incr_script_client = redis
+    try:
+        await _incr_script(
+            keys=[*(unread_key(user_id) for user_id in deltas), UNREAD_DIRTY_KEY],
+            args=list(deltas.values()),
+        )
+    except RedisError as e:
+        logger.warning(f"Не удалось обновить счётчики непрочитанных: {e}")
@@ -0,0 +1,113 @@
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+import time
+
+# Метод репозитория или задачи, выполняющий запросы; метка гистограммы длительности запросов
+query_method: ContextVar[str] = ContextVar("query_method", default="other")
+
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Время получения соединения из пула (ожидание свободного соединения или открытие нового)",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Соединения, выданные из пула",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Открытые соединения сверх pool_size",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Длительность выполнения запросов к БД",
+    ["engine", "method"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+class _PoolMetrics:
+    """Метрики пула соединений; метка engine — pool_logging_name движка"""
+
+    @property
+    def metrics_name(self) -> str:
+        return self._orig_logging_name or "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.labels(self.metrics_name).observe(time.perf_counter() - started)
+            self._report_usage()
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._report_usage()
+
+    def _report_usage(self) -> None:
+        POOL_IN_USE.labels(self.metrics_name).set(self.checkedout())
+        # overflow() отрицателен, пока открыто меньше pool_size соединений
+        POOL_OVERFLOW.labels(self.metrics_name).set(max(self.overflow(), 0))
+
+
+class InstrumentedQueuePool(_PoolMetrics, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolMetrics, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Замерять длительность запросов движка (синхронного или sync_engine асинхронного)"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        QUERY_DURATION.labels(name, query_method.get()).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # Запрос с ошибкой не доходит до after_cursor_execute
+        stack = context.connection.info.get("query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+def track_queries(func):
+    """Помечать запросы, выполненные внутри функции, её именем (Класс.метод)"""
+    label = func.__qualname__
+
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = query_method.set(label)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                query_method.reset(token)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = query_method.set(label)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            query_method.reset(token)
+    return wrapper
@@ -0,0 +1,282 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable
+from uuid import UUID
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+from app.config.redis import get_redis, get_sync_redis
+from app.models.notification import Notification
+from app.utils.pubsub import STATUS_CHANNEL, pubsub_hub
+import json
+import logging
+import os
+import time
+
+# Время жизни уведомления в Redis в секундах (0 — кэш отключён)
+DETAIL_CACHE_TTL = int(os.getenv("DETAIL_CACHE_TTL", "300"))
+# Время жизни уведомлений, обработка которых ещё не завершена: статус скоро изменится
+DETAIL_CACHE_PENDING_TTL = int(os.getenv("DETAIL_CACHE_PENDING_TTL", "5"))
+# Время жизни отметки "уведомления нет" для неизвестных ID
+DETAIL_CACHE_NEGATIVE_TTL = int(os.getenv("DETAIL_CACHE_NEGATIVE_TTL", "30"))
+# Количество уведомлений в локальном LRU процесса API (0 — без локального уровня)
+DETAIL_CACHE_LOCAL_SIZE = int(os.getenv("DETAIL_CACHE_LOCAL_SIZE", "10000"))
+# Предельный возраст записи локального уровня на случай потери сообщений инвалидации
+DETAIL_CACHE_LOCAL_TTL = float(os.getenv("DETAIL_CACHE_LOCAL_TTL", "30"))
+
+DETAIL_KEY = "notifications:detail:{id}"
+# Канал, по которому процессы API сбрасывают локальные копии изменённых уведомлений
+INVALIDATE_CHANNEL = "notifications:detail-invalidate"
+# Значение ключа для ID, которого нет в БД
+MISSING = "-"
+
+TERMINAL_STATUSES = ("completed", "failed")
+FIELDS = ("id", "user_id", "title", "text", "created_at", "read_at", "category", "confidence", "processing_status")
+
+# Обновить поля закэшированного уведомления, не зная остальных; отсутствующий ключ не создаётся.
+# ARGV[2] > 0 — новое время жизни, иначе прежнее сохраняется
+PATCH_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if not raw or raw == '-' then
+    return 0
+end
+local data = cjson.decode(raw)
+for field, value in pairs(cjson.decode(ARGV[1])) do
+    data[field] = value
+end
+local ttl = tonumber(ARGV[2])
+if ttl > 0 then
+    redis.call('SET', KEYS[1], cjson.encode(data), 'EX', ttl)
+else
+    redis.call('SET', KEYS[1], cjson.encode(data), 'KEEPTTL')
+end
+return 1
+"""
+
+CACHE_REQUESTS = Counter(
+    "notification_detail_cache_requests_total",
+    "Обращения к кэшу уведомлений по ID",
+    ["tier", "result"],
+)
+
+logger = logging.getLogger("app")
+
+
+def ttl_for(status: str | None) -> int:
+    return DETAIL_CACHE_TTL if status in TERMINAL_STATUSES else min(DETAIL_CACHE_PENDING_TTL, DETAIL_CACHE_TTL)
+
+def dump_notification(notification: Notification) -> str:
+    data = {}
+    for field in FIELDS:
+        value = getattr(notification, field)
+        if isinstance(value, UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        data[field] = value
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+def load_notification(raw: str | bytes) -> Notification:
+    """Уведомление из кэша (объект не привязан к сессии)"""
+    values = json.loads(raw)
+    values["id"] = UUID(values["id"])
+    values["user_id"] = UUID(values["user_id"])
+    values["created_at"] = datetime.fromisoformat(values["created_at"])
+    if values["read_at"]:
+        values["read_at"] = datetime.fromisoformat(values["read_at"])
+    return Notification(**values)
+
+def _decode(raw: str | bytes) -> str:
+    return raw.decode() if isinstance(raw, bytes) else raw
+
+
+class DetailCache:
+    """Кэш уведомлений по ID: локальный LRU процесса API перед общим уровнем в Redis.
+
+    Записи API пишут новое значение в Redis после коммита и рассылают ID по
+    INVALIDATE_CHANNEL; воркеры обновляют поля в Redis скриптом, а их события
+    статусов сбрасывают локальные копии. Локальный уровень используется только
+    при работающей подписке pub/sub, иначе он мог бы отстать от Redis.
+    """
+
+    def __init__(
+        self,
+        ttl: int = DETAIL_CACHE_TTL,
+        negative_ttl: int = DETAIL_CACHE_NEGATIVE_TTL,
+        local_size: int = DETAIL_CACHE_LOCAL_SIZE,
+        local_ttl: float = DETAIL_CACHE_LOCAL_TTL,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        # ID -> (срок годности, сериализованное уведомление или MISSING)
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # Счётчик инвалидаций: значение, прочитанное до инвалидации, не попадает в локальный уровень
+        self._evictions = 0
+        self._patch_script = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and get_redis() is not None
+
+    @property
+    def local_enabled(self) -> bool:
+        return pubsub_hub.running
+
+    def clear(self) -> None:
+        self._local.clear()
+
+    def evict_local(self, *notification_ids: UUID | str) -> None:
+        self._evictions += 1
+        for notification_id in notification_ids:
+            self._local.pop(str(notification_id), None)
+
+    def handle_invalidation(self, event: dict) -> None:
+        """Обработчик канала INVALIDATE_CHANNEL"""
+        self.evict_local(*event["ids"])
+
+    def handle_status(self, event: dict) -> None:
+        """Обработчик канала статусов: воркер уже обновил уведомление в Redis"""
+        self.evict_local(event["id"])
+
+    def _get_local(self, key: str) -> str | None:
+        if not self.local_enabled or not self.local_size:
+            return None
+        entry = self._local.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            CACHE_REQUESTS.labels("local", "miss").inc()
+            return None
+        self._local.move_to_end(key)
+        CACHE_REQUESTS.labels("local", "hit").inc()
+        return entry[1]
+
+    def _set_local(self, key: str, raw: str, ttl: float, evictions: int) -> None:
+        if not self.local_enabled or not self.local_size or evictions != self._evictions:
+            return
+        self._local[key] = (time.monotonic() + min(ttl, self.local_ttl), raw)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def get(self, notification_id: UUID) -> Notification | str | None:
+        """Уведомление, MISSING для известного отсутствующего ID или None при промахе"""
+        return (await self.get_many([notification_id])).get(notification_id)
+
+    async def get_many(self, notification_ids: list[UUID]) -> dict[UUID, Notification | str]:
+        """Найденные в кэше уведомления (или MISSING) по ID: локальный уровень, затем один MGET"""
+        if not self.enabled:
+            return {}
+        evictions = self._evictions
+        found: dict[UUID, str] = {}
+        remote = []
+        for notification_id in notification_ids:
+            raw = self._get_local(str(notification_id))
+            if raw is None:
+                remote.append(notification_id)
+            else:
+                found[notification_id] = raw
+        if remote:
+            try:
+                values = await get_redis().mget([DETAIL_KEY.format(id=notification_id) for notification_id in remote])
+            except RedisError as e:
+                logger.warning(f"Не удалось прочитать уведомления из кэша: {e}")
+                values = [None] * len(remote)
+            for notification_id, raw in zip(remote, values):
+                if raw is None:
+                    CACHE_REQUESTS.labels("redis", "miss").inc()
+                    continue
+                CACHE_REQUESTS.labels("redis", "hit").inc()
+                raw = found[notification_id] = _decode(raw)
+                self._set_local(str(notification_id), raw, self.negative_ttl if raw == MISSING else self.ttl, evictions)
+        return {
+            notification_id: MISSING if raw == MISSING else load_notification(raw)
+            for notification_id, raw in found.items()
+        }
+
+    async def fill(self, notification_id: UUID, notification: Notification | None) -> None:
+        """Сохранить прочитанное из БД, не перезаписывая значение, записанное после изменения"""
+        await self.fill_many({notification_id: notification})
+
+    async def fill_many(self, notifications: dict[UUID, Notification | None]) -> None:
+        """Пакетный вариант fill; None — уведомления нет в БД"""
+        if not notifications or not self.enabled:
+            return
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for notification_id, notification in notifications.items():
+                    key = DETAIL_KEY.format(id=notification_id)
+                    if notification is None:
+                        pipe.set(key, MISSING, ex=self.negative_ttl, nx=True)
+                    else:
+                        pipe.set(
+                            key, dump_notification(notification), ex=ttl_for(notification.processing_status), nx=True
+                        )
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Не удалось сохранить уведомления в кэш: {e}")
+
+    async def write(self, notifications: Iterable[Notification]) -> None:
+        """Записать изменённые уведомления (после коммита) и сбросить их локальные копии во всех процессах"""
+        notifications = list(notifications)
+        if not notifications or not self.enabled:
+            return
+        ids = [str(n.id) for n in notifications]
+        self.evict_local(*ids)
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for notification in notifications:
+                    pipe.set(
+                        DETAIL_KEY.format(id=notification.id),
+                        dump_notification(notification),
+                        ex=ttl_for(notification.processing_status),
+                    )
+                pipe.publish(INVALIDATE_CHANNEL, json.dumps({"ids": ids}))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Не удалось обновить уведомления в кэше: {e}")
+
+    async def invalidate(self, notification_ids: Iterable[UUID]) -> None:
+        """Удалить изменённые уведомления, полное значение которых неизвестно"""
+        ids = [str(notification_id) for notification_id in notification_ids]
+        if not ids or not self.enabled:
+            return
+        self.evict_local(*ids)
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.delete(*(DETAIL_KEY.format(id=notification_id) for notification_id in ids))
+                pipe.publish(INVALIDATE_CHANNEL, json.dumps({"ids": ids}))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Не удалось инвалидировать уведомления в кэше: {e}")
+
+    def patch_sync(self, changes: list[dict]) -> None:
+        """Обновить поля уведомлений в Redis из воркера Celery; каждый элемент содержит id.
+
+        Локальные копии процессов API сбрасывает событие статуса, которое воркер публикует следом.
+        """
+        if not changes or self.ttl <= 0:
+            return
+        try:
+            redis = get_sync_redis()
+            if self._patch_script is None:
+                self._patch_script = redis.register_script(PATCH_SCRIPT)
+            pipe = redis.pipeline(transaction=False)
+            for change in changes:
+                fields = {
+                    field: str(value) if isinstance(value, UUID) else value
+                    for field, value in change.items() if field not in ("id", "created_at")
+                }
+                ttl = self.ttl if fields.get("processing_status") in TERMINAL_STATUSES else 0
+                self._patch_script(
+                    keys=[DETAIL_KEY.format(id=change["id"])],
+                    args=[json.dumps(fields), ttl],
+                    client=pipe,
+                )
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Не удалось обновить уведомления в кэше: {e}")
+
+
+detail_cache = DetailCache()
+pubsub_hub.add_handler(INVALIDATE_CHANNEL, detail_cache.handle_invalidation)
+pubsub_hub.add_handler(STATUS_CHANNEL, detail_cache.handle_status)
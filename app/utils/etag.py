@@ -0,0 +1,14 @@
+import hashlib
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из значений, от которых зависит представление ресурса"""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return f'"{hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()}"'
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Совпадает ли заголовок If-None-Match с текущим ETag (слабое сравнение, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from typing import Iterable
+from uuid import UUID
+import os
+import time
+
+# Допустимое расхождение между временем в UUIDv7 и created_at строки
+ID_TIME_SKEW = timedelta(days=1)
+
+def uuid7() -> UUID:
+    """UUID версии 7 (RFC 9562): первые 48 бит — время создания в миллисекундах"""
+    value = int.from_bytes(os.urandom(10), "big")
+    value |= time.time_ns() // 1_000_000 << 80
+    # Версия 7 и вариант RFC 4122
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    return UUID(int=value)
+
+def uuid7_time(value: UUID) -> datetime | None:
+    """Время создания из UUIDv7 (UTC, без часового пояса); None для других версий"""
+    if value.version != 7:
+        return None
+    return datetime.utcfromtimestamp((value.int >> 80) / 1000)
+
+def created_at_bounds(ids: Iterable[UUID]) -> tuple[datetime, datetime] | None:
+    """Границы created_at для набора ID, чтобы запрос затрагивал только нужные секции.
+
+    None, если среди ID есть не UUIDv7 (например, созданные до перехода на них).
+    """
+    times = []
+    for value in ids:
+        created_at = uuid7_time(value)
+        if created_at is None:
+            return None
+        times.append(created_at)
+    if not times:
+        return None
+    return min(times) - ID_TIME_SKEW, max(times) + ID_TIME_SKEW
@@ -0,0 +1,18 @@
+from datetime import datetime
+from uuid import UUID
+import base64
+import binascii
+
+def encode_cursor(created_at: datetime, notification_id: UUID) -> str:
+    """Закодировать позицию (created_at, id) последнего элемента страницы в непрозрачный курсор"""
+    raw = f"{created_at.isoformat()}|{notification_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Раскодировать курсор; ValueError, если курсор повреждён"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, notification_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(notification_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
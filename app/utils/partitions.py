@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+from datetime import date, datetime
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+import logging
+import os
+import re
+
+logger = logging.getLogger("app")
+
+# На сколько месяцев вперёд создавать секции таблицы уведомлений
+PARTITIONS_AHEAD = int(os.getenv("NOTIFICATION_PARTITIONS_AHEAD", "3"))
+# Сколько полных месяцев хранить уведомления (0 — хранить всё)
+RETENTION_MONTHS = int(os.getenv("NOTIFICATION_RETENTION_MONTHS", "12"))
+# Что делать с устаревшей секцией: "drop" — удалить, "detach" — отсоединить и оставить таблицей
+EXPIRED_PARTITION_ACTION = os.getenv("NOTIFICATION_EXPIRED_PARTITION_ACTION", "drop")
+
+PARENT_TABLE = "notifications"
+# Секция для строк месяцев, у которых ещё нет своей секции: вставка не падает, если обслуживание отстало
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+PARTITION_NAME = re.compile(r"^notifications_p(\d{4})(\d{2})$")
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+def is_partitioned(conn: Connection) -> bool:
+    """Секционирована ли таблица уведомлений (только PostgreSQL)"""
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+        {"table": PARENT_TABLE},
+    ).scalar())
+
+def existing_partitions(conn: Connection) -> dict[date, str]:
+    """Помесячные секции таблицы уведомлений: первый день месяца -> имя таблицы"""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalars()
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+def has_default_partition(conn: Connection) -> bool:
+    """Есть ли у таблицы уведомлений секция по умолчанию"""
+    return conn.execute(text("SELECT to_regclass(:table)"), {"table": DEFAULT_PARTITION}).scalar() is not None
+
+def default_partition_months(conn: Connection) -> list[date]:
+    """Месяцы, строки которых лежат в секции по умолчанию"""
+    if not has_default_partition(conn):
+        return []
+    return sorted(conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', created_at)::date FROM {DEFAULT_PARTITION}"
+    )).scalars())
+
+@contextmanager
+def _transaction(conn: Connection):
+    # Соединение обслуживания работает в AUTOCOMMIT (DETACH ... CONCURRENTLY): транзакция явная
+    conn.execute(text("BEGIN"))
+    try:
+        yield
+    except BaseException:
+        conn.execute(text("ROLLBACK"))
+        raise
+    conn.execute(text("COMMIT"))
+
+def create_partition(conn: Connection, month: date, move_from_default: bool = False) -> str:
+    """Создать секцию месяца; move_from_default — перенести в неё строки месяца из секции по умолчанию"""
+    name = partition_name(month)
+    bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    if not move_from_default:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} {bounds}"))
+        return name
+    # Секцию нельзя создать, пока строки её диапазона лежат в секции по умолчанию:
+    # строки переносятся в отдельную таблицу, которая затем присоединяется
+    with _transaction(conn):
+        conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        moved = conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end "
+            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        ), {"start": month, "end": add_months(month, 1)}).rowcount
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} {bounds}"))
+    logger.warning(f"Секция {name} создана с опозданием: из {DEFAULT_PARTITION} перенесено строк: {moved}")
+    return name
+
+def expire_partition(
+    conn: Connection, name: str, action: str = EXPIRED_PARTITION_ACTION, concurrently: bool = True
+) -> None:
+    """Отсоединить секцию и, если нужно, удалить её.
+
+    concurrently — не блокировать запись в таблицу (PostgreSQL запрещает это
+    при наличии секции по умолчанию: тогда DETACH обычный, с короткой
+    эксклюзивной блокировкой).
+    """
+    # CONCURRENTLY нельзя выполнять в транзакции: соединение должно быть в режиме AUTOCOMMIT
+    suffix = " CONCURRENTLY" if concurrently else ""
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}{suffix}"))
+    if action == "drop":
+        conn.execute(text(f"DROP TABLE {name}"))
+
+def maintain_partitions(
+    conn: Connection,
+    today: date,
+    ahead: int = PARTITIONS_AHEAD,
+    retention: int = RETENTION_MONTHS,
+    action: str = EXPIRED_PARTITION_ACTION,
+) -> tuple[list[str], list[str]]:
+    """Создать секции на ahead месяцев вперёд и убрать секции старше retention месяцев.
+
+    Строки, попавшие в секцию по умолчанию, переносятся в секции своих месяцев.
+    Возвращает имена созданных и убранных секций.
+    """
+    current = month_start(today)
+    partitions = existing_partitions(conn)
+    overflow = set(default_partition_months(conn))
+
+    created = []
+    for month in sorted(overflow | {add_months(current, offset) for offset in range(ahead + 1)}):
+        if month not in partitions:
+            created.append(create_partition(conn, month, move_from_default=month in overflow))
+
+    expired = []
+    if retention > 0:
+        cutoff = add_months(current, -retention)
+        concurrently = not has_default_partition(conn)
+        for month, name in sorted(partitions.items()):
+            if month < cutoff:
+                expire_partition(conn, name, action, concurrently)
+                expired.append(name)
+    return created, expired
@@ -0,0 +1,138 @@
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from typing import Callable
+from uuid import UUID
+from app.config.redis import get_redis, get_sync_redis
+import asyncio
+import json
+import logging
+
+# Канал, в который воркеры публикуют переходы статусов обработки
+STATUS_CHANNEL = "notifications:status"
+# Канал, по которому API будит релей outbox после коммита новых записей
+OUTBOX_CHANNEL = "notifications:outbox"
+
+logger = logging.getLogger("app")
+
+
+class PubSubHub:
+    """Одна подписка Redis на процесс API, раздающая сообщения обработчикам каналов"""
+
+    def __init__(self, reconnect_delay: float = 1.0):
+        self.reconnect_delay = reconnect_delay
+        self._handlers: dict[str, list[Callable[[dict], None]]] = {}
+        self._redis: aioredis.Redis | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def add_handler(self, channel: str, handler: Callable[[dict], None]) -> None:
+        """Зарегистрировать обработчик канала (до вызова start); у канала может быть несколько обработчиков"""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def start(self, redis: aioredis.Redis) -> None:
+        self._redis = redis
+        pubsub = await self._subscribe()
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _subscribe(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(*self._handlers)
+        return pubsub
+
+    async def _listen(self, pubsub) -> None:
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    handlers = self._handlers.get(channel)
+                    if handlers:
+                        event = json.loads(message["data"])
+                        for handler in handlers:
+                            handler(event)
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except (RedisError, OSError, ValueError) as e:
+                logger.warning(f"Подписка Redis прервана, переподключение: {e!r}")
+                await asyncio.sleep(self.reconnect_delay)
+                try:
+                    await pubsub.aclose()
+                    pubsub = await self._subscribe()
+                except (RedisError, OSError) as e:
+                    logger.warning(f"Не удалось переподключить подписку Redis: {e!r}")
+
+
+class StatusSubscriptions:
+    """Локальные подписчики на статусы уведомлений: очередь на каждое соединение"""
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+
+    def subscribe(self, notification_id: UUID) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(str(notification_id), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, notification_id: UUID, queue: asyncio.Queue) -> None:
+        key = str(notification_id)
+        queues = self._subscribers.get(key)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[key]
+
+    def dispatch(self, event: dict) -> None:
+        for queue in self._subscribers.get(event["id"], ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент пропускает промежуточные статусы, важен последний
+                queue.get_nowait()
+                queue.put_nowait(event)
+
+
+pubsub_hub = PubSubHub()
+status_subscriptions = StatusSubscriptions()
+pubsub_hub.add_handler(STATUS_CHANNEL, status_subscriptions.dispatch)
+
+
+def publish_statuses_sync(statuses: list[tuple[UUID, str]]) -> None:
+    """Опубликовать переходы статусов из воркера Celery одним пайплайном"""
+    if not statuses:
+        return
+    try:
+        pipe = get_sync_redis().pipeline(transaction=False)
+        for notification_id, status in statuses:
+            pipe.publish(STATUS_CHANNEL, json.dumps({"id": str(notification_id), "status": status}))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Не удалось опубликовать статусы уведомлений: {e}")
+
+
+async def wake_outbox_relay() -> None:
+    """Сообщить релею о новых записях outbox; без Redis релей найдёт их при следующем опросе"""
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.publish(OUTBOX_CHANNEL, "1")
+    except RedisError as e:
+        logger.warning(f"Не удалось разбудить релей outbox: {e}")
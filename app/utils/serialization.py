@@ -0,0 +1,100 @@
+from datetime import date, datetime
+from typing import Any, Iterable
+from uuid import UUID
+from fastapi_cache.coder import JsonCoder
+from starlette.responses import Response
+import msgpack
+import orjson
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# Типы, под которыми клиенты запрашивают MessagePack
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+# Метка формата в начале закэшированного ответа; JSON-документ не начинается с управляющего байта
+_FORMAT_TAGS = {JSON: b"\x01", MSGPACK: b"\x02"}
+_TAG_FORMATS = {tag: media_type for media_type, tag in _FORMAT_TAGS.items()}
+
+
+def _media_ranges(accept: str) -> dict[str, float]:
+    """Диапазоны из заголовка Accept с их весами q (RFC 9110, 12.5.1)"""
+    ranges: dict[str, float] = {}
+    for part in accept.split(","):
+        media_range, *params = part.split(";")
+        media_range = media_range.strip().lower()
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        ranges[media_range] = max(quality, ranges.get(media_range, 0.0))
+    return ranges
+
+
+def negotiate(accept: str | None) -> str:
+    """Формат ответа по заголовку Accept: MessagePack, если клиент явно назвал его с весом
+    не ниже JSON; иначе JSON. q=0 запрещает формат."""
+    if not accept:
+        return JSON
+    ranges = _media_ranges(accept)
+    msgpack_quality = max(ranges.get(media_type, 0.0) for media_type in MSGPACK_TYPES)
+    if msgpack_quality == 0:
+        return JSON
+    # Для JSON учитывается самый точный из подходящих диапазонов
+    for media_range in (JSON, "application/*", "*/*"):
+        if media_range in ranges:
+            json_quality = ranges[media_range]
+            break
+    else:
+        json_quality = 0.0
+    return MSGPACK if msgpack_quality >= json_quality else JSON
+
+
+def row_to_dict(row: Any, fields: Iterable[str]) -> dict:
+    """Поля ORM-объекта или строки результата без валидации pydantic"""
+    return {field: getattr(row, field) for field in fields}
+
+
+def _msgpack_default(value: Any) -> Any:
+    # Представление как в JSON-ответах: строки ISO 8601 и UUID
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в MessagePack")
+
+
+def encode(content: Any, media_type: str = JSON) -> bytes:
+    if media_type == MSGPACK:
+        return msgpack.packb(content, default=_msgpack_default)
+    return orjson.dumps(content)
+
+
+def encoded_response(content: Any, media_type: str = JSON) -> Response:
+    """Ответ с уже закодированным телом: FastAPI не валидирует и не кодирует его повторно"""
+    return Response(content=encode(content, media_type), media_type=media_type)
+
+
+class EncodedResponseCoder(JsonCoder):
+    """Кодер fastapi-cache, хранящий готовое тело ответа.
+
+    Попадание в кэш возвращает те же байты без декодирования и повторного
+    кодирования. Значения, закэшированные JsonCoder, по-прежнему читаются.
+    """
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, Response) and value.media_type in _FORMAT_TAGS:
+            return _FORMAT_TAGS[value.media_type] + bytes(value.body)
+        return super().encode(value)
+
+    @classmethod
+    def decode_as_type(cls, value: bytes, *, type_: Any) -> Any:
+        if isinstance(value, bytes) and value[:1] in _TAG_FORMATS:
+            return Response(content=value[1:], media_type=_TAG_FORMATS[value[:1]])
+        return super().decode_as_type(value, type_=type_)
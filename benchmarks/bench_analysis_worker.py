@@ -0,0 +1,60 @@
+"""Сравнение пропускной способности анализа: prefork-процессы против asyncio-воркера.
+
+Оба режима используют мок-AI API. Задержка мока уменьшена, чтобы бенчмарк
+выполнялся быстро; соотношение пропускной способности от этого не меняется.
+
+    python -m benchmarks.bench_analysis_worker --count 400 --processes 8 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import time
+from multiprocessing import Pool
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=400, help="Количество уведомлений")
+    parser.add_argument("--processes", type=int, default=8, help="Процессов в prefork-режиме")
+    parser.add_argument("--concurrency", type=int, default=200, help="Лимит конкурентности asyncio-воркера")
+    parser.add_argument("--latency-min", type=float, default=0.05, help="Минимальная задержка мока, с")
+    parser.add_argument("--latency-max", type=float, default=0.15, help="Максимальная задержка мока, с")
+    return parser.parse_args()
+
+
+def bench_prefork(texts, processes):
+    from app.tasks import analyze_text
+
+    started = time.perf_counter()
+    with Pool(processes) as pool:
+        pool.map(analyze_text, texts, chunksize=1)
+    return time.perf_counter() - started
+
+
+def bench_async(texts, concurrency):
+    from app.analysis.client import AsyncAnalyzerClient
+
+    client = AsyncAnalyzerClient(concurrency=concurrency)
+    started = time.perf_counter()
+    asyncio.run(client.analyze_many(texts))
+    return time.perf_counter() - started
+
+
+def main():
+    args = parse_args()
+    # Задержку мока нужно задать до импорта модулей приложения
+    os.environ["ANALYZER_MOCK_LATENCY_MIN"] = str(args.latency_min)
+    os.environ["ANALYZER_MOCK_LATENCY_MAX"] = str(args.latency_max)
+
+    texts = [f"Payment failed for order {i}" if i % 3 == 0 else f"Backup {i} completed" for i in range(args.count)]
+
+    prefork = bench_prefork(texts, args.processes)
+    async_ = bench_async(texts, args.concurrency)
+
+    print(f"{'mode':<32}{'seconds':>10}{'notifications/s':>18}")
+    print(f"{f'prefork ({args.processes} processes)':<32}{prefork:>10.2f}{args.count / prefork:>18.1f}")
+    print(f"{f'async (1 process, {args.concurrency} in flight)':<32}{async_:>10.2f}{args.count / async_:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
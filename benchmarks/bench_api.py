@@ -0,0 +1,346 @@
+"""Нагрузочный бенчмарк API и воркера в одном процессе, без внешних сервисов.
+
+Приложение вызывается через ASGI-транспорт httpx. БД — файл SQLite во
+временном каталоге, Redis — FakeServer из benchmarks.fake_redis. Celery не
+подключается к брокеру: релей outbox пересылает записи в заглушку, которая
+только запоминает ID, а сценарий process_notification выполняет задачу в
+процессе через apply (как eager).
+
+Для каждого сценария (create, list_cold, list_warm, detail, status, mark_read,
+process_notification) результат — JSON с RPS, p50/p95/p99 в миллисекундах,
+пиком памяти на запрос (tracemalloc, отдельный последовательный прогон) и
+сборками мусора поколения 0 на запрос. Результаты разных коммитов сравнивает
+--baseline: изменения печатаются в stderr, JSON остаётся в stdout или --output.
+
+    python -m benchmarks.bench_api --requests 500 --output before.json
+    python -m benchmarks.bench_api --requests 500 --baseline before.json
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from benchmarks.fake_redis import FakeAsyncRedis, FakeRedis, FakeServer
+
+SCENARIOS = ("create", "list_cold", "list_warm", "detail", "status", "mark_read", "process_notification")
+API = "/api/v1/notifications"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="Запросов в каждом сценарии")
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных запросов к API")
+    parser.add_argument("--alloc-requests", type=int, default=50, help="Запросов в прогоне под tracemalloc")
+    parser.add_argument("--warmup", type=int, default=20, help="Запросов без замера перед каждым сценарием")
+    parser.add_argument("--users", type=int, default=20, help="Пользователей в начальных данных")
+    parser.add_argument("--per-user", type=int, default=100, help="Уведомлений на пользователя")
+    parser.add_argument("--limit", type=int, default=20, help="Размер страницы списка")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл для JSON с результатами (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    return parser.parse_args()
+
+
+def configure_environment(directory: str) -> None:
+    """Окружение задаётся до импорта модулей приложения: они читают его при импорте"""
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{directory}/bench.db"
+    os.environ["SYNC_DATABASE_URL"] = f"sqlite:///{directory}/bench.db"
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+    os.environ["REDIS_URL"] = "redis://fake:6379"
+    for name, value in {
+        "RATE_LIMIT_PER_MINUTE": "1000000000",
+        "RATE_LIMIT_BATCH_PER_MINUTE": "1000000000",
+        "ANALYZER_MOCK_LATENCY_MIN": "0",
+        "ANALYZER_MOCK_LATENCY_MAX": "0",
+        "LOG_FILE": "",
+        "LOG_LEVEL": "WARNING",
+        "UVICORN_LOG_LEVEL": "WARNING",
+        "CELERY_LOG_LEVEL": "WARNING",
+        "SQLALCHEMY_LOG_LEVEL": "WARNING",
+    }.items():
+        os.environ.setdefault(name, value)
+
+
+class CeleryStub:
+    """Замена celery_app в релее outbox: send_task запоминает ID уведомлений вместо отправки в брокер"""
+
+    def __init__(self):
+        self.notification_ids: list[str] = []
+
+    def send_task(self, name: str, args=(), **kwargs) -> None:
+        self.notification_ids.extend(args[0])
+
+
+async def start(server: FakeServer) -> CeleryStub:
+    """То же, что startup приложения, но с Redis в памяти и схемой БД в SQLite"""
+    from fastapi_cache import FastAPICache
+    from fastapi_cache.backends.redis import RedisBackend
+    from app.config import redis as redis_config
+    from app.config.database import Base, engine
+    from app.config.logging_config import setup_logging
+    from app import outbox_relay
+    from app.utils.pubsub import pubsub_hub
+
+    setup_logging()
+    client = FakeAsyncRedis(server)
+    redis_config.set_redis(client)
+    redis_config._sync_redis = FakeRedis(server)
+    FastAPICache.init(RedisBackend(client), prefix="fastapi-cache")
+    await pubsub_hub.start(client)
+
+    async with engine.begin() as conn:
+        # WAL: воркер пишет синхронным движком, пока API читает асинхронным
+        await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        await conn.run_sync(Base.metadata.create_all)
+
+    celery = CeleryStub()
+    outbox_relay.celery_app = celery
+    return celery
+
+
+async def seed(users: int, per_user: int, status: str = "completed") -> list[tuple[UUID, list[UUID]]]:
+    """Непрочитанные уведомления пользователей; возвращает (user_id, ID уведомлений)"""
+    import uuid
+    from sqlalchemy import insert
+    from app.config.database import async_session
+    from app.models.notification import Notification
+    from app.utils.ids import uuid7
+
+    now = datetime.utcnow()
+    data = []
+    rows = []
+    for _ in range(users):
+        user_id = uuid.uuid4()
+        ids = [uuid7() for _ in range(per_user)]
+        data.append((user_id, ids))
+        rows.extend(
+            {
+                "id": notification_id, "user_id": user_id, "title": f"Notification {n}",
+                "text": f"Payment failed for order {n}" if n % 3 == 0 else f"Backup {n} completed",
+                "created_at": now - timedelta(seconds=n), "processing_status": status,
+                "category": "info" if status == "completed" else None,
+                "confidence": 0.9 if status == "completed" else None,
+            }
+            for n, notification_id in enumerate(ids)
+        )
+    async with async_session() as session:
+        await session.execute(insert(Notification), rows)
+        await session.commit()
+    return data
+
+
+def percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_scenario(args, request, prepare=None, concurrency: int | None = None) -> dict:
+    """Замер сценария: request(i) возвращает HTTP-статус, prepare(i) выполняется вне замера.
+
+    Индексы: замер — [0, requests), прогон под tracemalloc — следующие alloc_requests,
+    разогрев — последние warmup.
+    """
+    requests, alloc_requests = args.requests, args.alloc_requests
+    concurrency = concurrency or args.concurrency
+    counter = itertools.count()
+    latencies: list[float] = []
+    errors = 0
+
+    # Первые запросы компилируют SQL и заполняют кэши процесса
+    for index in range(requests + alloc_requests, requests + alloc_requests + args.warmup):
+        if prepare is not None:
+            await prepare(index)
+        await request(index)
+
+    async def call(index: int) -> None:
+        nonlocal errors
+        if prepare is not None:
+            await prepare(index)
+        started = time.perf_counter()
+        status = await request(index)
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            errors += 1
+
+    async def worker() -> None:
+        while (index := next(counter)) < requests:
+            await call(index)
+
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    collections = gc.get_stats()[0]["collections"] - collections
+
+    # Память считается отдельно: tracemalloc замедляет запросы в разы
+    peaks = []
+    tracemalloc.start()
+    try:
+        for index in range(requests, requests + alloc_requests):
+            if prepare is not None:
+                await prepare(index)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await request(index)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "alloc_peak_kib": round(statistics.fmean(peaks) / 1024, 1) if peaks else None,
+        "gc_gen0_per_request": round(collections / requests, 3),
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.outbox_relay import relay_once
+    from app.tasks import process_notification
+    from app.utils.cache import bump_user_cache_version
+
+    rng = random.Random(args.seed)
+    celery = await start(FakeServer())
+    data = await seed(args.users, args.per_user)
+    notification_ids = [notification_id for _, ids in data for notification_id in ids]
+    rng.shuffle(notification_ids)
+    total = args.requests + args.alloc_requests + args.warmup
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def create(index: int) -> int:
+            user_id = data[index % len(data)][0]
+            response = await client.post(f"{API}/", json={
+                "user_id": str(user_id), "title": f"Bench {index}", "text": f"Warning: disk {index} is low",
+            })
+            return response.status_code
+
+        async def get_list(index: int) -> int:
+            user_id = data[index % len(data)][0]
+            response = await client.get(f"{API}/", params={"user_id": str(user_id), "limit": args.limit})
+            return response.status_code
+
+        async def new_list_version(index: int) -> None:
+            await bump_user_cache_version(data[index % len(data)][0])
+
+        async def detail(index: int) -> int:
+            return (await client.get(f"{API}/{rng.choice(notification_ids)}")).status_code
+
+        async def status(index: int) -> int:
+            return (await client.get(f"{API}/{rng.choice(notification_ids)}/status")).status_code
+
+        async def mark_read(index: int) -> int:
+            # Каждый запрос отмечает новое уведомление; по кругу — при нехватке начальных данных
+            notification_id = notification_ids[index % len(notification_ids)]
+            return (await client.patch(f"{API}/{notification_id}/read")).status_code
+
+        pending: list[str] = []
+
+        async def process(index: int) -> int:
+            result = process_notification.apply(args=[pending[index]])
+            return 500 if result.failed() else 200
+
+        results = {}
+        for name in args.scenarios:
+            if name == "create":
+                results[name] = await run_scenario(args, create)
+            elif name == "list_cold":
+                results[name] = await run_scenario(args, get_list, prepare=new_list_version)
+            elif name == "list_warm":
+                for index in range(len(data)):
+                    await get_list(index)
+                results[name] = await run_scenario(args, get_list)
+            elif name == "detail":
+                results[name] = await run_scenario(args, detail)
+            elif name == "status":
+                results[name] = await run_scenario(args, status)
+            elif name == "mark_read":
+                results[name] = await run_scenario(args, mark_read)
+            elif name == "process_notification":
+                # Задачи воркера выполняются по одной, как в процессе пула prefork
+                while relay_once():
+                    pass
+                pending = celery.notification_ids[:total]
+                if len(pending) < total:
+                    extra = await seed(1, total - len(pending), status="pending")
+                    pending += [str(notification_id) for notification_id in extra[0][1]]
+                results[name] = await run_scenario(args, process, concurrency=1)
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict) -> None:
+    print(f"{'scenario':<22}{'rps':>18}{'p50 ms':>18}{'p99 ms':>18}{'alloc KiB':>18}", file=sys.stderr)
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        cells = []
+        for metric in ("rps", "p50_ms", "p99_ms", "alloc_peak_kib"):
+            old, new = before.get(metric), result.get(metric)
+            change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else "n/a"
+            cells.append(f"{new} ({change})")
+        print(f"{name:<22}" + "".join(f"{cell:>18}" for cell in cells), file=sys.stderr)
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        configure_environment(directory)
+        scenarios = asyncio.run(run(args))
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "alloc_requests": args.alloc_requests,
+            "warmup": args.warmup,
+            "users": args.users,
+            "per_user": args.per_user,
+            "limit": args.limit,
+        },
+        "scenarios": scenarios,
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(json.load(file), result)
+
+
+if __name__ == "__main__":
+    main()
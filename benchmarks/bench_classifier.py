@@ -0,0 +1,76 @@
+"""Скорость классификации по ключевым словам: прежняя реализация против KeywordClassifier.
+
+Корпус синтетических уведомлений строится из шаблонов со случайными числами.
+
+    python -m benchmarks.bench_classifier --count 1000000 --batch-size 1000
+"""
+import argparse
+import random
+import time
+
+
+TEMPLATES = (
+    "Payment failed for order {n}",
+    "Backup {n} completed successfully",
+    "Warning: disk usage on node {n} is above threshold",
+    "Unhandled exception in worker {n}, restarting",
+    "User {n} signed in from a new device",
+    "Attention: certificate for host {n} expires soon",
+    "Weekly report {n} is ready for download",
+    "Your subscription {n} has been renewed",
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000, help="Количество уведомлений в корпусе")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Размер пакета для classify_batch")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def legacy_classify(text: str) -> dict:
+    """Реализация classify_text до появления движков классификации"""
+    if any(word in text.lower() for word in ["error", "exception", "failed"]):
+        category = "critical"
+        confidence = random.uniform(0.7, 0.95)
+    elif any(word in text.lower() for word in ["warning", "attention", "careful"]):
+        category = "warning"
+        confidence = random.uniform(0.6, 0.9)
+    else:
+        category = "info"
+        confidence = random.uniform(0.8, 0.99)
+    return {
+        "category": category,
+        "confidence": confidence,
+        "keywords": random.sample(text.split(), min(3, len(text.split())))
+    }
+
+
+def main():
+    args = parse_args()
+    from app.analysis.classifier import KeywordClassifier
+
+    rng = random.Random(args.seed)
+    corpus = [rng.choice(TEMPLATES).format(n=rng.randrange(1_000_000)) for _ in range(args.count)]
+    classifier = KeywordClassifier()
+
+    started = time.perf_counter()
+    legacy = [legacy_classify(text)["category"] for text in corpus]
+    legacy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = []
+    for start in range(0, len(corpus), args.batch_size):
+        batched.extend(result["category"] for result in classifier.classify_batch(corpus[start:start + args.batch_size]))
+    batch_time = time.perf_counter() - started
+
+    assert legacy == batched, "категории движка расходятся с прежней реализацией"
+
+    print(f"{'engine':<28}{'seconds':>10}{'texts/s':>14}")
+    print(f"{'legacy classify_text':<28}{legacy_time:>10.2f}{args.count / legacy_time:>14.0f}")
+    print(f"{'keyword classify_batch':<28}{batch_time:>10.2f}{args.count / batch_time:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Микробенчмарк логирования на пути запроса: синхронные обработчики против очереди с выборкой.
+
+Один "запрос" пишет то же, что обработчик списка уведомлений: строку ключа
+кэша (логгер app.cache) и SQL-запросы с параметрами (sqlalchemy.engine.Engine).
+Замеряется время, которое логирование отнимает у цикла событий; консоль
+перенаправлена в /dev/null, файл пишется во временный каталог.
+
+    python -m benchmarks.bench_logging --requests 20000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+SQL = (
+    "SELECT notifications.id, notifications.user_id, notifications.title, notifications.text, "
+    "notifications.created_at, notifications.read_at, notifications.category, notifications.confidence, "
+    "notifications.processing_status FROM notifications WHERE notifications.user_id = $1::UUID "
+    "ORDER BY notifications.created_at DESC, notifications.id DESC LIMIT $2::INTEGER"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000, help="Количество запросов в сценарии")
+    parser.add_argument("--sql-per-request", type=int, default=4, help="Строк SQL-лога на запрос")
+    parser.add_argument("--sql-sample-rate", type=float, default=0.01)
+    parser.add_argument("--cache-key-sample-rate", type=float, default=0.1)
+    return parser.parse_args()
+
+
+async def run(requests: int, sql_per_request: int) -> list[float]:
+    key_logger = logging.getLogger("app.cache")
+    sql_logger = logging.getLogger("sqlalchemy.engine.Engine")
+    latencies = []
+    for n in range(requests):
+        started = time.perf_counter()
+        if key_logger.isEnabledFor(logging.INFO):
+            key_logger.info(f"Сформирован ключ кэша: fastapi-cache:notifications:list:{n}:v1:none:10")
+        for _ in range(sql_per_request):
+            sql_logger.info(SQL)
+            sql_logger.info("[cached since 120.5s ago] ('9b7c1d0e-4f7a-4bd2-9c55-0e8a3a1f6b21', 10)")
+        latencies.append(time.perf_counter() - started)
+        # Запросы чередуются с остальной работой цикла событий
+        await asyncio.sleep(0)
+    return latencies
+
+
+def main():
+    args = parse_args()
+    from app.config.logging_config import setup_logging, _stop_listener
+
+    scenarios = (
+        ("sync text, no sampling", dict(mode="sync", fmt="text", sample_rates={})),
+        ("queue json, no sampling", dict(mode="queue", fmt="json", sample_rates={})),
+        ("queue json, sampled", dict(mode="queue", fmt="json", sample_rates={
+            "sqlalchemy.engine": args.sql_sample_rate,
+            "app.cache": args.cache_key_sample_rate,
+        })),
+    )
+    stdout = sys.stdout
+    print(f"{'scenario':<28}{'p50 us':>10}{'p99 us':>10}{'total s':>10}{'log MB':>10}")
+    for name, options in scenarios:
+        with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+            log_file = os.path.join(directory, "app.log")
+            sys.stdout = devnull
+            try:
+                setup_logging(log_file=log_file, **options)
+                latencies = asyncio.run(run(args.requests, args.sql_per_request))
+                # Дожидаемся записи очереди, чтобы размер файла был полным
+                _stop_listener()
+            finally:
+                sys.stdout = stdout
+            size = os.path.getsize(log_file) / 1e6
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        print(f"{name:<28}{p50:>10.1f}{p99:>10.1f}{sum(latencies):>10.2f}{size:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
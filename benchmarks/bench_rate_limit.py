@@ -0,0 +1,101 @@
+"""Микробенчмарк ограничения скорости: прежний BaseHTTPMiddleware против ASGI-лимитера.
+
+Оба варианта оборачивают минимальное ASGI-приложение и вызываются напрямую,
+без HTTP-сервера. Сценарий "scanner" — каждый запрос с нового IP, что
+показывает рост памяти при отсутствии вытеснения клиентов.
+
+    python -m benchmarks.bench_rate_limit --requests 50000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse
+
+from app.middlewares.rate_limit import RateLimitMiddleware
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """Исходная реализация: список временных меток на клиента, без вытеснения."""
+
+    def __init__(self, app, rate_limit_per_minute: int = 60):
+        super().__init__(app)
+        self.rate_limit = rate_limit_per_minute
+        self.clients = {}
+
+    async def dispatch(self, request: Request, call_next):
+        client_ip = request.client.host
+        current_time = time.time()
+
+        if client_ip in self.clients:
+            self.clients[client_ip] = [t for t in self.clients[client_ip] if current_time - t < 60]
+        else:
+            self.clients[client_ip] = []
+
+        if len(self.clients[client_ip]) >= self.rate_limit:
+            return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded. Try again later."})
+
+        self.clients[client_ip].append(current_time)
+        return await call_next(request)
+
+
+async def endpoint(scope, receive, send):
+    await PlainTextResponse("ok")(scope, receive, send)
+
+
+async def run(middleware, requests: int, clients: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(requests):
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/v1/notifications/",
+            "raw_path": b"/api/v1/notifications/",
+            "query_string": b"",
+            "headers": [],
+            "client": (f"10.{(i % clients) >> 16 & 255}.{(i % clients) >> 8 & 255}.{i % clients & 255}", 1234),
+            "server": ("test", 80),
+            "scheme": "http",
+            "http_version": "1.1",
+        }
+        await middleware(scope, receive, send)
+    return time.perf_counter() - started
+
+
+def measure(name: str, factory, requests: int, clients: int, limit: int):
+    tracemalloc.start()
+    middleware = factory(limit)
+    elapsed = asyncio.run(run(middleware, requests, clients))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28}{clients:>10}{elapsed / requests * 1e6:>14.1f}{peak / 1024 / 1024:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--limit", type=int, default=1000, help="Лимит запросов в минуту на клиента")
+    parser.add_argument("--max-clients", type=int, default=10_000, help="Предел клиентов ASGI-лимитера")
+    args = parser.parse_args()
+
+    legacy = lambda limit: LegacyRateLimitMiddleware(endpoint, rate_limit_per_minute=limit)
+    current = lambda limit: RateLimitMiddleware(endpoint, rate_limit_per_minute=limit, max_local_clients=args.max_clients)
+
+    print(f"{'middleware':<28}{'clients':>10}{'us/request':>14}{'peak MiB':>14}")
+    for clients in (10, args.requests):
+        measure("BaseHTTPMiddleware (old)", legacy, args.requests, clients, args.limit)
+        measure("ASGI token bucket", current, args.requests, clients, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Микробенчмарк сериализации страницы уведомлений: модель pydantic и json против готовых байтов.
+
+Прежний путь повторяет работу FastAPI и fastapi-cache для списка: валидация
+каждого элемента в NotificationRead, jsonable_encoder и json.dumps для ответа
+и ещё одно кодирование JsonCoder для Redis; попадание в кэш декодирует JSON,
+валидирует его моделью ответа и кодирует заново. Новый путь кодирует словари
+строк orjson/msgpack один раз, а попадание отдаёт сохранённые байты.
+
+    python -m benchmarks.bench_serialization --sizes 10 50 100
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache.coder import JsonCoder
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100], help="Размеры страниц")
+    parser.add_argument("--repeat", type=int, default=2000, help="Повторов на каждый размер")
+    return parser.parse_args()
+
+
+def make_page(size: int) -> list:
+    from app.models.notification import Notification
+
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+    return [
+        Notification(
+            id=uuid.uuid4(), user_id=user_id, title=f"Notification {i}",
+            text="Attention: certificate for host expires soon " * 4,
+            created_at=now - timedelta(minutes=i), read_at=now if i % 3 == 0 else None,
+            category="warning", confidence=0.87, processing_status="completed",
+        )
+        for i in range(size)
+    ]
+
+
+def timed(repeat: int, func) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    args = parse_args()
+    from app.schemas.notification import NotificationPage, NotificationRead
+    from app.services.notification_service import NOTIFICATION_FIELDS
+    from app.utils.serialization import JSON, MSGPACK, EncodedResponseCoder, encode, encoded_response, row_to_dict
+
+    def legacy_miss(notifications):
+        page = NotificationPage(items=[NotificationRead.model_validate(n) for n in notifications], next_cursor=None)
+        json.dumps(jsonable_encoder(page)).encode()
+        return JsonCoder.encode(page)
+
+    def legacy_hit(cached):
+        page = NotificationPage.model_validate(JsonCoder.decode(cached))
+        return json.dumps(jsonable_encoder(page)).encode()
+
+    def fast_miss(notifications, media_type):
+        page = {"items": [row_to_dict(n, NOTIFICATION_FIELDS) for n in notifications], "next_cursor": None}
+        return EncodedResponseCoder.encode(encoded_response(page, media_type))
+
+    columns = ("legacy miss", "orjson miss", "msgpack miss", "legacy hit", "fast hit")
+    print(f"{'page':<6}" + "".join(f"{column + ' us':>16}" for column in columns) + f"{'json KB':>10}{'msgpack KB':>12}")
+    for size in args.sizes:
+        notifications = make_page(size)
+        legacy_cached = legacy_miss(notifications)
+        fast_cached = fast_miss(notifications, JSON)
+        results = (
+            timed(args.repeat, lambda: legacy_miss(notifications)),
+            timed(args.repeat, lambda: fast_miss(notifications, JSON)),
+            timed(args.repeat, lambda: fast_miss(notifications, MSGPACK)),
+            timed(args.repeat, lambda: legacy_hit(legacy_cached)),
+            timed(args.repeat, lambda: EncodedResponseCoder.decode_as_type(fast_cached, type_=None)),
+        )
+        page = {"items": [row_to_dict(n, NOTIFICATION_FIELDS) for n in notifications], "next_cursor": None}
+        json_size = len(encode(page, JSON)) / 1024
+        msgpack_size = len(encode(page, MSGPACK)) / 1024
+        print(f"{size:<6}" + "".join(f"{value:>16.1f}" for value in results) + f"{json_size:>10.1f}{msgpack_size:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
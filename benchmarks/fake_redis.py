@@ -0,0 +1,344 @@
+"""Redis в памяти процесса для бенчмарков: команды и скрипты, которые использует приложение.
+
+Синхронный (воркер) и асинхронный (API) клиенты работают с одним хранилищем
+FakeServer. Lua-скрипты приложения выполняются эквивалентными функциями на
+Python из SCRIPTS; незнакомый скрипт даёт ResponseError, и приложение
+переходит на запасной путь так же, как при недоступном Redis.
+"""
+import asyncio
+import fnmatch
+import json
+import math
+import time
+from typing import Any, Callable
+
+from redis.exceptions import ResponseError
+
+
+def _encode(value: Any) -> bytes:
+    # Кодирование аргументов как в redis-py
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float):
+        return repr(value).encode()
+    return str(value).encode()
+
+
+class FakeServer:
+    """Хранилище строк и хэшей со сроками жизни ключей и каналами pub/sub"""
+
+    def __init__(self):
+        self.data: dict[str, Any] = {}
+        self.expires: dict[str, float] = {}
+        # (каналы, цикл событий, очередь) подписок pub/sub
+        self.subscriptions: list[tuple[set[str], asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+    def _live(self, key: str) -> Any:
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _expire_in(self, key: str, seconds: float | None) -> None:
+        if seconds is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + seconds
+
+    def ping(self) -> bool:
+        return True
+
+    def time(self) -> list[int]:
+        now = time.time()
+        return [int(now), int(now % 1 * 1_000_000)]
+
+    def get(self, key: str) -> bytes | None:
+        return self._live(key)
+
+    def mget(self, keys, *args) -> list[bytes | None]:
+        keys = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        return [self._live(key) for key in [*keys, *args]]
+
+    def set(self, key: str, value: Any, ex=None, px=None, nx=False, keepttl=False) -> bool | None:
+        if nx and self._live(key) is not None:
+            return None
+        self.data[key] = _encode(value)
+        if ex is not None:
+            self._expire_in(key, ex)
+        elif px is not None:
+            self._expire_in(key, px / 1000)
+        elif not keepttl:
+            self._expire_in(key, None)
+        return True
+
+    def getex(self, key: str, ex=None) -> bytes | None:
+        value = self._live(key)
+        if value is not None and ex is not None:
+            self._expire_in(key, ex)
+        return value
+
+    def incrby(self, key: str, amount: int = 1) -> int:
+        value = int(self._live(key) or 0) + int(amount)
+        self.data[key] = _encode(value)
+        return value
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.incrby(key, amount)
+
+    def expire(self, key: str, seconds: float) -> bool:
+        if self._live(key) is None:
+            return False
+        self._expire_in(key, seconds)
+        return True
+
+    def pexpire(self, key: str, milliseconds: float) -> bool:
+        return self.expire(key, milliseconds / 1000)
+
+    def ttl(self, key: str) -> int:
+        if self._live(key) is None:
+            return -2
+        expires = self.expires.get(key)
+        return -1 if expires is None else math.ceil(expires - time.monotonic())
+
+    def exists(self, *keys: str) -> int:
+        return sum(self._live(key) is not None for key in keys)
+
+    def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._live(key) is not None:
+                deleted += 1
+                del self.data[key]
+                self.expires.pop(key, None)
+        return deleted
+
+    def llen(self, key: str) -> int:
+        value = self._live(key)
+        return len(value) if isinstance(value, list) else 0
+
+    def sadd(self, key: str, *members: Any) -> int:
+        values = self.data.setdefault(key, set())
+        added = {_encode(member) for member in members} - values
+        values |= added
+        return len(added)
+
+    def hmget(self, key: str, *fields: str) -> list[bytes | None]:
+        values = self._live(key) or {}
+        return [values.get(field) for field in fields]
+
+    def hset(self, key: str, *pairs: Any) -> int:
+        values = self.data.setdefault(key, {})
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            values[field] = _encode(value)
+        return len(pairs) // 2
+
+    def scan_iter(self, match: str = "*", count: int | None = None):
+        return [key.encode() for key in list(self.data) if self._live(key) is not None and fnmatch.fnmatch(key, match)]
+
+    def publish(self, channel: str, message: Any) -> int:
+        receivers = 0
+        payload = {"type": "message", "channel": channel.encode(), "data": _encode(message)}
+        for channels, loop, queue in self.subscriptions:
+            if channel in channels:
+                # Воркер может публиковать из другого потока
+                loop.call_soon_threadsafe(queue.put_nowait, payload)
+                receivers += 1
+        return receivers
+
+    def run_script(self, script: str, keys, args) -> Any:
+        implementation = SCRIPTS.get(script.strip())
+        if implementation is None:
+            raise ResponseError("NOSCRIPT: скрипт не поддерживается FakeServer")
+        return implementation(self, list(keys or []), list(args or []))
+
+
+class FakePipeline:
+    """Пайплайн: команды накапливаются и выполняются в execute"""
+
+    def __init__(self, server: FakeServer):
+        self.server = server
+        self._commands: list[tuple[str, tuple, dict]] = []
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __getattr__(self, name: str) -> Callable:
+        if not hasattr(self.server, name):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._commands.clear()
+
+    def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [getattr(self.server, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+
+class FakeAsyncPipeline(FakePipeline):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands.clear()
+
+    async def execute(self) -> list:
+        return FakePipeline.execute(self)
+
+
+class FakeScript:
+    def __init__(self, server: FakeServer, script: str, is_async: bool):
+        self.server = server
+        self.script = script
+        self.is_async = is_async
+
+    def __call__(self, keys=None, args=None, client=None):
+        if isinstance(client, FakePipeline):
+            client._commands.append(("run_script", (self.script, keys, args), {}))
+            return client
+        result = self.server.run_script(self.script, keys, args)
+        if not self.is_async:
+            return result
+
+        async def resolved():
+            return result
+        return resolved()
+
+
+class FakeRedis:
+    """Синхронный клиент (redis.Redis) поверх FakeServer"""
+
+    is_async = False
+
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    def __getattr__(self, name: str) -> Callable:
+        return getattr(self.server, name)
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self.server)
+
+    def register_script(self, script: str) -> FakeScript:
+        return FakeScript(self.server, script, self.is_async)
+
+
+class FakePubSub:
+    def __init__(self, server: FakeServer):
+        self.server = server
+        self._channels: set[str] = set()
+        self._queue: asyncio.Queue | None = None
+
+    async def subscribe(self, *channels: str) -> None:
+        self._channels.update(channels)
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self.server.subscriptions.append((self._channels, asyncio.get_running_loop(), self._queue))
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+    async def aclose(self) -> None:
+        self.server.subscriptions = [entry for entry in self.server.subscriptions if entry[2] is not self._queue]
+
+
+class FakeAsyncRedis(FakeRedis):
+    """Асинхронный клиент (redis.asyncio.Redis) поверх FakeServer"""
+
+    is_async = True
+
+    def __getattr__(self, name: str) -> Callable:
+        command = getattr(self.server, name)
+
+        async def call(*args, **kwargs):
+            return command(*args, **kwargs)
+        return call
+
+    def pipeline(self, transaction: bool = True) -> FakeAsyncPipeline:
+        return FakeAsyncPipeline(self.server)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> FakePubSub:
+        return FakePubSub(self.server)
+
+
+def _token_bucket(server: FakeServer, keys: list, args: list) -> list[int]:
+    capacity, window_ms = float(args[0]), float(args[1])
+    rate = capacity / window_ms
+    seconds, micros = server.time()
+    now = seconds * 1000 + micros // 1000
+    tokens, ts = server.hmget(keys[0], "tokens", "ts")
+    if tokens is None or ts is None:
+        tokens, ts = capacity, now
+    tokens = min(capacity, float(tokens) + max(0, now - float(ts)) * rate)
+    allowed, retry_after = 0, 0
+    if tokens >= 1:
+        tokens -= 1
+        allowed = 1
+    else:
+        retry_after = math.ceil((1 - tokens) / rate)
+    server.hset(keys[0], "tokens", tokens, "ts", now)
+    server.pexpire(keys[0], window_ms)
+    return [allowed, math.floor(tokens), retry_after, math.ceil((capacity - tokens) / rate)]
+
+
+def _incr_existing(server: FakeServer, keys: list, args: list) -> int:
+    *counters, dirty = keys
+    for key, delta in zip(counters, args):
+        if server.exists(key) and server.incrby(key, int(delta)) < 0:
+            server.set(key, 0, keepttl=True)
+        server.sadd(dirty, key)
+    return len(counters)
+
+
+def _release_lock(server: FakeServer, keys: list, args: list) -> int:
+    if server.get(keys[0]) == _encode(args[0]):
+        return server.delete(keys[0])
+    return 0
+
+
+def _patch_detail(server: FakeServer, keys: list, args: list) -> int:
+    raw = server.get(keys[0])
+    if raw is None or raw == b"-":
+        return 0
+    data = {**json.loads(raw), **json.loads(args[0])}
+    ttl = int(args[1])
+    if ttl > 0:
+        server.set(keys[0], json.dumps(data), ex=ttl)
+    else:
+        server.set(keys[0], json.dumps(data), keepttl=True)
+    return 1
+
+
+def _load_scripts() -> dict[str, Callable]:
+    from app.analysis.cache import RELEASE_LOCK_SCRIPT
+    from app.middlewares.rate_limit import TOKEN_BUCKET_SCRIPT
+    from app.utils.counters import INCR_EXISTING_SCRIPT
+    from app.utils.detail_cache import PATCH_SCRIPT
+
+    return {
+        TOKEN_BUCKET_SCRIPT.strip(): _token_bucket,
+        INCR_EXISTING_SCRIPT.strip(): _incr_existing,
+        RELEASE_LOCK_SCRIPT.strip(): _release_lock,
+        PATCH_SCRIPT.strip(): _patch_detail,
+    }
+
+
+class _Scripts(dict):
+    # Скрипты читаются из модулей приложения при первом обращении: окружение бенчмарка
+    # должно быть настроено до их импорта
+    def get(self, script, default=None):
+        if not self:
+            self.update(_load_scripts())
+        return super().get(script, default)
+
+
+SCRIPTS = _Scripts()
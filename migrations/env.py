@@ -4,6 +4,8 @@ from sqlalchemy import create_engine
 from alembic import context
 from app.config.database import Base
 from app.models.notification import Notification
+from app.models.notification_archive import NotificationArchive, NotificationArchiveId
+from app.models.notification_outbox import NotificationOutbox
 from app.models.notification import Base
 import os
 from dotenv import load_dotenv
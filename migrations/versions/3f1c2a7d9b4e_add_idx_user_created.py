@@ -0,0 +1,26 @@
+"""Add idx_user_created composite index for keyset pagination
+
+Revision ID: 3f1c2a7d9b4e
+Revises: a093be02d32c
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9b4e'
+down_revision: Union[str, None] = 'a093be02d32c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_user_created', 'notifications', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_user_created', table_name='notifications')
@@ -0,0 +1,29 @@
+"""Add partial idx_unread_user index for unread counters
+
+Revision ID: 8b2e4d6f1a3c
+Revises: 3f1c2a7d9b4e
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a3c'
+down_revision: Union[str, None] = '3f1c2a7d9b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'idx_unread_user', 'notifications', ['user_id'], unique=False,
+        postgresql_where=sa.text('read_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_unread_user', table_name='notifications')
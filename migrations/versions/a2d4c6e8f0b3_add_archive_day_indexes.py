@@ -0,0 +1,31 @@
+"""Add day indexes to notification archive
+
+Revision ID: a2d4c6e8f0b3
+Revises: b6e2f9a4c8d1
+Create Date: 2026-10-18 20:00:00.000000
+
+Задача archive_read_notifications удаляет архив за дни старше срока
+хранения секций; без индекса по day каждый её запуск читал бы таблицы
+архива целиком.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2d4c6e8f0b3'
+down_revision: Union[str, None] = 'b6e2f9a4c8d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_archive_day', 'notification_archive', ['day'], unique=False)
+    op.create_index('idx_archive_ids_day', 'notification_archive_ids', ['day'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_archive_ids_day', table_name='notification_archive_ids')
+    op.drop_index('idx_archive_day', table_name='notification_archive')
@@ -0,0 +1,44 @@
+"""Add default partition to notifications
+
+Revision ID: b6e2f9a4c8d1
+Revises: f3a8d1c7b5e9
+Create Date: 2026-10-18 18:00:00.000000
+
+Без секции по умолчанию вставка уведомления за месяц, для которого задача
+maintain_notification_partitions не успела создать секцию, завершается
+ошибкой. Строки, попавшие в секцию по умолчанию, задача переносит в секции
+своих месяцев.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2f9a4c8d1'
+down_revision: Union[str, None] = 'f3a8d1c7b5e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_partitioned() -> bool:
+    return bool(op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('notifications')"
+    )).scalar())
+
+
+def upgrade() -> None:
+    if _is_partitioned():
+        op.execute("CREATE TABLE IF NOT EXISTS notifications_default PARTITION OF notifications DEFAULT")
+
+
+def downgrade() -> None:
+    if not _is_partitioned():
+        return
+    rows = op.get_bind().execute(sa.text("SELECT count(*) FROM notifications_default")).scalar()
+    if rows:
+        raise RuntimeError(
+            f"В секции notifications_default {rows} строк: выполните maintain_notification_partitions перед откатом"
+        )
+    op.execute("DROP TABLE notifications_default")
@@ -0,0 +1,110 @@
+"""Partition notifications by month of created_at
+
+Revision ID: c4d1e7a9f2b6
+Revises: 8b2e4d6f1a3c
+Create Date: 2026-10-18 12:00:00.000000
+
+Данные переносятся одним INSERT ... SELECT: на больших таблицах миграцию
+следует выполнять в окно обслуживания. Секции создаются для всех месяцев с
+данными и на NOTIFICATION_PARTITIONS_AHEAD месяцев вперёд, дальше их
+поддерживает задача maintain_notification_partitions.
+"""
+from datetime import date
+from typing import Sequence, Union
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d1e7a9f2b6'
+down_revision: Union[str, None] = '8b2e4d6f1a3c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS_AHEAD = int(os.getenv("NOTIFICATION_PARTITIONS_AHEAD", "3"))
+COLUMNS = "id, user_id, title, text, created_at, read_at, category, confidence, processing_status"
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_indexes() -> None:
+    op.create_index('idx_category', 'notifications', ['category'], unique=False)
+    op.create_index('idx_created_at', 'notifications', ['created_at'], unique=False)
+    op.create_index('idx_user_id', 'notifications', ['user_id'], unique=False)
+    op.create_index('idx_user_created', 'notifications', ['user_id', 'created_at'], unique=False)
+    op.create_index(
+        'idx_unread_user', 'notifications', ['user_id'], unique=False,
+        postgresql_where=sa.text('read_at IS NULL'),
+    )
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    op.execute("ALTER TABLE notifications RENAME TO notifications_unpartitioned")
+    # Имена индексов уникальны в схеме: освобождаем их для новой таблицы
+    op.execute("ALTER TABLE notifications_unpartitioned RENAME CONSTRAINT notifications_pkey TO notifications_unpartitioned_pkey")
+    for index in ('idx_category', 'idx_created_at', 'idx_user_id', 'idx_user_created', 'idx_unread_user'):
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+    # Ключ секционирования не может быть NULL
+    op.execute("UPDATE notifications_unpartitioned SET created_at = now() AT TIME ZONE 'utc' WHERE created_at IS NULL")
+
+    op.execute("""
+        CREATE TABLE notifications (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL,
+            title VARCHAR NOT NULL,
+            text VARCHAR NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            read_at TIMESTAMP WITHOUT TIME ZONE,
+            category VARCHAR,
+            confidence FLOAT,
+            processing_status VARCHAR,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    oldest = conn.execute(sa.text(
+        "SELECT date_trunc('month', min(created_at))::date FROM notifications_unpartitioned"
+    )).scalar()
+    current = conn.execute(sa.text("SELECT date_trunc('month', now() AT TIME ZONE 'utc')::date")).scalar()
+    month = min(oldest or current, current)
+    last = _add_months(current, PARTITIONS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE notifications_p{month:%Y%m} PARTITION OF notifications "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        month = _add_months(month, 1)
+
+    op.execute(f"INSERT INTO notifications ({COLUMNS}) SELECT {COLUMNS} FROM notifications_unpartitioned")
+    op.execute("DROP TABLE notifications_unpartitioned")
+    # Индексы секционированной таблицы создаются в каждой секции
+    _create_indexes()
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE notifications RENAME TO notifications_partitioned")
+    op.execute("ALTER TABLE notifications_partitioned RENAME CONSTRAINT notifications_pkey TO notifications_partitioned_pkey")
+    for index in ('idx_category', 'idx_created_at', 'idx_user_id', 'idx_user_created', 'idx_unread_user'):
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+
+    op.create_table('notifications',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('text', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('read_at', sa.DateTime(), nullable=True),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('confidence', sa.Float(), nullable=True),
+    sa.Column('processing_status', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f"INSERT INTO notifications ({COLUMNS}) SELECT {COLUMNS} FROM notifications_partitioned")
+    op.execute("DROP TABLE notifications_partitioned")
+    _create_indexes()
@@ -0,0 +1,37 @@
+"""Add user and lane to notification outbox
+
+Revision ID: f3a8d1c7b5e9
+Revises: e5b9c2d4a6f1
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8d1c7b5e9'
+down_revision: Union[str, None] = 'e5b9c2d4a6f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('notification_outbox', sa.Column('user_id', sa.UUID(), nullable=True))
+    op.add_column('notification_outbox', sa.Column('lane', sa.String(), server_default='default', nullable=False))
+    # Записи, ожидающие отправки во время обновления, получают пользователя из уведомлений
+    op.execute("""
+        UPDATE notification_outbox AS o SET user_id = n.user_id
+        FROM notifications AS n WHERE n.id = o.notification_id
+    """)
+    op.execute("DELETE FROM notification_outbox WHERE user_id IS NULL")
+    op.alter_column('notification_outbox', 'user_id', nullable=False)
+    op.create_index('idx_outbox_lane_user', 'notification_outbox', ['lane', 'user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_outbox_lane_user', table_name='notification_outbox')
+    op.drop_column('notification_outbox', 'lane')
+    op.drop_column('notification_outbox', 'user_id')